@@ -4,7 +4,8 @@ from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from .models import (
     User, Student, TeacherProfile, Subject, ClassGroup,
     Session, Attendance, Holiday, FineRule, Device,
-    PendingSession, PendingStudent, Department
+    PendingSession, PendingStudent, Department, DailyAttendanceRollup,
+    StudentAttendanceSummary, EmailOutbox, WeeklyEmailRun, NotificationJob, ExportLog
 )
 
 # ------------------------------
@@ -64,3 +65,24 @@ admin.site.register(Device)
 admin.site.register(Department)
 admin.site.register(PendingSession)
 admin.site.register(PendingStudent)
+admin.site.register(DailyAttendanceRollup)
+admin.site.register(StudentAttendanceSummary)
+admin.site.register(WeeklyEmailRun)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    list_filter = ("status",)
+
+
+@admin.register(NotificationJob)
+class NotificationJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "created_by", "status", "total", "created_at", "finished_at")
+    list_filter = ("kind", "status")
+
+
+@admin.register(ExportLog)
+class ExportLogAdmin(admin.ModelAdmin):
+    list_display = ("id", "created_by", "status", "filename", "size", "created_at", "finished_at")
+    list_filter = ("status",)
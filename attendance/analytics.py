@@ -1,11 +1,16 @@
 # attendance/analytics.py
 
-from datetime import datetime, timedelta
-from django.utils.timezone import now, localtime
-from django.db.models import Count
-from django.db.models.functions import TruncDate
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from functools import wraps
 
-from .models import Attendance, Session, ClassGroup, Subject, TeacherProfile
+from django.conf import settings
+from django.utils.timezone import get_current_timezone, localtime, make_aware, now
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncDay, TruncMonth, TruncWeek
+
+from .analytics_cache import cached_range
+from .models import ClassGroup, Subject, TeacherProfile, DailyAttendanceRollup
 
 
 # ---------------------------------------------------------
@@ -67,25 +72,88 @@ def truncate_local_date(field_name):
     return TruncDate(field_name, tzinfo=localtime().tzinfo)
 
 
+# ---------------------------------------------------------
+# HELPER — local date range → index-friendly datetime bounds
+# ---------------------------------------------------------
+def local_date_bounds(start_date, end_date=None):
+    """
+    Half-open [start 00:00, day-after-end 00:00) in the LOCAL timezone as
+    aware datetimes. Filtering with __gte/__lt keeps the column bare, so
+    indexes on it stay usable (a __date lookup wraps it in a cast).
+    """
+    if end_date is None:
+        end_date = start_date
+    tz = get_current_timezone()
+    start = make_aware(datetime.combine(start_date, time.min), tz)
+    end = make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def local_date_range_q(field, start_date, end_date=None):
+    """Q(field in local dates [start_date, end_date]) — see local_date_bounds."""
+    start, end = local_date_bounds(start_date, end_date)
+    return Q(**{f"{field}__gte": start, f"{field}__lt": end})
+
+
+# ---------------------------------------------------------
+# HELPER — rollup sums for one GROUP BY query
+# ---------------------------------------------------------
+# All charts read DailyAttendanceRollup (see rollups.py), so a 30-day window
+# touches ~30 rows per (class, subject, teacher) instead of raw Attendance.
+# Results are cached per (function, start, end) — see analytics_cache.py.
+
+def rollup_sum(field, prefix, start_date, end_date):
+    """
+    Sum a rollup counter reached through `prefix` (e.g. "daily_rollups__"),
+    restricted to the given local date range. Missing rows count as 0.
+    """
+    return Coalesce(
+        Sum(f"{prefix}{field}", filter=Q(**{f"{prefix}date__range": [start_date, end_date]})),
+        0,
+    )
+
+
+def rollups_in_range(start_date, end_date):
+    return DailyAttendanceRollup.objects.filter(date__range=[start_date, end_date])
+
+
+def backend_dispatch(key):
+    """
+    Route to the NumPy backend when AURA_ANALYTICS_BACKEND = "numpy";
+    `key` selects the chart from its all-metrics result (None = all).
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(start_date, end_date):
+            if getattr(settings, "AURA_ANALYTICS_BACKEND", "orm") == "numpy":
+                from .analytics_numpy import hod_metrics
+                metrics = hod_metrics(start_date, end_date)
+                return metrics if key is None else metrics[key]
+            return func(start_date, end_date)
+        return wrapper
+    return decorator
+
+
 # ---------------------------------------------------------
 # 1) Weekly Class Overview
 # ---------------------------------------------------------
+@cached_range
+@backend_dispatch("weekly")
 def weekly_class_overview(start_date, end_date):
     labels, values = [], []
 
-    classes = ClassGroup.objects.all().order_by("name")
+    classes = (
+        ClassGroup.objects
+        .annotate(
+            total_sessions=rollup_sum("session_count", "daily_rollups__", start_date, end_date),
+            total_present=rollup_sum("present_count", "daily_rollups__", start_date, end_date),
+        )
+        .order_by("name")
+    )
 
     for cls in classes:
-        total_sessions = Session.objects.filter(
-            class_group=cls,
-            start_time__date__range=[start_date, end_date]
-        ).count()
-
-        total_present = Attendance.objects.filter(
-            session__class_group=cls,
-            session__start_time__date__range=[start_date, end_date],
-            present=True
-        ).count()
+        total_sessions = cls.total_sessions
+        total_present = cls.total_present
 
         percentage = round((total_present / total_sessions) * 100, 2) if total_sessions else 0
 
@@ -98,18 +166,18 @@ def weekly_class_overview(start_date, end_date):
 # ---------------------------------------------------------
 # 2) Monthly Trend (DATE-WISE)
 # ---------------------------------------------------------
+@cached_range
+@backend_dispatch("monthly")
 def monthly_trend(start_date, end_date):
     qs = (
-        Attendance.objects.filter(
-            session__start_time__date__range=[start_date, end_date]
-        )
-        .annotate(day=truncate_local_date("session__start_time"))
-        .values("day")
-        .annotate(count=Count("id"))
-        .order_by("day")
+        rollups_in_range(start_date, end_date)
+        .values("date")
+        .annotate(count=Sum(F("present_count") + F("absent_count")))
+        .filter(count__gt=0)
+        .order_by("date")
     )
 
-    labels = [str(x["day"]) for x in qs]
+    labels = [str(x["date"]) for x in qs]
     values = [x["count"] for x in qs]
 
     return {"labels": labels, "values": values}
@@ -118,17 +186,23 @@ def monthly_trend(start_date, end_date):
 # ---------------------------------------------------------
 # 3) Class-wise Attendance
 # ---------------------------------------------------------
+@cached_range
+@backend_dispatch("classwise")
 def classwise_distribution(start_date, end_date):
     labels, values = [], []
 
-    for cls in ClassGroup.objects.all().order_by("name"):
-        count = Attendance.objects.filter(
-            session__class_group=cls,
-            session__start_time__date__range=[start_date, end_date]
-        ).count()
+    classes = (
+        ClassGroup.objects
+        .annotate(
+            present=rollup_sum("present_count", "daily_rollups__", start_date, end_date),
+            absent=rollup_sum("absent_count", "daily_rollups__", start_date, end_date),
+        )
+        .order_by("name")
+    )
 
+    for cls in classes:
         labels.append(cls.name)
-        values.append(count)
+        values.append(cls.present + cls.absent)
 
     return {"labels": labels, "values": values}
 
@@ -136,25 +210,24 @@ def classwise_distribution(start_date, end_date):
 # ---------------------------------------------------------
 # 4) Subject Heatmap
 # ---------------------------------------------------------
+@cached_range
+@backend_dispatch("subject_heatmap")
 def subject_heatmap_data(start_date, end_date):
     labels, present_list, absent_list = [], [], []
 
-    for subj in Subject.objects.all().order_by("code"):
-        present = Attendance.objects.filter(
-            session__subject=subj,
-            session__start_time__date__range=[start_date, end_date],
-            present=True
-        ).count()
-
-        absent = Attendance.objects.filter(
-            session__subject=subj,
-            session__start_time__date__range=[start_date, end_date],
-            present=False
-        ).count()
+    subjects = (
+        Subject.objects
+        .annotate(
+            present=rollup_sum("present_count", "daily_rollups__", start_date, end_date),
+            absent=rollup_sum("absent_count", "daily_rollups__", start_date, end_date),
+        )
+        .order_by("code")
+    )
 
+    for subj in subjects:
         labels.append(subj.code)
-        present_list.append(present)
-        absent_list.append(absent)
+        present_list.append(subj.present)
+        absent_list.append(subj.absent)
 
     return {"labels": labels, "present": present_list, "absent": absent_list}
 
@@ -162,19 +235,23 @@ def subject_heatmap_data(start_date, end_date):
 # ---------------------------------------------------------
 # 5) Teacher Activity
 # ---------------------------------------------------------
+@cached_range
+@backend_dispatch("teacher_activity")
 def teacher_activity_data(start_date, end_date):
     labels, values = [], []
 
-    teachers = TeacherProfile.objects.select_related("user")
+    teachers = (
+        TeacherProfile.objects
+        .select_related("user")
+        .annotate(
+            count=rollup_sum("session_count", "user__daily_rollups__", start_date, end_date),
+        )
+        .order_by("id")
+    )
 
     for t in teachers:
-        count = Session.objects.filter(
-            teacher=t.user,
-            start_time__date__range=[start_date, end_date]
-        ).count()
-
         labels.append(t.user.get_full_name() or t.user.username)
-        values.append(count)
+        values.append(t.count)
 
     return {"labels": labels, "values": values}
 
@@ -182,18 +259,189 @@ def teacher_activity_data(start_date, end_date):
 # ---------------------------------------------------------
 # 6) Overall Attendance Distribution
 # ---------------------------------------------------------
+@cached_range
+@backend_dispatch("absence_distribution")
 def absence_distribution_data(start_date, end_date):
-    present_count = Attendance.objects.filter(
-        session__start_time__date__range=[start_date, end_date],
-        present=True
-    ).count()
-
-    absent_count = Attendance.objects.filter(
-        session__start_time__date__range=[start_date, end_date],
-        present=False
-    ).count()
+    totals = rollups_in_range(start_date, end_date).aggregate(
+        present=Coalesce(Sum("present_count"), 0),
+        absent=Coalesce(Sum("absent_count"), 0),
+    )
 
     return {
         "labels": ["Present", "Absent"],
-        "values": [present_count, absent_count],
+        "values": [totals["present"], totals["absent"]],
     }
+
+
+# ---------------------------------------------------------
+# 7) All six datasets from one pass (HOD analytics page)
+# ---------------------------------------------------------
+@cached_range
+@backend_dispatch(None)
+def analytics_bundle(start_date, end_date):
+    """
+    Compute every HOD chart above from a single scan of the rollup rows in
+    range (plus the small name lookups), returning the same JSON shapes
+    keyed by chart name.
+    """
+    rows = rollups_in_range(start_date, end_date).values_list(
+        "date", "class_group_id", "subject_id", "teacher_id",
+        "present_count", "absent_count", "session_count",
+    )
+
+    by_class = defaultdict(lambda: [0, 0, 0])     # present, absent, sessions
+    by_subject = defaultdict(lambda: [0, 0])      # present, absent
+    by_teacher = defaultdict(int)                 # sessions
+    by_day = defaultdict(int)                     # attendance rows
+    total_present = total_absent = 0
+
+    for day, class_id, subject_id, teacher_id, p, a, n in rows:
+        c = by_class[class_id]
+        c[0] += p
+        c[1] += a
+        c[2] += n
+
+        s = by_subject[subject_id]
+        s[0] += p
+        s[1] += a
+
+        by_teacher[teacher_id] += n
+        by_day[day] += p + a
+        total_present += p
+        total_absent += a
+
+    weekly = {"labels": [], "values": []}
+    classwise = {"labels": [], "values": []}
+    for class_id, name in ClassGroup.objects.order_by("name").values_list("id", "name"):
+        p, a, n = by_class.get(class_id, (0, 0, 0))
+        weekly["labels"].append(name)
+        weekly["values"].append(round((p / n) * 100, 2) if n else 0)
+        classwise["labels"].append(name)
+        classwise["values"].append(p + a)
+
+    heatmap = {"labels": [], "present": [], "absent": []}
+    for subject_id, code in Subject.objects.order_by("code").values_list("id", "code"):
+        p, a = by_subject.get(subject_id, (0, 0))
+        heatmap["labels"].append(code)
+        heatmap["present"].append(p)
+        heatmap["absent"].append(a)
+
+    activity = {"labels": [], "values": []}
+    for t in TeacherProfile.objects.select_related("user").order_by("id"):
+        activity["labels"].append(t.user.get_full_name() or t.user.username)
+        activity["values"].append(by_teacher.get(t.user_id, 0))
+
+    days = sorted(d for d, count in by_day.items() if count > 0)
+
+    return {
+        "weekly": weekly,
+        "monthly": {"labels": [str(d) for d in days], "values": [by_day[d] for d in days]},
+        "classwise": classwise,
+        "subject_heatmap": heatmap,
+        "teacher_activity": activity,
+        "absence_distribution": {
+            "labels": ["Present", "Absent"],
+            "values": [total_present, total_absent],
+        },
+    }
+
+
+# ---------------------------------------------------------
+# 8) Gap-filled attendance time series (chart APIs)
+# ---------------------------------------------------------
+BUCKETS = {
+    "day": (TruncDay, "%d %b"),
+    "week": (TruncWeek, "Wk %d %b"),
+    "month": (TruncMonth, "%b %Y"),
+}
+
+
+def bucket_start(d, bucket):
+    """First day of the bucket containing `d` (weeks start on Monday)."""
+    if bucket == "week":
+        return d - timedelta(days=d.weekday())
+    if bucket == "month":
+        return d.replace(day=1)
+    return d
+
+
+def next_bucket(d, bucket):
+    if bucket == "week":
+        return d + timedelta(days=7)
+    if bucket == "month":
+        return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return d + timedelta(days=1)
+
+
+def attendance_timeseries(start_date, end_date, bucket="day", label_format=None,
+                          teacher=None, class_group=None, subject=None, department=None):
+    """
+    Present/absent totals per bucket for [start_date, end_date] with one
+    grouped query over the daily rollup. Buckets without data are filled
+    with zeros so every chart gets a continuous axis.
+
+    Returns {"labels": [...], "present": [...], "absent": [...]}.
+    """
+    trunc, default_format = BUCKETS[bucket]
+    label_format = label_format or default_format
+
+    filters = {}
+    if teacher is not None:
+        filters["teacher"] = teacher
+    if class_group is not None:
+        filters["class_group"] = class_group
+    if subject is not None:
+        filters["subject"] = subject
+    if department is not None:
+        filters["class_group__department"] = department
+
+    rows = (
+        rollups_in_range(start_date, end_date)
+        .filter(**filters)
+        .annotate(bucket=trunc("date"))
+        .values("bucket")
+        .annotate(p=Sum("present_count"), a=Sum("absent_count"))
+        .order_by()
+    )
+    by_bucket = {r["bucket"]: (r["p"], r["a"]) for r in rows}
+
+    labels, present, absent = [], [], []
+    cur = bucket_start(start_date, bucket)
+    while cur <= end_date:
+        p, a = by_bucket.get(cur, (0, 0))
+        labels.append(cur.strftime(label_format))
+        present.append(p)
+        absent.append(a)
+        cur = next_bucket(cur, bucket)
+
+    return {"labels": labels, "present": present, "absent": absent}
+
+
+def bucket_count(start_date, end_date, bucket):
+    if bucket == "day":
+        return (end_date - start_date).days + 1
+    if bucket == "week":
+        return (bucket_start(end_date, "week") - bucket_start(start_date, "week")).days // 7 + 1
+    return (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+
+
+def pick_bucket(start_date, end_date, max_points=None, minimum="day"):
+    """
+    Finest resolution (not finer than `minimum`) whose series for the range
+    stays within `max_points`; None when even months exceed it (the span
+    is too long to serve).
+    """
+    if max_points is None:
+        max_points = getattr(settings, "AURA_TIMESERIES_MAX_POINTS", 120)
+
+    order = list(BUCKETS)
+    for bucket in order[order.index(minimum):]:
+        if bucket_count(start_date, end_date, bucket) <= max_points:
+            return bucket
+    return None
+
+
+def last_n_days(n):
+    """(start, end) local dates for a window of `n` days ending today."""
+    today = localtime().date()
+    return today - timedelta(days=n - 1), today
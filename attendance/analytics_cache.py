@@ -0,0 +1,132 @@
+# attendance/analytics_cache.py
+#
+# Result cache for the analytics functions, keyed by (function, start, end)
+# and a global data version. Any write to Attendance/Session (see the
+# signal receivers in models.py) bumps the version, which orphans every
+# cached entry at once; orphans simply expire through their TTL.
+#
+# The version lives in the cache, so every process that writes (gunicorn
+# workers, the outbox/export workers, management commands) must share the
+# backend for its bumps to reach the web processes. With the per-process
+# local-memory backend a write elsewhere is invisible until the entry
+# expires, so there every entry gets the short TTL.
+
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.timezone import localtime
+
+VERSION_KEY = "aura:analytics:data_version"
+HITS_KEY = "aura:analytics:hits"
+MISSES_KEY = "aura:analytics:misses"
+
+_MISSING = object()
+
+
+def _cache():
+    return caches[getattr(settings, "AURA_ANALYTICS_CACHE_ALIAS", "default")]
+
+
+def _incr(key, delta=1):
+    c = _cache()
+    try:
+        return c.incr(key, delta)
+    except ValueError:
+        # key missing (first use or evicted) — start from delta
+        c.add(key, 0, None)
+        return c.incr(key, delta)
+
+
+# ---------------------------------------------------------
+# DATA VERSION
+# ---------------------------------------------------------
+def get_data_version():
+    c = _cache()
+    version = c.get(VERSION_KEY)
+    if version is None:
+        # Seed with a timestamp so a lost counter never reuses old versions
+        c.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = c.get(VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    """Invalidate every cached analytics result."""
+    get_data_version()
+    return _incr(VERSION_KEY)
+
+
+def invalidate_after_write():
+    """
+    Bump now and again once the surrounding transaction commits, so a reader
+    that cached pre-commit data in between is orphaned as well.
+    """
+    bump_data_version()
+    transaction.on_commit(bump_data_version)
+
+
+# ---------------------------------------------------------
+# CACHE DECORATOR
+# ---------------------------------------------------------
+def _ttl_for(end_date):
+    """
+    Past-only ranges rarely change (and writes still bump the version) — keep
+    them longer, but only when the version is shared between processes.
+    """
+    if end_date < localtime().date() and not isinstance(_cache(), LocMemCache):
+        return getattr(settings, "AURA_ANALYTICS_CACHE_PAST_TTL", 24 * 60 * 60)
+    return getattr(settings, "AURA_ANALYTICS_CACHE_TTL", 5 * 60)
+
+
+def _entry_key(name, start_date, end_date):
+    return f"aura:analytics:v{get_data_version()}:{name}:{start_date}:{end_date}"
+
+
+def cached_range(func):
+    """
+    Cache `func(start_date, end_date)` under the current data version.
+    The undecorated function stays reachable as `func.uncached`.
+    """
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(start_date, end_date):
+        c = _cache()
+        key = _entry_key(name, start_date, end_date)
+
+        value = c.get(key, _MISSING)
+        if value is not _MISSING:
+            _incr(HITS_KEY)
+            return value
+
+        _incr(MISSES_KEY)
+        value = func(start_date, end_date)
+        c.set(key, value, _ttl_for(end_date))
+        return value
+
+    wrapper.uncached = func
+    return wrapper
+
+
+# ---------------------------------------------------------
+# STATS
+# ---------------------------------------------------------
+def cache_stats():
+    c = _cache()
+    hits = c.get(HITS_KEY) or 0
+    misses = c.get(MISSES_KEY) or 0
+    total = hits + misses
+    return {
+        "data_version": get_data_version(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round((hits / total) * 100, 2) if total else 0,
+    }
+
+
+def reset_stats():
+    _cache().delete_many([HITS_KEY, MISSES_KEY])
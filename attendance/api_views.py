@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from django.db import transaction
 from django.utils import timezone
 
 from .models import (
@@ -11,13 +12,15 @@ from .models import (
 from .serializers import (
     AttendanceSerializer, StudentSerializer, SessionSerializer
 )
+from .rollups import refresh_rollup_for_session
+from .summaries import refresh_summaries_for_session
 
 # Email utilities
 from attendance.utils import (
     build_session_start_email,
     build_session_end_email,
-    send_email_notification
 )
+from .outbox import enqueue_email
 
 
 # -------------------------------------------------------------------
@@ -49,16 +52,19 @@ def mark_attendance(request):
                 status=400
             )
 
-        attendance, created = Attendance.objects.update_or_create(
-            student=student,
-            session=session,
-            defaults={
-                'verified_by_face': verified_by_face,
-                'present': present,
-                'timestamp': timestamp,
-                'source': 'ESP32'
-            }
-        )
+        with transaction.atomic():
+            attendance, created = Attendance.objects.update_or_create(
+                student=student,
+                session=session,
+                defaults={
+                    'verified_by_face': verified_by_face,
+                    'present': present,
+                    'timestamp': timestamp,
+                    'source': 'ESP32'
+                }
+            )
+            refresh_rollup_for_session(session)
+            refresh_summaries_for_session(session, [student.pk])
 
         return Response({'status': 'success', 'created': created}, status=201)
 
@@ -89,20 +95,21 @@ def start_session(request):
         time_str = timezone.now().strftime('%Y%m%d_%H%M%S')
         session_id = f"S_{subject_code}_{time_str}"
 
-        session = Session.objects.create(
-            session_id=session_id,
-            subject=subject,
-            class_group=class_group,
-            teacher=teacher_profile.user,
-            start_time=timezone.now()
-        )
+        with transaction.atomic():
+            session = Session.objects.create(
+                session_id=session_id,
+                subject=subject,
+                class_group=class_group,
+                teacher=teacher_profile.user,
+                start_time=timezone.now()
+            )
+            refresh_rollup_for_session(session)
 
-        # ------------------------------
-        # SEND EMAIL TO TEACHER
-        # ------------------------------
-        subject_mail, body_mail = build_session_start_email(session, teacher_profile.user)
-        if teacher_profile.user.email:
-            send_email_notification(subject_mail, body_mail, [teacher_profile.user.email])
+            # ------------------------------
+            # QUEUE EMAIL TO TEACHER (sent by the outbox worker)
+            # ------------------------------
+            subject_mail, body_mail = build_session_start_email(session, teacher_profile.user)
+            enqueue_email(subject_mail, body_mail, [teacher_profile.user.email])
 
         return Response({'status': 'success', 'session_id': session.session_id}, status=201)
 
@@ -122,16 +129,17 @@ def end_session(request):
         if not session:
             return Response({'status': 'error', 'message': 'Invalid session ID'}, status=400)
 
-        session.end_time = timezone.now()
-        session.save()
-
-        # ------------------------------
-        # SEND EMAIL – SESSION SUMMARY
-        # ------------------------------
-        subject_mail, body_mail = build_session_end_email(session)
-        teacher = session.teacher
-        if teacher and teacher.email:
-            send_email_notification(subject_mail, body_mail, [teacher.email])
+        with transaction.atomic():
+            session.end_time = timezone.now()
+            session.save()
+
+            # ------------------------------
+            # QUEUE EMAIL – SESSION SUMMARY
+            # ------------------------------
+            teacher = session.teacher
+            if teacher:
+                subject_mail, body_mail = build_session_end_email(session)
+                enqueue_email(subject_mail, body_mail, [teacher.email])
 
         return Response({'status': 'success', 'message': 'Session ended'}, status=200)
 
@@ -0,0 +1,191 @@
+# attendance/export_cache.py
+#
+# Content-addressed disk cache for generated exports and PDF reports.
+# The key hashes the report params together with a watermark of the rows
+# behind them (count, max id and last update of the attendance, sessions
+# and students involved, plus the names of the classes, subjects and
+# departments printed), so any change produces a new key and stale files
+# are simply never looked up again. The key doubles as the ETag.
+# Files live in AURA_EXPORT_DIR; hits bump the mtime and evict() drops
+# the least recently used files once AURA_EXPORT_CACHE_MAX_BYTES is
+# exceeded. PDF keys also include the engine chosen for the report
+# (pdf_tables.pdf_engine) and the local date, since PDFs print a report
+# date.
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils.timezone import localdate
+
+from .models import Attendance, ClassGroup, Session, Student, Subject
+from .pdf_tables import pdf_engine
+
+VERSION = 1   # bump when the output of any exporter changes
+
+
+def cache_dir():
+    path = Path(getattr(settings, "AURA_EXPORT_DIR", Path(settings.BASE_DIR) / "exports"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def max_bytes():
+    return getattr(settings, "AURA_EXPORT_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+
+
+# ---------------------------------------------------------
+# KEYS
+# ---------------------------------------------------------
+def _scope(params):
+    """Attendance and Session querysets an export with these params reads."""
+    kind = params["kind"]
+    if kind in ("class", "muster"):
+        return (Attendance.objects.filter(session__class_group_id=params["id"]),
+                Session.objects.filter(class_group_id=params["id"]))
+    if kind == "subject":
+        return (Attendance.objects.filter(session__subject_id=params["id"]),
+                Session.objects.filter(subject_id=params["id"]))
+    if kind == "session":
+        return (Attendance.objects.filter(session_id=params["id"]),
+                Session.objects.filter(pk=params["id"]))
+    if kind == "student_reports":
+        field = "class_group_id" if params["scope"] == "class" else "class_group__department_id"
+        return (Attendance.objects.filter(**{f"student__{field}": params["id"]}),
+                Session.objects.filter(**{field: params["id"]}))
+    return Attendance.objects.all(), Session.objects.all()
+
+
+def _labels(params, sessions):
+    """Names of the classes and subjects (with departments) an export prints."""
+    kind = params["kind"]
+    classes = Q(pk__in=sessions.values("class_group_id"))
+    subjects = Q(pk__in=sessions.values("subject_id"))
+    if kind in ("class", "muster") or params.get("scope") == "class":
+        classes |= Q(pk=params["id"])
+    elif params.get("scope") == "department":
+        classes |= Q(department_id=params["id"])
+    elif kind == "subject":
+        subjects |= Q(pk=params["id"])
+    return [
+        list(ClassGroup.objects.filter(classes).order_by("pk").values_list("pk", "name", "department__name")),
+        list(Subject.objects.filter(subjects).order_by("pk").values_list("pk", "code", "name", "department__name")),
+    ]
+
+
+def watermark(params):
+    attendance, sessions = _scope(params)
+    a = attendance.aggregate(n=Count("id"), last_id=Max("id"), changed=Max("updated_at"))
+    s = sessions.aggregate(n=Count("id"), changed=Max("updated_at"))
+    students = Student.objects.aggregate(changed=Max("updated_at"))["changed"]
+    return [a["n"], a["last_id"], a["changed"], s["n"], s["changed"], students, _labels(params, sessions)]
+
+
+def row_count(params):
+    """Attendance rows an export with these params reads (its build cost)."""
+    return _scope(params)[0].count()
+
+
+def _is_pdf(params):
+    return params.get("fmt") == "pdf" or params["kind"] in ("muster", "student_reports")
+
+
+def cache_key(params):
+    payload = {"v": VERSION, "params": params, "marks": watermark(params)}
+    if _is_pdf(params):
+        payload["engine"] = pdf_engine(params["kind"])   # AURA_PDF_ENGINE(S) changes the file
+        payload["date"] = str(localdate())                # the printed report date
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# ---------------------------------------------------------
+# LOOKUP / FILL
+# ---------------------------------------------------------
+def path_for(key, ext):
+    return cache_dir() / f"{key}.{ext}"
+
+
+def lookup(key, ext):
+    """Cached file for `key`, or None. A hit counts as a use for LRU."""
+    path = path_for(key, ext)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def fill(key, ext, build):
+    """
+    Run build(out) into a temp file and move it into place atomically, so
+    readers never see a partial file and concurrent builders just race to
+    the same result.
+    """
+    path = path_for(key, ext)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{key[:16]}.", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            build(out)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    evict(keep=path)
+    return path
+
+
+def get_or_build(key, ext, build):
+    """Returns (path, hit)."""
+    path = lookup(key, ext)
+    if path is not None:
+        return path, True
+    return fill(key, ext, build), False
+
+
+# ---------------------------------------------------------
+# EVICTION / INSPECTION
+# ---------------------------------------------------------
+def entries():
+    """Cached files as (path, size, last_used), most recently used first."""
+    found = []
+    for path in cache_dir().iterdir():
+        if path.name.startswith(".") or not path.is_file():
+            continue
+        st = path.stat()
+        found.append((path, st.st_size, st.st_mtime))
+    found.sort(key=lambda e: e[2], reverse=True)
+    return found
+
+
+def evict(limit=None, keep=None):
+    """Delete least recently used files until the cache fits in `limit` bytes."""
+    limit = max_bytes() if limit is None else limit
+    files = entries()
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for path, size, _ in reversed(files):
+        if total <= limit:
+            break
+        if path == keep:
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+def purge(older_than=None):
+    """Delete every cached file (or those unused for `older_than` seconds)."""
+    cutoff = time.time() - older_than if older_than is not None else None
+    count = size = 0
+    for path, nbytes, used in entries():
+        if cutoff is None or used < cutoff:
+            path.unlink(missing_ok=True)
+            count += 1
+            size += nbytes
+    return count, size
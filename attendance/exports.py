@@ -0,0 +1,308 @@
+# attendance/exports.py
+#
+# Background exports. The Export Center calls start_export() and gets an
+# ExportLog job back at once; the aura_export_worker command runs queued
+# jobs, writing each file into the export cache (export_cache.py), and the
+# page polls export_status() until the download link is ready. A user's
+# identical requests in flight share one job (partial unique constraint on
+# created_by + fingerprint); other users get their own job and the file
+# from the cache. A job left RUNNING past AURA_EXPORT_LEASE (crashed
+# worker) is claimed and built again, so requests that attached to it
+# still get their file. cached_export() is also what the inline download
+# views use; a plain GET whose file is not cached and is too large to build
+# in the request (builds_inline) is queued instead.
+
+import hashlib
+import json
+import shutil
+import time
+import zipfile
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils import timezone
+
+from . import export_cache
+from .models import ClassGroup, Department, ExportLog, Subject
+from .pdf_service import render_many, render_merged
+from .reports import student_report_contexts, students_for_scope
+from .utils import (
+    export_class_xlsx, export_session_pdf, export_session_xlsx, export_subject_csv,
+    export_subject_xlsx, iter_class_csv, iter_session_csv, iter_subject_csv,
+)
+from .zipstream import iter_zip
+
+FORMATS = ("csv", "xlsx", "pdf")
+BULK_MODES = ("classes", "subjects")
+REPORT_SCOPES = ("class", "department")
+REPORT_BUNDLES = ("zip", "pdf")
+
+
+def _fingerprint(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def extension(params):
+    if params["kind"] == "bulk":
+        return "zip"
+    if params["kind"] == "student_reports":
+        return params["bundle"]
+    return params["fmt"]
+
+
+def export_filename(params):
+    kind = params["kind"]
+    if kind == "class":
+        return f"class_{ClassGroup.objects.get(pk=params['id']).name}.{params['fmt']}"
+    if kind == "subject":
+        return f"{Subject.objects.get(pk=params['id']).code}.{params['fmt']}"
+    if kind == "session":
+        return f"session_{params['id']}.{params['fmt']}"
+    if kind == "muster":
+        return f"muster_{ClassGroup.objects.get(pk=params['id']).name}.pdf"
+    if kind == "student_reports":
+        model = ClassGroup if params["scope"] == "class" else Department
+        name = model.objects.get(pk=params["id"]).name
+        return f"student_reports_{name}.{params['bundle']}"
+    return f"{params['mode']}_export.zip"
+
+
+def start_export(user, params):
+    """
+    Queue an export, or return the user's in-flight job for the same params.
+    `params` is {"kind": "class"|"subject", "id": pk, "fmt": ...},
+    {"kind": "bulk", "mode": "classes"|"subjects"} or {"kind":
+    "student_reports", "scope": "class"|"department", "id": pk, "bundle":
+    "zip"|"pdf", "date": ...}. When the export cache
+    already holds the file for the current data the job is created done.
+    Returns (job, created).
+    """
+    fingerprint = _fingerprint(params)
+    active = ExportLog.objects.filter(
+        created_by=user, fingerprint=fingerprint, status__in=ExportLog.ACTIVE,
+    )
+
+    job = active.first()
+    if job:
+        return job, False
+
+    cached = export_cache.lookup(export_cache.cache_key(params), extension(params))
+    if cached is not None:
+        now = timezone.now()
+        return ExportLog.objects.create(
+            created_by=user, params=params, fingerprint=fingerprint, status=ExportLog.DONE,
+            file_path=str(cached), filename=export_filename(params), size=cached.stat().st_size,
+            started_at=now, finished_at=now, note="cache hit",
+        ), True
+    try:
+        with transaction.atomic():
+            return ExportLog.objects.create(
+                created_by=user, params=params, fingerprint=fingerprint,
+            ), True
+    except IntegrityError:
+        # a concurrent click queued the same export a moment earlier
+        return active.get(), False
+
+
+def builds_inline(params):
+    """
+    Whether a cache miss for `params` is small enough to build inside a
+    plain GET; larger ones are queued like an Export Center request.
+    """
+    return export_cache.row_count(params) <= getattr(settings, "AURA_EXPORT_INLINE_MAX_ROWS", 20000)
+
+
+# ---------------------------------------------------------
+# BUILDERS: write the export for `params` to `out` (binary); batch
+# builders report progress(done, total) as they go
+# ---------------------------------------------------------
+def _build_class(params, out, progress=None):
+    from .views import export_class_pdf   # views import this module
+
+    class_id, fmt = params["id"], params["fmt"]
+    if fmt == "csv":
+        for chunk in iter_class_csv(class_id):
+            out.write(chunk.encode())
+    elif fmt == "xlsx":
+        with export_class_xlsx(class_id) as xlsx:
+            shutil.copyfileobj(xlsx, out)
+    else:
+        out.write(export_class_pdf(ClassGroup.objects.get(pk=class_id)))
+
+
+def _build_subject(params, out, progress=None):
+    from .views import export_subject_pdf
+
+    subject = Subject.objects.get(pk=params["id"])
+    fmt = params["fmt"]
+    if fmt == "csv":
+        out.write(export_subject_csv(subject).getvalue().encode())
+    elif fmt == "xlsx":
+        with export_subject_xlsx(subject) as xlsx:
+            shutil.copyfileobj(xlsx, out)
+    else:
+        out.write(export_subject_pdf(subject))
+
+
+def _build_session(params, out, progress=None):
+    session_id, fmt = params["id"], params["fmt"]
+    if fmt == "csv":
+        for chunk in iter_session_csv(session_id):
+            out.write(chunk.encode())
+    elif fmt == "xlsx":
+        with export_session_xlsx(session_id) as xlsx:
+            shutil.copyfileobj(xlsx, out)
+    else:
+        out.write(export_session_pdf(session_id))
+
+
+def _build_muster(params, out, progress=None):
+    from .views import export_class_muster_pdf
+
+    out.write(export_class_muster_pdf(ClassGroup.objects.get(pk=params["id"])))
+
+
+def bulk_members(mode):
+    """(arcname, make_chunks) for every CSV in a bulk ZIP, for zipstream.iter_zip."""
+    if mode == "classes":
+        return [
+            (f"{name}_class.csv", partial(iter_class_csv, pk))
+            for pk, name in ClassGroup.objects.order_by("id").values_list("id", "name")
+        ]
+    return [
+        (f"{code}_subject.csv", partial(iter_subject_csv, pk))
+        for pk, code in Subject.objects.order_by("id").values_list("id", "code")
+    ]
+
+
+def _build_bulk(params, out, progress=None):
+    for chunk in iter_zip(bulk_members(params["mode"])):
+        out.write(chunk)
+
+
+def _build_student_reports(params, out, progress=None):
+    """Every student's hod_report_student PDF, zipped or merged into one PDF."""
+    progress = progress or (lambda done, total: None)
+    contexts = student_report_contexts(students_for_scope(params["scope"], params["id"]))
+    template = get_template("attendance/hod_report_student.html")
+    htmls = (template.render(context) for context in contexts)
+    total = len(contexts)
+    progress(0, total)
+
+    if params["bundle"] == "pdf":
+        if contexts:
+            out.write(render_merged(htmls))
+        progress(total, total)
+        return
+
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        for done, (context, pdf) in enumerate(zip(contexts, render_many(htmls)), 1):
+            zf.writestr(f"{context['student'].student_id}_report.pdf", pdf)
+            progress(done, total)
+
+
+BUILDERS = {
+    "class": _build_class,
+    "subject": _build_subject,
+    "session": _build_session,
+    "muster": _build_muster,
+    "bulk": _build_bulk,
+    "student_reports": _build_student_reports,
+}
+
+
+def cached_export(params, key=None, progress=None):
+    """
+    File for `params` from the export cache, building it on a miss.
+    Returns (path, key, hit); the key doubles as the ETag.
+    """
+    key = key or export_cache.cache_key(params)
+    path, hit = export_cache.get_or_build(
+        key, extension(params), lambda out: BUILDERS[params["kind"]](params, out, progress),
+    )
+    return path, key, hit
+
+
+# ---------------------------------------------------------
+# WORKER SIDE
+# ---------------------------------------------------------
+PROGRESS_SAVE_INTERVAL = 1.0   # seconds between progress writes
+
+
+def _progress_saver(job):
+    """progress(done, total) callback that stores the job's progress, throttled."""
+    last = [0.0]
+
+    def progress(done, total):
+        now = time.monotonic()
+        if done < total and now - last[0] < PROGRESS_SAVE_INTERVAL:
+            return
+        last[0] = now
+        job.progress, job.total = done, total
+        job.save(update_fields=["progress", "total"])
+    return progress
+
+
+def run_export(job):
+    """Build (or reuse) the job's file in the export cache."""
+    try:
+        filename = export_filename(job.params)
+        path, _, hit = cached_export(job.params, progress=_progress_saver(job))
+    except Exception as e:
+        job.status = ExportLog.FAILED
+        job.note = str(e)[:2000]
+    else:
+        job.status = ExportLog.DONE
+        job.file_path = str(path)
+        job.filename = filename
+        job.size = path.stat().st_size
+        job.note = "cache hit" if hit else ""
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "note", "file_path", "filename", "size", "finished_at"])
+    return job
+
+
+def _runnable_q(now):
+    """Queued jobs, or jobs a crashed worker left RUNNING past the lease."""
+    lease = timedelta(seconds=getattr(settings, "AURA_EXPORT_LEASE", 30 * 60))
+    return Q(status=ExportLog.QUEUED) | Q(status=ExportLog.RUNNING, started_at__lt=now - lease)
+
+
+def run_queued_exports(limit=5):
+    """Claim and run queued export jobs. Returns the number run."""
+    ran = 0
+    now = timezone.now()
+    for job in ExportLog.objects.filter(_runnable_q(now)).order_by("id")[:limit]:
+        # claim: only one worker moves a job out of QUEUED (or an expired
+        # RUNNING); cache files are written atomically, so a rebuild is safe
+        if not ExportLog.objects.filter(_runnable_q(now), pk=job.pk).update(
+            status=ExportLog.RUNNING, started_at=timezone.now(),
+        ):
+            continue
+        job.refresh_from_db()
+        run_export(job)
+        ran += 1
+    return ran
+
+
+# ---------------------------------------------------------
+# STATUS
+# ---------------------------------------------------------
+def export_status(job):
+    done = job.status == ExportLog.DONE
+    return {
+        "job_id": job.pk,
+        "status": job.status,
+        "done": job.status in (ExportLog.DONE, ExportLog.FAILED),
+        "error": job.note if job.status == ExportLog.FAILED else "",
+        "filename": job.filename,
+        "size": job.size,
+        "progress": job.progress,
+        "total": job.total,
+        "download_url": reverse("export_job_download", args=[job.pk]) if done else None,
+    }
@@ -10,30 +10,37 @@ from django.utils.timezone import now
 from django.contrib.auth import logout
 
 
-from weasyprint import HTML
+from .pdf_service import pdf_service_errors, render_pdf
 
 import csv
+import hashlib
 import io
+import json
 from datetime import timedelta
 
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
 from .models import (
     User, Student, ClassGroup, Subject, TeacherProfile,
     Department, Session, Attendance
 )
 from . import analytics as aura_analytics
+from .analytics import local_date_range_q
+from . import analytics_cache
+from .reports import (
+    class_report_context, overview_report_context, student_report_contexts,
+)
+from .exports import REPORT_BUNDLES, REPORT_SCOPES
+from .summaries import student_totals
+from .views import queue_export_response
 
 
 # =====================================================
 # HELPERS / ACCESS CONTROL
 # =====================================================
 
-def _last_30_days():
-    """Return (start_date, end_date) for last 30 days."""
-    today = now().date()
-    start = today - timedelta(days=30)
-    return start, today
-
-
 def is_hod(user):
     return user.is_authenticated and getattr(user, "is_hod", False)
 
@@ -675,6 +682,37 @@ def analytics_absence_distribution(request):
     return JsonResponse(data)
 
 
+@login_required
+@user_passes_test(is_hod)
+def analytics_bundle(request):
+    """
+    All six analytics datasets in one response. The ETag is a hash of the
+    payload, so a reload with unchanged data is answered with 304.
+    """
+    start_dt, end_dt, label = aura_analytics.get_date_range_from_request(request)
+    data = aura_analytics.analytics_bundle(start_dt, end_dt)
+    data["range"] = {"start": str(start_dt), "end": str(end_dt), "label": label}
+
+    body = json.dumps(data, cls=DjangoJSONEncoder)
+    etag = quote_etag(hashlib.md5(body.encode()).hexdigest())
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type="application/json")
+
+    response["ETag"] = etag
+    # private + always revalidate: browsers resend If-None-Match on reload
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+@user_passes_test(is_hod)
+def analytics_cache_stats(request):
+    """Hit/miss counters of the analytics result cache (this process for locmem)."""
+    return JsonResponse(analytics_cache.cache_stats())
+
+
 # =====================================================
 # ANALYTICS PAGE
 # =====================================================
@@ -692,56 +730,21 @@ def hod_analytics_page(request):
 # =====================================================
 @login_required
 @user_passes_test(is_hod)
+@pdf_service_errors
 def hod_student_report_pdf(request, student_id):
     """
     Per-student summary: total present/absent, overall percentage,
     plus daily breakdown for the last 30 days.
     """
-    start_30, end_30 = _last_30_days()
-
     student = get_object_or_404(Student, student_id=student_id)
-
-    # All-time attendance
-    qs_all = Attendance.objects.filter(student=student).select_related(
-        "session", "session__class_group", "session__subject"
-    )
-
-    total_present = qs_all.filter(present=True).count()
-    total_absent = qs_all.filter(present=False).count()
-    total = total_present + total_absent
-    percentage = round((total_present / total) * 100, 2) if total else 0
-
-    # Last-30-days breakdown for table
-    qs_30 = qs_all.filter(session__start_time__date__range=[start_30, end_30])
-
-    attendances = []
-    for att in qs_30.order_by("timestamp"):
-        attendances.append({
-            "date": att.timestamp.date(),
-            "present": "Yes" if att.present else "No",
-            "verified_by_face": "Yes" if att.verified_by_face else "No",
-            "timestamp": att.timestamp.strftime("%Y-%m-%d %H:%M"),
-        })
-
-    context = {
-        "student": student,
-        "class_group": student.class_group,
-        "department": student.class_group.department if student.class_group else None,
-        "report_date": now(),
-
-        "total_present": total_present,
-        "total_absent": total_absent,
-        "percentage": percentage,
-
-        "attendances": attendances,
-    }
+    context = student_report_contexts(Student.objects.filter(pk=student.pk))[0]
 
     html_string = render_to_string(
         "attendance/hod_report_student.html",
         context,
         request=request,   # ensures {% static %} and {{ request }} work
     )
-    pdf = HTML(string=html_string, base_url=request.build_absolute_uri("/")).write_pdf()
+    pdf = render_pdf(html_string, base_url=request.build_absolute_uri("/"))
 
     response = HttpResponse(pdf, content_type="application/pdf")
     response["Content-Disposition"] = f'inline; filename="student_{student.student_id}_report.pdf"'
@@ -750,61 +753,40 @@ def hod_student_report_pdf(request, student_id):
 
 @login_required
 @user_passes_test(is_hod)
+def hod_student_reports_batch(request, scope, pk, bundle):
+    """
+    POST: queue every student's report for a class or department as one
+    export job (ZIP of PDFs or one merged PDF). 202 + status URL to poll.
+    """
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "POST required"}, status=405)
+    if scope not in REPORT_SCOPES or bundle not in REPORT_BUNDLES:
+        return JsonResponse({"status": "error", "message": "Invalid scope or bundle"}, status=400)
+    get_object_or_404(ClassGroup if scope == "class" else Department, pk=pk)
+
+    return queue_export_response(request, {
+        "kind": "student_reports", "scope": scope, "id": pk, "bundle": bundle,
+        "date": now().date().isoformat(),   # the reports cover the last 30 days
+    })
+
+
+@login_required
+@user_passes_test(is_hod)
+@pdf_service_errors
 def hod_class_report_pdf(request, class_id):
     """
     Class summary: each student's present/absent/percentage
     (all-time + last 30 days).
     """
-    start_30, end_30 = _last_30_days()
     class_group = get_object_or_404(ClassGroup, pk=class_id)
-
-    students = Student.objects.filter(class_group=class_group).order_by("student_id")
-    rows = []
-
-    for s in students:
-        qs = Attendance.objects.filter(student=s)
-
-        total_present = qs.filter(present=True).count()
-        total_absent = qs.filter(present=False).count()
-        total = total_present + total_absent
-        perc = round((total_present / total) * 100, 2) if total else 0
-
-        qs30 = qs.filter(session__start_time__date__range=[start_30, end_30])
-        p30 = qs30.filter(present=True).count()
-        a30 = qs30.filter(present=False).count()
-        t30 = p30 + a30
-        perc30 = round((p30 / t30) * 100, 2) if t30 else 0
-
-        rows.append({
-            "student": s,
-            "present": total_present,
-            "absent": total_absent,
-            "percentage": perc,
-            "present_30": p30,
-            "absent_30": a30,
-            "percentage_30": perc30,
-        })
-
-    all_att = Attendance.objects.filter(session__class_group=class_group)
-    class_present = all_att.filter(present=True).count()
-    class_total = all_att.count()
-    class_percentage = round((class_present / class_total) * 100, 2) if class_total else 0
-
-    context = {
-        "class_group": class_group,
-        "department": class_group.department,
-        "report_date": now(),
-        "rows": rows,
-        "class_total": class_total,
-        "class_percentage": class_percentage,
-    }
+    context = class_report_context(class_group)
 
     html_string = render_to_string(
         "attendance/hod_report_class.html",
         context,
         request=request,
     )
-    pdf = HTML(string=html_string, base_url=request.build_absolute_uri("/")).write_pdf()
+    pdf = render_pdf(html_string, base_url=request.build_absolute_uri("/"))
 
     response = HttpResponse(pdf, content_type="application/pdf")
     response["Content-Disposition"] = f'inline; filename="class_{class_group.name}_report.pdf"'
@@ -813,6 +795,7 @@ def hod_class_report_pdf(request, class_id):
 
 @login_required
 @user_passes_test(is_hod)
+@pdf_service_errors
 def hod_teacher_report_pdf(request, teacher_id):
     """
     Teacher performance: sessions in last 7/30/90 days +
@@ -828,8 +811,8 @@ def hod_teacher_report_pdf(request, teacher_id):
 
     def session_count_between(start_date):
         return Session.objects.filter(
+            local_date_range_q("start_time", start_date, today),
             teacher=teacher_user,
-            start_time__date__range=[start_date, today],
         ).count()
 
     sessions_7 = session_count_between(start_7)
@@ -862,7 +845,7 @@ def hod_teacher_report_pdf(request, teacher_id):
         context,
         request=request,
     )
-    pdf = HTML(string=html_string, base_url=request.build_absolute_uri("/")).write_pdf()
+    pdf = render_pdf(html_string, base_url=request.build_absolute_uri("/"))
 
     response = HttpResponse(pdf, content_type="application/pdf")
     response["Content-Disposition"] = f'inline; filename="teacher_{teacher_user.username}_report.pdf"'
@@ -871,59 +854,19 @@ def hod_teacher_report_pdf(request, teacher_id):
 
 @login_required
 @user_passes_test(is_hod)
+@pdf_service_errors
 def hod_overview_report_pdf(request):
     """
     Overall HOD dashboard-style summary for last 30 days.
     """
-    start_30, end_30 = _last_30_days()
-
-    sessions = Session.objects.filter(start_time__date__range=[start_30, end_30])
-    attendance = Attendance.objects.filter(session__in=sessions)
-
-    present = attendance.filter(present=True).count()
-    total = attendance.count()
-    avg_attendance = round((present / total) * 100, 2) if total else 0
-
-    class_rows = []
-    for cls in ClassGroup.objects.all().order_by("name"):
-        cls_sessions = sessions.filter(class_group=cls)
-        cls_att = attendance.filter(session__class_group=cls)
-
-        p = cls_att.filter(present=True).count()
-        t = cls_att.count()
-        perc = round((p / t) * 100, 2) if t else 0
-
-        class_rows.append({
-            "class": cls,
-            "sessions": cls_sessions.count(),
-            "percentage": perc,
-        })
-
-    teacher_rows = []
-    for tp in TeacherProfile.objects.select_related("user").all():
-        t_sessions = sessions.filter(teacher=tp.user).count()
-        teacher_rows.append({
-            "teacher": tp.user,
-            "sessions": t_sessions,
-        })
-
-    context = {
-        "report_date": now(),
-        "start_30": start_30,
-        "end_30": end_30,
-        "total_sessions": sessions.count(),
-        "total_attendance_rows": total,
-        "avg_attendance": avg_attendance,
-        "class_rows": class_rows,
-        "teacher_rows": teacher_rows,
-    }
+    context = overview_report_context()
 
     html_string = render_to_string(
         "attendance/hod_report_overview.html",
         context,
         request=request,
     )
-    pdf = HTML(string=html_string, base_url=request.build_absolute_uri("/")).write_pdf()
+    pdf = render_pdf(html_string, base_url=request.build_absolute_uri("/"))
 
     response = HttpResponse(pdf, content_type="application/pdf")
     response["Content-Disposition"] = 'inline; filename="hod_overview_last30_report.pdf"'
@@ -937,7 +880,7 @@ from attendance.models import Student, Attendance, FineRule
 @login_required
 @user_passes_test(is_hod)
 def hod_fine_calculator(request):
-    from .models import FineRule, Student, Attendance, ClassGroup
+    from .models import FineRule, Student, ClassGroup
 
     rule = FineRule.objects.filter(active=True).first()
 
@@ -963,8 +906,7 @@ def hod_fine_calculator(request):
             student = Student.objects.filter(student_id=student_id).first()
 
             if student:
-                total_sessions = Attendance.objects.filter(student=student).count()
-                present = Attendance.objects.filter(student=student, present=True).count()
+                present, total_sessions = student_totals([student.pk]).get(student.pk, (0, 0))
 
                 percent = (present / total_sessions * 100) if total_sessions else 0
                 absent_days = total_sessions - present
@@ -989,12 +931,12 @@ def hod_fine_calculator(request):
             class_group = ClassGroup.objects.filter(id=class_id).first()
 
             if class_group:
-                students = Student.objects.filter(class_group=class_group)
+                students = list(Student.objects.filter(class_group=class_group))
+                totals = student_totals([s.pk for s in students])
                 class_results = []
 
                 for s in students:
-                    total_sessions = Attendance.objects.filter(student=s).count()
-                    present = Attendance.objects.filter(student=s, present=True).count()
+                    present, total_sessions = totals.get(s.pk, (0, 0))
 
                     percent = (present / total_sessions * 100) if total_sessions else 0
                     absent_days = total_sessions - present
@@ -0,0 +1,145 @@
+# attendance/jobs.py
+#
+# Background notification jobs. A view calls start_redflag_job() and
+# returns the job id at once; the aura_outbox_worker command runs queued
+# jobs (builds the messages and queues them in the outbox), drains the
+# outbox over one SMTP connection per batch and closes finished jobs.
+# A job left RUNNING past AURA_JOB_LEASE (crashed worker) is claimed
+# again. job_status() is what the dashboard polls.
+
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import EmailOutbox, NotificationJob
+from .outbox import enqueue_many
+from .utils import red_flag_students_for_user, render_redflag_email
+
+
+def _fingerprint(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def start_redflag_job(user, days, threshold):
+    """
+    Queue a red-flag notification job, or return the user's active job for
+    the same parameters. Returns (job, created).
+    """
+    params = {"days": days, "threshold": threshold}
+    fingerprint = _fingerprint(params)
+    active = NotificationJob.objects.filter(
+        created_by=user, kind=NotificationJob.REDFLAG, fingerprint=fingerprint,
+        status__in=NotificationJob.ACTIVE,
+    )
+
+    job = active.first()
+    if job:
+        return job, False
+    try:
+        with transaction.atomic():
+            return NotificationJob.objects.create(
+                created_by=user, kind=NotificationJob.REDFLAG,
+                params=params, fingerprint=fingerprint,
+            ), True
+    except IntegrityError:
+        # a concurrent click created it first (partial unique constraint)
+        return active.get(), False
+
+
+# ---------------------------------------------------------
+# WORKER SIDE
+# ---------------------------------------------------------
+def _build_redflag(job):
+    messages, errors = [], []
+    flagged = red_flag_students_for_user(
+        job.created_by, days=job.params["days"], threshold=job.params["threshold"],
+    )
+    for row in flagged:
+        s = row["student"]
+        if not s.email:
+            errors.append(f"{s.student_id} missing email")
+            continue
+        subject, body = render_redflag_email(s, row["class_group"], row["percentage"])
+        messages.append((subject, body, [s.email]))
+    return messages, errors
+
+
+BUILDERS = {NotificationJob.REDFLAG: _build_redflag}
+
+
+def _runnable_q(now):
+    """Queued jobs, or jobs a crashed worker left RUNNING past the lease."""
+    lease = timedelta(seconds=getattr(settings, "AURA_JOB_LEASE", 10 * 60))
+    return (
+        Q(status=NotificationJob.QUEUED)
+        | Q(status=NotificationJob.RUNNING, started_at__lt=now - lease)
+    )
+
+
+def run_queued_jobs(limit=10):
+    """Turn queued jobs into outbox messages. Returns the number of jobs run."""
+    ran = 0
+    now = timezone.now()
+    for job in NotificationJob.objects.filter(_runnable_q(now)).order_by("id")[:limit]:
+        # claim: only one worker moves a job out of QUEUED (or an expired RUNNING).
+        # Messages are queued in one transaction with the SENDING switch, so a
+        # reclaimed job never has half its messages in the outbox.
+        if not NotificationJob.objects.filter(_runnable_q(now), pk=job.pk).update(
+            status=NotificationJob.RUNNING, started_at=timezone.now(),
+        ):
+            continue
+        job.refresh_from_db()
+        ran += 1
+
+        try:
+            messages, errors = BUILDERS[job.kind](job)
+            with transaction.atomic():
+                enqueue_many(messages, job=job)
+                job.total = len(messages)
+                job.errors = errors
+                job.status = NotificationJob.SENDING
+                job.save(update_fields=["total", "errors", "status"])
+        except Exception as e:
+            job.status = NotificationJob.FAILED
+            job.errors = job.errors + [str(e)]
+            job.finished_at = timezone.now()
+            job.save(update_fields=["status", "errors", "finished_at"])
+    return ran
+
+
+def complete_jobs():
+    """Mark SENDING jobs whose messages are all sent or given up as DONE."""
+    unfinished = EmailOutbox.objects.filter(
+        job=OuterRef("pk"), status__in=[EmailOutbox.PENDING, EmailOutbox.SENDING],
+    )
+    return (
+        NotificationJob.objects
+        .filter(status=NotificationJob.SENDING)
+        .exclude(Exists(unfinished))
+        .update(status=NotificationJob.DONE, finished_at=timezone.now())
+    )
+
+
+# ---------------------------------------------------------
+# STATUS
+# ---------------------------------------------------------
+def job_status(job):
+    counts = job.emails.aggregate(
+        sent=Count("id", filter=Q(status=EmailOutbox.SENT)),
+        failed=Count("id", filter=Q(status=EmailOutbox.FAILED)),
+    )
+    return {
+        "job_id": job.pk,
+        "status": job.status,
+        "total": job.total,
+        "sent": counts["sent"],
+        "failed": counts["failed"],
+        "pending": max(job.total - counts["sent"] - counts["failed"], 0),
+        "errors": job.errors,
+        "done": job.status in (NotificationJob.DONE, NotificationJob.FAILED),
+    }
@@ -0,0 +1,49 @@
+# attendance/management/commands/aura_age_summaries.py
+#
+# Moves the rolling 7/30-day windows of StudentAttendanceSummary forward.
+# Run it daily shortly after local midnight (cron / scheduler), or keep it
+# running with --watch (the "summaries" line in the Procfile), which ages
+# the rows as soon as the local date changes. Until the rows are aged the
+# red-flag and weekly-email lookups fall back to raw attendance.
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from attendance.summaries import age_summaries, rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Age the rolling windows of the per-student attendance summaries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Recreate every summary row from raw attendance")
+        parser.add_argument("--watch", action="store_true",
+                            help="Keep running and age the rows whenever the local date changes")
+        parser.add_argument("--interval", type=float, default=300.0,
+                            help="With --watch: seconds between checks")
+
+    def handle(self, *args, **opts):
+        if opts["rebuild"]:
+            count = rebuild_summaries()
+            self.stdout.write(self.style.SUCCESS(f"Summaries rebuilt: {count} rows"))
+            return
+
+        if not opts["watch"]:
+            count = age_summaries()
+            self.stdout.write(self.style.SUCCESS(f"Summaries aged: {count} rows"))
+            return
+
+        try:
+            while True:
+                try:
+                    count = age_summaries()   # one EXISTS query when nothing is stale
+                except Exception as e:
+                    self.stderr.write(f"aging failed: {e!r}")
+                else:
+                    if count:
+                        self.stdout.write(f"Summaries aged: {count} rows")
+                time.sleep(opts["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Summary ager stopped.")
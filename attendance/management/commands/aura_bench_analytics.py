@@ -0,0 +1,86 @@
+# attendance/management/commands/aura_bench_analytics.py
+#
+# Benchmark: ORM vs NumPy analytics backends on a synthetic dataset.
+# Everything runs inside a transaction that is rolled back at the end,
+# so the configured database is left untouched.
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from attendance import analytics, analytics_numpy
+from attendance.analytics import local_date_range_q
+from attendance.models import Attendance
+from attendance.rollups import compute_rollups, rebuild_rollups
+from attendance.synthetic import generate_school
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare ORM and NumPy analytics timings on a synthetic dataset (rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Attendance rows to generate")
+        parser.add_argument("--classes", type=int, default=20)
+        parser.add_argument("--subjects", type=int, default=30)
+        parser.add_argument("--teachers", type=int, default=15)
+        parser.add_argument("--students", type=int, default=60, help="Students per class")
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per backend (best is reported)")
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._run(opts)
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Synthetic data rolled back.")
+
+    # -----------------------------------------------------
+    def _timed(self, label, func, repeat=1):
+        best, result = None, None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        self.stdout.write(f"  {label:<34} {best * 1000:10.1f} ms")
+        return result
+
+    def _run(self, opts):
+        end = timezone.localtime().date()
+        start = end - timedelta(days=opts["days"])
+        repeat = opts["repeat"]
+
+        self.stdout.write(f"Generating ~{opts['rows']:,} attendance rows...")
+        self._timed("generate dataset", lambda: generate_school(
+            rows=opts["rows"], classes=opts["classes"], subjects=opts["subjects"],
+            teachers=opts["teachers"], students=opts["students"], days=opts["days"],
+        ))
+        in_range = Attendance.objects.filter(local_date_range_q("session__start_time", start, end))
+        self.stdout.write(f"Attendance rows in range: {in_range.count():,}")
+
+        self.stdout.write("Timings (best of %d):" % repeat)
+        self._timed("ORM GROUP BY over raw rows", lambda: compute_rollups(start, end), repeat)
+        self._timed("rollup rebuild (one-off)", lambda: rebuild_rollups(start, end))
+
+        with override_settings(AURA_ANALYTICS_BACKEND="orm"):
+            orm = self._timed(
+                "ORM bundle (rollup table)",
+                lambda: analytics.analytics_bundle.uncached(start, end), repeat,
+            )
+
+        self._timed("NumPy: load arrays", lambda: analytics_numpy.load_attendance_arrays(start, end), repeat)
+        vec = self._timed("NumPy bundle (load + compute)", lambda: analytics_numpy.hod_metrics(start, end), repeat)
+
+        if orm == vec:
+            self.stdout.write(self.style.SUCCESS("ORM and NumPy results match."))
+        else:
+            self.stdout.write(self.style.ERROR("ORM and NumPy results DIFFER."))
@@ -0,0 +1,218 @@
+# attendance/management/commands/aura_bench_email.py
+#
+# Benchmark: notification throughput against a local SMTP sink.
+# Starts an in-process SMTP server on 127.0.0.1, points Django's email
+# settings at it, builds a synthetic school and runs the mail paths:
+# aura_weekly_email, notify_students_redflag and session start/end (device
+# API + outbox drain). Everything runs inside a transaction that is rolled
+# back at the end, so the configured database is left untouched.
+
+import socketserver
+import threading
+import time
+from contextlib import contextmanager
+from io import StringIO
+from unittest import mock
+
+from django.core.mail.backends.smtp import EmailBackend
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from attendance import outbox
+from attendance.jobs import complete_jobs, run_queued_jobs
+from attendance.models import EmailOutbox, Subject
+from attendance.summaries import rebuild_summaries
+from attendance.synthetic import generate_school
+
+
+class _Rollback(Exception):
+    pass
+
+
+# ---------------------------------------------------------
+# SMTP SINK
+# ---------------------------------------------------------
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: accepts and counts every message."""
+
+    def _reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self._reply("220 aura-sink ready")
+        in_data = False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if in_data:
+                if line.rstrip(b"\r\n") == b".":
+                    in_data = False
+                    self.server.accept_message()
+                    self._reply("250 OK")
+                continue
+
+            verb = line[:4].upper()
+            if verb == b"DATA":
+                in_data = True
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+            elif verb == b"QUIT":
+                self._reply("221 Bye")
+                return
+            else:   # EHLO/HELO/MAIL/RCPT/RSET/NOOP
+                self._reply("250 OK")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay=0.0):
+        super().__init__(("127.0.0.1", 0), _SinkHandler)
+        self.delay = delay
+        self.received = 0
+        self._lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def accept_message(self):
+        if self.delay:
+            time.sleep(self.delay)   # simulated provider round trip
+        with self._lock:
+            self.received += 1
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+# ---------------------------------------------------------
+# COMMAND
+# ---------------------------------------------------------
+class Command(BaseCommand):
+    help = "Measure email throughput, latency and DB queries against a local SMTP sink (rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--classes", type=int, default=10)
+        parser.add_argument("--students", type=int, default=60, help="Students per class")
+        parser.add_argument("--subjects", type=int, default=8)
+        parser.add_argument("--teachers", type=int, default=5)
+        parser.add_argument("--rows", type=int, default=50_000, help="Attendance rows to generate")
+        parser.add_argument("--sessions", type=int, default=50, help="Session start/end pairs")
+        parser.add_argument("--threshold", type=float, default=85,
+                            help="Red-flag threshold (higher flags more students)")
+        parser.add_argument("--concurrency", type=int, default=4, help="Passed to aura_weekly_email")
+        parser.add_argument("--sink-delay", type=float, default=0.0,
+                            help="Seconds the sink waits per message (simulates SMTP latency)")
+
+    def handle(self, *args, **opts):
+        with SMTPSink(delay=opts["sink_delay"]) as sink, override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1", EMAIL_PORT=sink.port,
+            EMAIL_HOST_USER="", EMAIL_HOST_PASSWORD="",
+            EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+            ALLOWED_HOSTS=["*"],
+        ):
+            self.sink = sink
+            try:
+                with transaction.atomic():
+                    self._run(opts)
+                    raise _Rollback
+            except _Rollback:
+                self.stdout.write("Synthetic data rolled back.")
+
+    # -----------------------------------------------------
+    @contextmanager
+    def _measure(self, label):
+        """Per-message SMTP latency (timed around EmailBackend._send), sink count and DB queries."""
+        latencies = []
+        lock = threading.Lock()
+        original = EmailBackend._send
+
+        def timed_send(backend, message):
+            t0 = time.perf_counter()
+            try:
+                return original(backend, message)
+            finally:
+                with lock:
+                    latencies.append(time.perf_counter() - t0)
+
+        before = self.sink.received
+        t0 = time.perf_counter()
+        with mock.patch.object(EmailBackend, "_send", timed_send), \
+                CaptureQueriesContext(connection) as queries:
+            yield
+        elapsed = time.perf_counter() - t0
+
+        messages = self.sink.received - before
+        latencies.sort()
+        p95 = latencies[int(0.95 * (len(latencies) - 1))] * 1000 if latencies else 0
+        rate = messages / elapsed if elapsed else 0
+        self.stdout.write(
+            f"  {label:<28} {messages:6d} msgs {elapsed:8.2f}s {rate:9.1f} msgs/s "
+            f"p95 {p95:7.1f} ms {len(queries):7d} queries"
+        )
+
+    def _run(self, opts):
+        self.stdout.write("Generating synthetic school...")
+        school = generate_school(
+            rows=opts["rows"], classes=opts["classes"], subjects=opts["subjects"],
+            teachers=opts["teachers"], students=opts["students"],
+        )
+        rebuild_summaries()
+        teacher = school["teachers"][0]
+        teacher.teacher_profile.classes.set(school["classes"])
+        EmailOutbox.objects.all().delete()
+
+        client = Client()
+        client.force_login(teacher)
+
+        self.stdout.write(f"SMTP sink on 127.0.0.1:{self.sink.port} (delay {opts['sink_delay']}s)")
+
+        with self._measure("aura_weekly_email"):
+            call_command(
+                "aura_weekly_email", "--restart", f"--concurrency={opts['concurrency']}",
+                stdout=StringIO(),
+            )
+
+        with self._measure("notify_students_redflag"):
+            client.post(reverse("notify_students_redflag"), {"threshold": opts["threshold"]})
+            run_queued_jobs()
+            outbox.drain()
+            complete_jobs()
+
+        # session ids are "S_<subject>_<second>": one subject per session keeps them unique
+        api_subjects = Subject.objects.bulk_create([
+            Subject(code=f"{school['subjects'][0].code}_api{i}", name=f"API {i}")
+            for i in range(opts["sessions"])
+        ])
+
+        api_times = []
+        with self._measure("session start/end + drain"):
+            for i, subject in enumerate(api_subjects):
+                t0 = time.perf_counter()
+                resp = client.post("/api/start_session/", {
+                    "teacher_uid": teacher.username,
+                    "subject_code": subject.code,
+                    "class_group": school["classes"][i % len(school["classes"])].name,
+                }, content_type="application/json")
+                client.post("/api/end_session/", {
+                    "session_id": resp.json()["session_id"],
+                }, content_type="application/json")
+                api_times.append(time.perf_counter() - t0)
+            outbox.drain()
+
+        api_times.sort()
+        if api_times:
+            p95 = api_times[int(0.95 * (len(api_times) - 1))] * 1000
+            self.stdout.write(f"  device API start+end p95: {p95:.1f} ms")
@@ -0,0 +1,136 @@
+# attendance/management/commands/aura_bench_exports.py
+#
+# Benchmark: peak Python memory (tracemalloc) and time of the export paths
+# on one synthetic class. Compares the old build-everything-in-memory
+# CSV/XLSX exporters with the streaming / write-only ones. Runs inside a transaction that is
+# rolled back at the end.
+
+import csv
+import io
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import HttpResponse
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+from attendance.models import Attendance
+from attendance.synthetic import generate_school
+from attendance.utils import XLSX_CONTENT_TYPE, export_class_xlsx, iter_class_csv
+from attendance.views import csv_stream_response, xlsx_file_response
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_class_csv(class_id):
+    """The pre-streaming export: full StringIO, model instances, then a copy."""
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(["Session ID","Student ID","Student Name","Present","Verified By Face","Timestamp","Source"])
+    attendances = Attendance.objects.filter(
+        session__class_group_id=class_id
+    ).select_related("student", "session")
+    for a in attendances.order_by("timestamp"):
+        w.writerow([
+            a.session.session_id,
+            a.student.student_id,
+            f"{a.student.first_name} {a.student.last_name}",
+            "Yes" if a.present else "No",
+            "Yes" if a.verified_by_face else "No",
+            a.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            a.source
+        ])
+    buf.seek(0)
+    return HttpResponse(buf.getvalue(), content_type="text/csv")
+
+
+def legacy_class_xlsx(class_id):
+    """The pre-write-only export: every cell in memory, widths from ws.columns, BytesIO."""
+    attendances = Attendance.objects.filter(
+        session__class_group_id=class_id
+    ).select_related("student", "session")
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Session ID","Student ID","Student Name","Present","Verified Face","Timestamp","Source"])
+    for a in attendances.order_by("timestamp"):
+        ws.append([
+            a.session.session_id,
+            a.student.student_id,
+            f"{a.student.first_name} {a.student.last_name}",
+            "Yes" if a.present else "No",
+            "Yes" if a.verified_by_face else "No",
+            a.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            a.source
+        ])
+    for i, col in enumerate(ws.columns, 1):
+        length = max(len(str(c.value)) for c in col if c.value)
+        ws.column_dimensions[get_column_letter(i)].width = min(50, length + 4)
+    bio = io.BytesIO()
+    wb.save(bio)
+    return HttpResponse(bio.getvalue(), content_type=XLSX_CONTENT_TYPE)
+
+
+class Command(BaseCommand):
+    help = "Compare peak memory of in-memory vs streaming exports (rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=500_000, help="Attendance rows in the class")
+        parser.add_argument("--students", type=int, default=60)
+        parser.add_argument("--formats", default="csv,xlsx", help="Comma-separated: csv, xlsx")
+        parser.add_argument("--skip-legacy", action="store_true",
+                            help="Only run the new exporters (the old ones are slow at 1M rows)")
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._run(opts)
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Synthetic data rolled back.")
+
+    def _measure(self, label, func):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        size = func()
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f"  {label:<28} {size / 1e6:8.1f} MB out {elapsed:7.2f}s  peak {peak / 1e6:8.1f} MB"
+        )
+
+    @staticmethod
+    def _consume(response):
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+            # not response.close(): request_finished would close the DB connection
+            if getattr(response, "file_to_stream", None):
+                response.file_to_stream.close()
+            return size
+        return len(response.content)
+
+    def _run(self, opts):
+        self.stdout.write(f"Generating {opts['rows']:,} attendance rows for one class...")
+        school = generate_school(
+            rows=opts["rows"], classes=1, subjects=5, teachers=2, students=opts["students"],
+        )
+        class_id = school["classes"][0].pk
+        formats = opts["formats"].split(",")
+        legacy = not opts["skip_legacy"]
+
+        if "csv" in formats:
+            if legacy:
+                self._measure("CSV  old (StringIO)", lambda: self._consume(legacy_class_csv(class_id)))
+            self._measure("CSV  streaming", lambda: self._consume(
+                csv_stream_response(iter_class_csv(class_id), "bench.csv")
+            ))
+        if "xlsx" in formats:
+            if legacy:
+                self._measure("XLSX old (Workbook)", lambda: self._consume(legacy_class_xlsx(class_id)))
+            self._measure("XLSX write-only + spool", lambda: self._consume(
+                xlsx_file_response(export_class_xlsx(class_id), "bench.xlsx")
+            ))
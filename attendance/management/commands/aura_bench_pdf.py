@@ -0,0 +1,80 @@
+# attendance/management/commands/aura_bench_pdf.py
+#
+# Benchmark: render time and peak Python memory (tracemalloc) of the
+# tabular PDF reports — session report, subject report and class muster
+# roll — with the WeasyPrint templates and with the ReportLab engine
+# (pdf_tables.py), on one synthetic class (default 60 students x 120
+# sessions). Renders run inline (AURA_PDF_WORKERS=0) so both are measured
+# in this process, after a warm-up render. tracemalloc does not see
+# WeasyPrint's C libraries (Pango/Cairo), so its real footprint is higher
+# than reported. Runs inside a transaction that is rolled back at the end.
+
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from attendance.models import Session
+from attendance.pdf_tables import ENGINES
+from attendance.synthetic import generate_school
+from attendance.utils import export_session_pdf
+from attendance.views import export_class_muster_pdf, export_subject_pdf
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare WeasyPrint and ReportLab render time/memory on the tabular reports (rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=60)
+        parser.add_argument("--sessions", type=int, default=120)
+        parser.add_argument("--reports", default="session,subject,muster",
+                            help="Comma-separated: session, subject, muster")
+        parser.add_argument("--engines", default=",".join(ENGINES))
+
+    def handle(self, *args, **opts):
+        try:
+            with transaction.atomic():
+                self._run(opts)
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write("Synthetic data rolled back.")
+
+    def _measure(self, label, func):
+        func()   # warm up: imports, fonts, parsed templates
+        t0 = time.perf_counter()
+        size = len(func())
+        elapsed = time.perf_counter() - t0
+        # separate traced run: tracemalloc slows allocation-heavy code a lot
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f"  {label:<24} {size / 1e3:9.1f} kB out {elapsed:7.2f}s  peak {peak / 1e6:8.1f} MB"
+        )
+
+    def _run(self, opts):
+        students, sessions = opts["students"], opts["sessions"]
+        self.stdout.write(f"Generating one class: {students} students x {sessions} sessions...")
+        school = generate_school(
+            rows=students * sessions, classes=1, subjects=5, teachers=2, students=students,
+        )
+        class_group = school["classes"][0]
+        session = Session.objects.filter(class_group=class_group).first()
+        subject = session.subject
+
+        renders = {
+            "session": lambda: export_session_pdf(session.pk),
+            "subject": lambda: export_subject_pdf(subject),
+            "muster": lambda: export_class_muster_pdf(class_group),
+        }
+        for report in opts["reports"].split(","):
+            for engine in opts["engines"].split(","):
+                with override_settings(AURA_PDF_WORKERS=0, AURA_PDF_ENGINES={report: engine}):
+                    self._measure(f"{report:<8} {engine}", renders[report])
@@ -0,0 +1,45 @@
+# attendance/management/commands/aura_export_cache.py
+#
+# Inspect or clean the on-disk export cache (attendance/export_cache.py).
+# Without options prints the size, the limit and the most recently used
+# files; --evict applies the LRU size limit, --purge deletes files.
+
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from attendance import export_cache
+
+
+class Command(BaseCommand):
+    help = "Show, evict or purge cached export files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--purge", action="store_true", help="Delete cached files")
+        parser.add_argument("--older-than", type=float, default=None, metavar="DAYS",
+                            help="With --purge: only files not used for DAYS days")
+        parser.add_argument("--evict", action="store_true",
+                            help="Drop least recently used files until under the size limit")
+        parser.add_argument("--max-bytes", type=int, default=None,
+                            help="With --evict: limit to apply (default: AURA_EXPORT_CACHE_MAX_BYTES)")
+        parser.add_argument("--top", type=int, default=10, help="Files to list")
+
+    def handle(self, *args, **opts):
+        if opts["purge"]:
+            older = opts["older_than"] * 86400 if opts["older_than"] is not None else None
+            count, size = export_cache.purge(older_than=older)
+            self.stdout.write(f"Purged {count} files ({size / 1e6:.1f} MB).")
+            return
+        if opts["evict"]:
+            removed = export_cache.evict(limit=opts["max_bytes"])
+            self.stdout.write(f"Evicted {removed} files.")
+
+        files = export_cache.entries()
+        total = sum(size for _, size, _ in files)
+        self.stdout.write(
+            f"{export_cache.cache_dir()}: {len(files)} files, {total / 1e6:.1f} MB "
+            f"of {export_cache.max_bytes() / 1e6:.0f} MB"
+        )
+        for path, size, used in files[:opts["top"]]:
+            when = datetime.datetime.fromtimestamp(used).strftime("%Y-%m-%d %H:%M")
+            self.stdout.write(f"  {when}  {size / 1e3:10.1f} KB  {path.name}")
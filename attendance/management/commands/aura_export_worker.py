@@ -0,0 +1,34 @@
+# attendance/management/commands/aura_export_worker.py
+#
+# Long-running export builder (see the "exports" line in the Procfile).
+# Runs queued ExportLog jobs one at a time, writing files under
+# AURA_EXPORT_DIR for the Export Center to download.
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from attendance.exports import run_queued_exports
+
+
+class Command(BaseCommand):
+    help = "Build queued Export Center files (CSV/XLSX/PDF/ZIP)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run what is queued, then exit")
+        parser.add_argument("--limit", type=int, default=5, help="Jobs claimed per pass")
+        parser.add_argument("--interval", type=float, default=2.0,
+                            help="Seconds to sleep when nothing is queued")
+
+    def handle(self, *args, **opts):
+        try:
+            while True:
+                ran = run_queued_exports(limit=opts["limit"])
+                if ran:
+                    self.stdout.write(f"exports built: {ran}")
+                if opts["once"]:
+                    return
+                if not ran:
+                    time.sleep(opts["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Export worker stopped.")
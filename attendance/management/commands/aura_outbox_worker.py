@@ -0,0 +1,64 @@
+# attendance/management/commands/aura_outbox_worker.py
+#
+# Long-running email sender (see the "worker" line in the Procfile).
+# Runs queued notification jobs, drains EmailOutbox in batches, closes
+# finished jobs and logs the backlog after each pass.
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from attendance.jobs import complete_jobs, run_queued_jobs
+from attendance.outbox import backlog, drain
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox (retries with backoff)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain what is due, then exit")
+        parser.add_argument("--batch-size", type=int, default=None,
+                            help="Messages per SMTP connection (default: AURA_OUTBOX_BATCH_SIZE)")
+        parser.add_argument("--interval", type=float, default=5.0,
+                            help="Seconds to sleep when the queue is empty")
+        parser.add_argument("--stats", action="store_true", help="Only print the backlog")
+
+    def _report(self, stats=None):
+        depth = backlog()
+        line = (
+            f"backlog: pending={depth['pending']} due={depth['due']} "
+            f"sending={depth['sending']} failed={depth['failed']} "
+            f"oldest={depth['oldest_age_seconds']}s"
+        )
+        if stats:
+            line = f"sent={stats['sent']} failed={stats['failed']} | " + line
+        self.stdout.write(line)
+
+    def handle(self, *args, **opts):
+        if opts["stats"]:
+            self._report()
+            return
+
+        try:
+            while True:
+                try:
+                    jobs = run_queued_jobs()
+                    stats = drain(batch_size=opts["batch_size"])
+                    complete_jobs()
+                except Exception as e:
+                    # database or SMTP trouble: log, back off and keep the worker alive
+                    if opts["once"]:
+                        raise
+                    self.stderr.write(f"outbox pass failed: {e!r}")
+                    time.sleep(opts["interval"])
+                    continue
+                if jobs:
+                    self.stdout.write(f"notification jobs started: {jobs}")
+                if stats["batches"] or opts["once"]:
+                    self._report(stats)
+                if opts["once"]:
+                    return
+                if not stats["batches"]:
+                    time.sleep(opts["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Outbox worker stopped.")
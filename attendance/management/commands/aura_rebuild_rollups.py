@@ -0,0 +1,48 @@
+# attendance/management/commands/aura_rebuild_rollups.py
+
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils.timezone import localtime
+
+from attendance.models import Session
+from attendance.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild or repair the daily attendance rollup table for a date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="First local date (YYYY-MM-DD). Default: 30 days ago")
+        parser.add_argument("--end", help="Last local date (YYYY-MM-DD). Default: today")
+        parser.add_argument("--all", action="store_true", help="Rebuild the whole history")
+        parser.add_argument("--dry-run", action="store_true", help="Only report rows that would change")
+
+    def _parse(self, value, name):
+        try:
+            return datetime.strptime(value, "%Y-%m-%d").date()
+        except ValueError:
+            raise CommandError(f"--{name} must be YYYY-MM-DD")
+
+    def handle(self, *args, **opts):
+        today = localtime().date()
+
+        if opts["all"]:
+            first = Session.objects.aggregate(first=Min("start_time"))["first"]
+            start = localtime(first).date() if first else today
+        else:
+            start = self._parse(opts["start"], "start") if opts["start"] else today - timedelta(days=30)
+        end = self._parse(opts["end"], "end") if opts["end"] else today
+
+        if end < start:
+            raise CommandError("--end must not be before --start")
+
+        stats = rebuild_rollups(start, end, dry_run=opts["dry_run"])
+
+        mode = "Would change" if opts["dry_run"] else "Rollups rebuilt"
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode} for {start} → {end}: "
+            f"created={stats['created']} updated={stats['updated']} "
+            f"deleted={stats['deleted']} unchanged={stats['unchanged']}"
+        ))
@@ -1,70 +1,284 @@
 # attendance/management/commands/aura_weekly_email.py
+#
+# Weekly student reports + HOD digest in three stages:
+#   1) one query for every student's weekly present/absent (the 7-day
+#      counters of the student summaries while they are current, else
+#      aggregated from raw attendance),
+#   2) template rendering in a thread pool,
+#   3) sending over a small pool of persistent SMTP connections with
+#      send_messages() batches.
+# Students are handled in primary-key chunks; WeeklyEmailRun records the
+# last student of every finished send batch (and the digest as soon as it
+# is out), so a crashed run resumes instead of re-sending.
+# Messages that fail are handed to the email outbox for retry.
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
 from django.core.management.base import BaseCommand
+from django.db.models import Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast, Round
 from django.utils import timezone
-from datetime import timedelta, date
 
-from attendance.models import Student, User, Attendance, Session, ClassGroup
-from attendance.utils import (
-    build_weekly_student_report,
-    build_hod_weekly_digest,
-    send_email_notification,
-)
+from attendance.analytics import local_date_range_q
+from attendance.models import Student, User, WeeklyEmailRun
+from attendance.outbox import enqueue_email
+from attendance.summaries import own_class_window, summaries_current
+from attendance.utils import build_weekly_student_report, build_hod_weekly_digest
+
+DIGEST_THRESHOLD = 60
+
+
+def weekly_counts(start, end):
+    """
+    Students with an email and a class, annotated with their present/absent
+    counts in their own class between `start` and `end` — one query.
+    """
+    if end - start == timedelta(days=7) and summaries_current(end):
+        present, total = own_class_window(7)
+        absent = total - present
+    else:
+        in_range = (
+            local_date_range_q("attendance__timestamp", start, end)
+            & Q(attendance__session__class_group=F("class_group"))
+        )
+        present = Count("attendance", filter=in_range & Q(attendance__present=True))
+        absent = Count("attendance", filter=in_range & Q(attendance__present=False))
+
+    return (
+        Student.objects
+        .exclude(email__isnull=True).exclude(email="")
+        .filter(class_group__isnull=False)
+        .select_related("class_group")
+        .annotate(
+            present_count=present,
+            absent_count=absent,
+            perc=Case(
+                When(present_count=0, absent_count=0, then=Value(0.0)),
+                default=Round(Cast(present, FloatField()) * 100 / (present + absent), 2),
+                output_field=FloatField(),
+            ),
+        )
+        .order_by("pk")
+    )
+
+
+def render_report(student):
+    total = student.present_count + student.absent_count
+    percentage = round((student.present_count / total) * 100, 2) if total else 0
+    subject, body = build_weekly_student_report(
+        student, student.class_group,
+        student.present_count, student.absent_count, total, percentage,
+    )
+    return subject, body, [student.email]
+
+
+class ConnectionPool:
+    """One SMTP connection per sender thread, opened once and kept open."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = get_connection()
+            conn.open()
+            self._local.conn = conn
+            with self._lock:
+                self._all.append(conn)
+        return conn
+
+    def reset(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def close_all(self):
+        for conn in self._all:
+            conn.close()
 
 
 class Command(BaseCommand):
     help = "Send weekly attendance reports to students + HOD digest"
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Query and render everything, send nothing, keep no checkpoint")
+        parser.add_argument("--concurrency", type=int, default=4,
+                            help="Render threads and SMTP connections (default 4)")
+        parser.add_argument("--batch-size", type=int, default=50,
+                            help="Messages per send_messages() call")
+        parser.add_argument("--chunk-size", type=int, default=500,
+                            help="Students queried and rendered per round")
+        parser.add_argument("--restart", action="store_true",
+                            help="Discard this week's checkpoint and send to everyone again")
+
+    # -----------------------------------------------------
+    # SENDING
+    # -----------------------------------------------------
+    def _send_batch(self, batch):
+        """Send one batch on this thread's connection; returns the messages that failed."""
+        try:
+            conn = self.pool.get()
+            messages = [self._message(m, conn) for m in batch]
+            conn.send_messages(messages)
+            return []
+        except Exception:
+            self.pool.reset()
+
+        # isolate the failures on a fresh connection
+        failed = []
+        for m in batch:
+            try:
+                conn = self.pool.get()
+                conn.send_messages([self._message(m, conn)])
+            except Exception:
+                self.pool.reset()
+                failed.append(m)
+        return failed
+
+    def _message(self, m, conn):
+        subject, body, recipients = m
+        msg = EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, recipients, connection=conn)
+        msg.content_subtype = "html"
+        return msg
+
+    def _send_all(self, messages, senders, batch_size, checkpoint=None):
+        """
+        Send `messages` in batches across the sender threads; failures go to
+        the outbox. Batches finish in order, so after each one
+        checkpoint(done, sent, failed) is told that messages[:done] are dealt
+        with. Returns (sent, failed) totals.
+        """
+        batches = [messages[i:i + batch_size] for i in range(0, len(messages), batch_size)]
+        futures = [senders.submit(self._send_batch, batch) for batch in batches]
+        done = sent = failed = 0
+        try:
+            for batch, future in zip(batches, futures):
+                result = future.result()
+                for subject, body, recipients in result:
+                    enqueue_email(subject, body, recipients)
+                done += len(batch)
+                sent += len(batch) - len(result)
+                failed += len(result)
+                if checkpoint:
+                    checkpoint(done, len(batch) - len(result), len(result))
+        finally:
+            # interrupted: don't start batches the checkpoint would not cover
+            for future in futures:
+                future.cancel()
+        return sent, failed
+
+    # -----------------------------------------------------
+    def handle(self, *args, **opts):
+        dry_run = opts["dry_run"]
+        concurrency = max(1, opts["concurrency"])
         today = date.today()
         start = today - timedelta(days=7)
 
-        hod_digest = []
+        if dry_run:
+            run = WeeklyEmailRun(period_start=start, period_end=today)
+        else:
+            if opts["restart"]:
+                WeeklyEmailRun.objects.filter(period_end=today).delete()
+            run, created = WeeklyEmailRun.objects.get_or_create(
+                period_end=today, defaults={"period_start": start},
+            )
+            if run.finished_at:
+                self.stdout.write(self.style.WARNING(
+                    f"Weekly reports for {start} → {today} were already sent "
+                    f"({run.sent} sent). Use --restart to send again."
+                ))
+                return
+            if not created:
+                self.stdout.write(f"Resuming after student #{run.last_student_id} ({run.sent} already sent).")
 
-        # -------------------------------------------------------
-        # STUDENTS WEEKLY REPORT
-        # -------------------------------------------------------
-        for student in Student.objects.all():
-            if not student.email:
-                continue
+        timings = {"query": 0.0, "render": 0.0, "send": 0.0}
+        counts = {"students": 0, "sent": 0, "failed": 0}
+        self.pool = ConnectionPool()
+        t_total = time.perf_counter()
 
-            class_group = student.class_group
-            if not class_group:
-                continue
+        students = weekly_counts(start, today).filter(pk__gt=run.last_student_id)
 
-            qs = Attendance.objects.filter(
-                student=student,
-                session__class_group=class_group,
-                timestamp__date__range=[start, today]
-            )
+        try:
+            with ThreadPoolExecutor(concurrency) as renderers, \
+                    ThreadPoolExecutor(concurrency) as senders:
+                it = students.iterator(chunk_size=opts["chunk_size"])
+                while True:
+                    t0 = time.perf_counter()
+                    chunk = []
+                    for s in it:
+                        chunk.append(s)
+                        if len(chunk) >= opts["chunk_size"]:
+                            break
+                    timings["query"] += time.perf_counter() - t0
+                    if not chunk:
+                        break
 
-            present = qs.filter(present=True).count()
-            absent = qs.filter(present=False).count()
-            total = present + absent
-            percentage = round((present / total) * 100, 2) if total else 0
+                    t0 = time.perf_counter()
+                    messages = list(renderers.map(render_report, chunk))
+                    timings["render"] += time.perf_counter() - t0
+                    counts["students"] += len(chunk)
 
-            # Build + Send email
-            subject, body = build_weekly_student_report(
-                student, class_group, present, absent, total, percentage
-            )
-            send_email_notification(subject, body, [student.email])
-
-            # Prepare for HOD digest
-            if percentage < 60:
-                hod_digest.append({
-                    "student": student,
-                    "class": class_group,
-                    "percentage": percentage,
-                })
-
-        # -------------------------------------------------------
-        # SEND HOD DIGEST
-        # -------------------------------------------------------
-        hods = User.objects.filter(is_hod=True)
-        subject, body = build_hod_weekly_digest(hod_digest)
-
-        for h in hods:
-            if h.email:
-                send_email_notification(subject, body, [h.email])
-
-        self.stdout.write(self.style.SUCCESS("Weekly reports sent successfully."))
+                    if dry_run:
+                        continue
+
+                    def checkpoint(done, sent, failed, chunk=chunk):
+                        run.sent += sent
+                        run.failed += failed
+                        run.last_student_id = chunk[done - 1].pk
+                        run.save(update_fields=["sent", "failed", "last_student_id"])
+
+                    t0 = time.perf_counter()
+                    sent, failed = self._send_all(messages, senders, opts["batch_size"], checkpoint)
+                    timings["send"] += time.perf_counter() - t0
+
+                    counts["sent"] += sent
+                    counts["failed"] += failed
+
+                # -------------------------------------------------------
+                # HOD DIGEST (everyone below the threshold, incl. resumed chunks)
+                # -------------------------------------------------------
+                if not run.digest_sent:
+                    flagged = [
+                        {"student": s, "class": s.class_group, "percentage": s.perc}
+                        for s in weekly_counts(start, today).filter(perc__lt=DIGEST_THRESHOLD)
+                    ]
+                    subject, body = build_hod_weekly_digest(flagged)
+                    digest = [
+                        (subject, body, [email])
+                        for email in User.objects.filter(is_hod=True)
+                        .exclude(email="").values_list("email", flat=True)
+                    ]
+                    if not dry_run:
+                        sent, failed = self._send_all(digest, senders, opts["batch_size"])
+                        counts["sent"] += sent
+                        counts["failed"] += failed
+                        run.digest_sent = True
+                        run.save(update_fields=["digest_sent"])
+        finally:
+            self.pool.close_all()
+
+        if not dry_run:
+            run.finished_at = timezone.now()
+            run.save()
+
+        elapsed = time.perf_counter() - t_total
+        rate = counts["sent"] / timings["send"] if timings["send"] else 0
+        mode = "Dry run" if dry_run else "Weekly reports sent"
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode}: {counts['students']} students, {counts['sent']} sent, "
+            f"{counts['failed']} queued for retry in {elapsed:.2f}s"
+        ))
+        self.stdout.write(
+            f"  query {timings['query']:.2f}s | render {timings['render']:.2f}s | "
+            f"send {timings['send']:.2f}s ({rate:.1f} msgs/s, concurrency={concurrency})"
+        )
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_rollups(apps, schema_editor):
+    """Fill the rollup table from existing sessions (historical models only)."""
+    from django.db.models import Count, Q
+    from django.db.models.functions import TruncDate
+    from django.utils.timezone import localtime
+
+    Session = apps.get_model('attendance', 'Session')
+    DailyAttendanceRollup = apps.get_model('attendance', 'DailyAttendanceRollup')
+
+    rows = (
+        Session.objects
+        .annotate(day=TruncDate('start_time', tzinfo=localtime().tzinfo))
+        .values('day', 'class_group_id', 'subject_id', 'teacher_id')
+        .annotate(
+            session_count=Count('id', distinct=True),
+            present_count=Count('attendances', filter=Q(attendances__present=True)),
+            absent_count=Count('attendances', filter=Q(attendances__present=False)),
+        )
+        .order_by()
+    )
+    DailyAttendanceRollup.objects.bulk_create((
+        DailyAttendanceRollup(
+            date=r['day'], class_group_id=r['class_group_id'], subject_id=r['subject_id'],
+            teacher_id=r['teacher_id'], session_count=r['session_count'],
+            present_count=r['present_count'], absent_count=r['absent_count'],
+        )
+        for r in rows.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('present_count', models.PositiveIntegerField(default=0)),
+                ('absent_count', models.PositiveIntegerField(default=0)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('class_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='attendance.classgroup')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='attendance.subject')),
+                ('teacher', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='attendance__date_20f1bc_idx'), models.Index(fields=['teacher', 'date'], name='attendance__teacher_4742c1_idx')],
+                'unique_together': {('date', 'class_group', 'subject', 'teacher')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
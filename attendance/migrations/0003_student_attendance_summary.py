@@ -0,0 +1,83 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_summaries(apps, schema_editor):
+    """
+    Fill the summary table from existing attendance: all-time and 7/30-day
+    counters per (student, class, subject) plus a subject=NULL row per
+    (student, class). Historical models only, so later changes to
+    attendance.summaries cannot break this migration.
+    """
+    from datetime import datetime, time, timedelta
+
+    from django.db.models import Count, Q
+    from django.utils.timezone import get_current_timezone, localtime, make_aware
+
+    Attendance = apps.get_model('attendance', 'Attendance')
+    StudentAttendanceSummary = apps.get_model('attendance', 'StudentAttendanceSummary')
+
+    today = localtime().date()
+    tz = get_current_timezone()
+    tomorrow = make_aware(datetime.combine(today + timedelta(days=1), time.min), tz)
+
+    counts = {'total': Count('id'), 'present_total': Count('id', filter=Q(present=True))}
+    for n in (7, 30):
+        start = make_aware(datetime.combine(today - timedelta(days=n), time.min), tz)
+        in_window = Q(session__start_time__gte=start, session__start_time__lt=tomorrow)
+        counts[f'total_{n}d'] = Count('id', filter=in_window)
+        counts[f'present_{n}d'] = Count('id', filter=in_window & Q(present=True))
+
+    def pct(present, total):
+        return round((present / total) * 100, 2) if total else 0
+
+    rows = []
+    for group in (('student_id', 'session__class_group_id', 'session__subject_id'),
+                  ('student_id', 'session__class_group_id')):
+        for r in Attendance.objects.values(*group).annotate(**counts).order_by():
+            rows.append(StudentAttendanceSummary(
+                student_id=r['student_id'],
+                class_group_id=r['session__class_group_id'],
+                subject_id=r.get('session__subject_id'),
+                as_of=today,
+                pct_total=pct(r['present_total'], r['total']),
+                pct_30d=pct(r['present_30d'], r['total_30d']),
+                **{f: r[f] for f in counts},
+            ))
+    StudentAttendanceSummary.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_daily_attendance_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField()),
+                ('present_total', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('present_7d', models.PositiveIntegerField(default=0)),
+                ('total_7d', models.PositiveIntegerField(default=0)),
+                ('present_30d', models.PositiveIntegerField(default=0)),
+                ('total_30d', models.PositiveIntegerField(default=0)),
+                ('pct_total', models.FloatField(default=0)),
+                ('pct_30d', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('class_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_summaries', to='attendance.classgroup')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='attendance.student')),
+                ('subject', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='student_summaries', to='attendance.subject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['class_group', 'subject', 'pct_30d'], name='attendance__class_g_569561_idx'), models.Index(fields=['as_of'], name='attendance__as_of_c0bb33_idx')],
+                'unique_together': {('student', 'class_group', 'subject')},
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
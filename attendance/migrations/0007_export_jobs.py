@@ -0,0 +1,62 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0006_notification_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportlog',
+            name='filename',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='exportlog',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='exportlog',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='exportlog',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='exportlog',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='exportlog',
+            name='status',
+            # rows logged before export jobs existed are not work to pick up
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='done', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='exportlog',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='exportlog',
+            name='file_path',
+            field=models.CharField(blank=True, default='', max_length=300),
+        ),
+        migrations.AddIndex(
+            model_name='exportlog',
+            index=models.Index(fields=['status', 'created_at'], name='attendance__status_94da61_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='exportlog',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('fingerprint',), name='one_active_export_job'),
+        ),
+    ]
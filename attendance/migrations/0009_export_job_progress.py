@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0008_updated_at_watermarks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportlog',
+            name='progress',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='exportlog',
+            name='total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0009_export_job_progress'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='exportlog',
+            name='one_active_export_job',
+        ),
+        migrations.AddConstraint(
+            model_name='exportlog',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('created_by', 'fingerprint'), name='one_active_export_job'),
+        ),
+    ]
@@ -52,6 +52,7 @@ class Student(models.Model):
     class_group = models.ForeignKey(ClassGroup, on_delete=models.SET_NULL, null=True, blank=True)
     nfc_uid = models.CharField(max_length=100, blank=True, null=True)  # card UID
     metadata = models.JSONField(blank=True, null=True)  # any extra info
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # export cache watermark
 
     def __str__(self):
         return f"{self.student_id} | {self.first_name} {self.last_name}"
@@ -85,6 +86,7 @@ class Session(models.Model):
     # mark if a session was cancelled / holiday etc.
     cancelled = models.BooleanField(default=False)
     notes = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)  # export cache watermark
 
     class Meta:
         indexes = [
@@ -105,6 +107,7 @@ class Attendance(models.Model):
     source = models.CharField(max_length=32, default='RFID+FACE')  # or 'Manual', 'RFID', 'Face'
     extra = models.JSONField(blank=True, null=True)  # optional metadata (e.g. camera score)
     device_id = models.CharField(max_length=50, blank=True, null=True)  # which device recorded this
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # export cache / summary watermark
 
     class Meta:
         unique_together = ('session', 'student')
@@ -114,6 +117,68 @@ class Attendance(models.Model):
         status = "Present" if self.present else "Absent"
         return f"{self.student.student_id} | {self.session.session_id} | {status}"
 
+
+# --- Daily rollup (pre-aggregated attendance stats) ------------------------
+class DailyAttendanceRollup(models.Model):
+    """
+    Attendance totals for one local day, keyed by class, subject and teacher.
+    Maintained by attendance.rollups whenever sessions/attendance are written;
+    charts and analytics read these small rows instead of raw Attendance.
+    """
+    date = models.DateField()   # LOCAL date of Session.start_time
+    class_group = models.ForeignKey(ClassGroup, on_delete=models.CASCADE, related_name='daily_rollups')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='daily_rollups')
+    teacher = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='daily_rollups')
+    present_count = models.PositiveIntegerField(default=0)
+    absent_count = models.PositiveIntegerField(default=0)
+    session_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('date', 'class_group', 'subject', 'teacher')
+        indexes = [
+            models.Index(fields=['date']),
+            models.Index(fields=['teacher', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} | {self.class_group} | {self.subject} | P{self.present_count}/A{self.absent_count}"
+
+
+# --- Per-student attendance summary (rolling counters) ---------------------
+class StudentAttendanceSummary(models.Model):
+    """
+    Present/total counters for one student in one class and subject, all-time
+    and over rolling 7/30-day windows ending on `as_of`. A row with
+    subject=NULL holds the student's totals across all subjects of the class.
+    Maintained by attendance.summaries; the aura_age_summaries job moves the
+    windows forward every day.
+    """
+    student = models.ForeignKey('Student', on_delete=models.CASCADE, related_name='attendance_summaries')
+    class_group = models.ForeignKey(ClassGroup, on_delete=models.CASCADE, related_name='student_summaries')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, null=True, blank=True, related_name='student_summaries')
+    as_of = models.DateField()   # LOCAL date the rolling windows end on
+    present_total = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    present_7d = models.PositiveIntegerField(default=0)
+    total_7d = models.PositiveIntegerField(default=0)
+    present_30d = models.PositiveIntegerField(default=0)
+    total_30d = models.PositiveIntegerField(default=0)
+    pct_total = models.FloatField(default=0)
+    pct_30d = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)   # freshness vs Attendance.updated_at
+
+    class Meta:
+        unique_together = ('student', 'class_group', 'subject')
+        indexes = [
+            # "everyone under N% in the last 30 days" for a set of classes
+            models.Index(fields=['class_group', 'subject', 'pct_30d']),
+            models.Index(fields=['as_of']),
+        ]
+
+    def __str__(self):
+        return f"{self.student} | {self.class_group} | {self.subject or 'all'} | {self.pct_30d}%"
+
 # --- Holidays / non-teaching days ------------------------------------------
 class Holiday(models.Model):
     date = models.DateField(unique=True)
@@ -138,11 +203,47 @@ class Enrollment(models.Model):
 
 # --- Reports / exported logs optional model --------------------------------
 class ExportLog(models.Model):
+    """
+    One export request. The Export Center queues it, aura_export_worker
+    writes the file under AURA_EXPORT_DIR and the UI polls until it can
+    download. A user's identical requests share the job while it is in
+    flight; across users the built file is shared by the export cache.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE = [QUEUED, RUNNING]
+
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     params = models.JSONField()   # filters used
-    file_path = models.CharField(max_length=300)  # where CSV/XLSX is saved
+    file_path = models.CharField(max_length=300, blank=True, default='')  # where CSV/XLSX is saved
     note = models.TextField(blank=True, null=True)
+    fingerprint = models.CharField(max_length=64, blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    filename = models.CharField(max_length=200, blank=True, default='')   # download name
+    size = models.PositiveBigIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    progress = models.PositiveIntegerField(default=0)   # items done (batch jobs)
+    total = models.PositiveIntegerField(default=0)      # items to do, 0 = unknown
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['created_by', 'fingerprint'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='one_active_export_job',
+            ),
+        ]
 
     def __str__(self):
         return f"Export {self.id} by {self.created_by} at {self.created_at}"
@@ -186,6 +287,115 @@ class Device(models.Model):
         return self.device_id
 
 
+# --- Background notification jobs (e.g. red-flag emails) -----------------
+class NotificationJob(models.Model):
+    """
+    A bulk notification requested from the UI. The outbox worker builds the
+    recipient list, queues one EmailOutbox row per message and the status
+    endpoint reports progress from those rows.
+    """
+    REDFLAG = 'redflag'
+    KIND_CHOICES = [(REDFLAG, 'Red-flag students')]
+
+    QUEUED = 'queued'
+    RUNNING = 'running'      # building the message list
+    SENDING = 'sending'      # messages handed to the outbox
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SENDING, 'Sending'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE = [QUEUED, RUNNING, SENDING]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_jobs')
+    params = models.JSONField(default=dict)
+    fingerprint = models.CharField(max_length=64)   # same request while active => same job
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    total = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['created_by', 'kind', 'fingerprint'],
+                condition=models.Q(status__in=['queued', 'running', 'sending']),
+                name='one_active_notification_job',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} job {self.pk} ({self.status})"
+
+
+# --- Email outbox (sent by the aura_outbox_worker command) ---------------
+class EmailOutbox(models.Model):
+    """
+    One queued email. Request paths only insert rows (inside their own
+    transaction); attendance.outbox delivers them in batches with retries.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html = models.BooleanField(default=True)
+    recipients = models.JSONField()   # list of addresses
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)   # claimed by a worker
+    last_error = models.TextField(blank=True)
+    job = models.ForeignKey(NotificationJob, on_delete=models.SET_NULL, null=True, blank=True,
+                            related_name='emails')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+
+# --- Weekly email run checkpoint (aura_weekly_email) ----------------------
+class WeeklyEmailRun(models.Model):
+    """
+    Progress of one weekly report run. Students are processed in primary-key
+    order and `last_student_id` advances after every completed chunk, so a
+    crashed run resumes after the last finished chunk.
+    """
+    period_start = models.DateField()
+    period_end = models.DateField(unique=True)
+    last_student_id = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)   # handed to the outbox for retry
+    digest_sent = models.BooleanField(default=False)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        state = "done" if self.finished_at else f"at student #{self.last_student_id}"
+        return f"Weekly email {self.period_start} → {self.period_end} ({state})"
+
+
 
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -269,3 +479,79 @@ class PendingStudent(models.Model):
 
     def __str__(self):
         return f"{self.student.student_id} -> {self.present}"
+
+
+# =====================================================================
+# Analytics cache invalidation: any attendance/session write bumps the
+# global data version (see analytics_cache.py)
+# =====================================================================
+from django.db.models.signals import post_delete
+from .analytics_cache import invalidate_after_write
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+@receiver(post_save, sender=Session)
+@receiver(post_delete, sender=Session)
+@receiver(post_save, sender=ClassGroup)
+@receiver(post_delete, sender=ClassGroup)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=TeacherProfile)
+@receiver(post_delete, sender=TeacherProfile)
+def invalidate_analytics_cache(sender, **kwargs):
+    invalidate_after_write()
+
+
+# =====================================================================
+# Rollup and student summary maintenance for edits and deletes (inserts
+# refresh explicitly through rollups.refresh_rollup_for_session and
+# summaries.refresh_summaries_for_session)
+# =====================================================================
+from django.db.models.signals import post_init
+
+
+@receiver(post_init, sender=Session)
+def remember_rollup_key(sender, instance, **kwargs):
+    from .rollups import KEY_FIELDS
+
+    loaded = instance.__dict__
+    if instance.pk is not None and all(f in loaded for f in KEY_FIELDS):
+        instance._rollup_fields = tuple(loaded[f] for f in KEY_FIELDS)
+    else:
+        instance._rollup_fields = None   # new or partially loaded: nothing to compare
+
+
+@receiver(post_save, sender=Session)
+def refresh_rollup_on_session_move(sender, instance, created, raw=False, **kwargs):
+    from . import summaries
+    from .rollups import KEY_FIELDS, refresh_moved_session
+
+    old = getattr(instance, "_rollup_fields", None)
+    if old is not None and not created and not raw:
+        refresh_moved_session(old, instance)
+        summaries.refresh_moved_session(old, instance)
+    instance._rollup_fields = tuple(getattr(instance, f) for f in KEY_FIELDS)
+
+
+@receiver(post_delete, sender=Session)
+def refresh_rollup_on_session_delete(sender, instance, origin=None, **kwargs):
+    from .rollups import refresh_after_delete, session_key
+
+    refresh_after_delete(origin if origin is not None else instance, session_key(instance))
+
+
+@receiver(post_delete, sender=Attendance)
+def refresh_rollup_on_attendance_delete(sender, instance, origin=None, **kwargs):
+    from .rollups import refresh_after_attendance_delete
+
+    if isinstance(origin, Session) or getattr(origin, "model", None) is Session:
+        return   # cascade from a session delete: its own receiver refreshes the key
+    refresh_after_attendance_delete(origin if origin is not None else instance, instance.session_id)
+
+
+@receiver(post_delete, sender=Attendance)
+def refresh_summaries_on_attendance_delete(sender, instance, origin=None, **kwargs):
+    from .summaries import refresh_after_attendance_delete
+
+    refresh_after_attendance_delete(origin if origin is not None else instance, instance)
@@ -0,0 +1,181 @@
+# attendance/outbox.py
+#
+# Durable email outbox. Request paths call enqueue_email() inside their
+# transaction — an INSERT, no SMTP — and the aura_outbox_worker command
+# drains the table: one SMTP connection per batch, failed messages are
+# retried with exponential backoff until AURA_OUTBOX_MAX_ATTEMPTS.
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ---------------------------------------------------------
+# PRODUCER
+# ---------------------------------------------------------
+def _row(subject, body, recipients, html=True, job=None):
+    recipients = [r for r in recipients if r]
+    if not recipients:
+        return None
+    return EmailOutbox(
+        subject=subject[:255], body=body, html=html, recipients=recipients, job=job,
+    )
+
+
+def enqueue_email(subject, body, recipients, html=True, job=None):
+    """Queue one email; returns the outbox row (None without recipients)."""
+    row = _row(subject, body, recipients, html, job)
+    if row is not None:
+        row.save()
+    return row
+
+
+def enqueue_many(messages, job=None):
+    """Queue (subject, body, recipients) tuples with one bulk INSERT."""
+    rows = [r for r in (_row(*m, job=job) for m in messages) if r is not None]
+    return EmailOutbox.objects.bulk_create(rows, batch_size=500)
+
+
+# ---------------------------------------------------------
+# WORKER
+# ---------------------------------------------------------
+def _due_q(now):
+    """Pending rows that are due, or rows a crashed worker never finished."""
+    lease = timedelta(seconds=_setting("AURA_OUTBOX_LEASE", 5 * 60))
+    return (
+        Q(status=EmailOutbox.PENDING, next_attempt_at__lte=now)
+        | Q(status=EmailOutbox.SENDING, locked_at__lt=now - lease)
+    )
+
+
+def claim_batch(limit):
+    """
+    Mark up to `limit` due rows as SENDING and return them. The claim is a
+    conditional UPDATE, so two workers never get the same row.
+    """
+    now = timezone.now()
+    ids = list(
+        EmailOutbox.objects.filter(_due_q(now))
+        .order_by("next_attempt_at", "id")
+        .values_list("id", flat=True)[:limit]
+    )
+    if not ids:
+        return []
+
+    EmailOutbox.objects.filter(_due_q(now), id__in=ids).update(
+        status=EmailOutbox.SENDING, locked_at=now,
+    )
+    return list(
+        EmailOutbox.objects.filter(id__in=ids, status=EmailOutbox.SENDING, locked_at=now)
+        .order_by("id")
+    )
+
+
+def backoff(attempts):
+    """Delay before retry number `attempts` (1-based): base * 2^(n-1), capped."""
+    base = _setting("AURA_OUTBOX_RETRY_BASE", 30)
+    cap = _setting("AURA_OUTBOX_RETRY_MAX", 60 * 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap))
+
+
+def _message(row, connection):
+    msg = EmailMessage(
+        row.subject, row.body, settings.DEFAULT_FROM_EMAIL, row.recipients,
+        connection=connection,
+    )
+    if row.html:
+        msg.content_subtype = "html"
+    return msg
+
+
+def deliver(rows, connection=None):
+    """
+    Send `rows` over one SMTP connection and record the outcome of each.
+    Returns (sent, failed) counts.
+    """
+    connection = connection or get_connection()
+    max_attempts = _setting("AURA_OUTBOX_MAX_ATTEMPTS", 6)
+    sent, failed = [], []
+
+    try:
+        connection.open()
+    except Exception as e:
+        # SMTP unreachable: the whole batch counts as a failed attempt, so
+        # rows back off and eventually give up instead of sitting in SENDING
+        failed = [(row, e) for row in rows]
+    else:
+        with connection:
+            for row in rows:
+                try:
+                    connection.send_messages([_message(row, connection)])
+                    sent.append(row.pk)
+                except Exception as e:
+                    failed.append((row, e))
+                    # the session may be broken — reconnect for the rest of the batch
+                    connection.close()
+                    try:
+                        connection.open()
+                    except Exception:
+                        pass
+
+    now = timezone.now()
+    if sent:
+        EmailOutbox.objects.filter(pk__in=sent).update(
+            status=EmailOutbox.SENT, sent_at=now, locked_at=None, last_error="",
+        )
+    for row, error in failed:
+        row.attempts += 1
+        row.last_error = str(error)[:2000]
+        row.locked_at = None
+        if row.attempts >= max_attempts:
+            row.status = EmailOutbox.FAILED
+        else:
+            row.status = EmailOutbox.PENDING
+            row.next_attempt_at = now + backoff(row.attempts)
+        row.save(update_fields=["attempts", "last_error", "locked_at", "status", "next_attempt_at"])
+
+    return len(sent), len(failed)
+
+
+def drain(batch_size=None, max_batches=None, connection=None):
+    """Deliver due messages batch by batch until none are left."""
+    batch_size = batch_size or _setting("AURA_OUTBOX_BATCH_SIZE", 50)
+    stats = {"sent": 0, "failed": 0, "batches": 0}
+
+    while max_batches is None or stats["batches"] < max_batches:
+        rows = claim_batch(batch_size)
+        if not rows:
+            break
+        sent, failed = deliver(rows, connection)
+        stats["sent"] += sent
+        stats["failed"] += failed
+        stats["batches"] += 1
+
+    return stats
+
+
+# ---------------------------------------------------------
+# MONITORING
+# ---------------------------------------------------------
+def backlog():
+    """Queue depth by state plus the age of the oldest unsent message."""
+    now = timezone.now()
+    counts = EmailOutbox.objects.exclude(status=EmailOutbox.SENT).aggregate(
+        pending=Count("id", filter=Q(status=EmailOutbox.PENDING)),
+        due=Count("id", filter=_due_q(now)),
+        sending=Count("id", filter=Q(status=EmailOutbox.SENDING)),
+        failed=Count("id", filter=Q(status=EmailOutbox.FAILED)),
+        oldest=Min("created_at", filter=Q(status__in=[EmailOutbox.PENDING, EmailOutbox.SENDING])),
+    )
+    oldest = counts.pop("oldest")
+    counts["oldest_age_seconds"] = int((now - oldest).total_seconds()) if oldest else 0
+    return counts
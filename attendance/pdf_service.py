@@ -0,0 +1,298 @@
+# attendance/pdf_service.py
+#
+# PDF rendering off the request thread. render_pdf() hands the HTML to a
+# ProcessPoolExecutor (AURA_PDF_WORKERS processes, each replaced after
+# AURA_PDF_MAX_TASKS_PER_CHILD renders to cap WeasyPrint's memory growth)
+# and waits at most AURA_PDF_TIMEOUT seconds. Each gunicorn worker admits
+# AURA_PDF_WORKERS + AURA_PDF_MAX_QUEUE renders at a time; beyond that
+# PDFServiceBusy is raised and @pdf_service_errors turns it into a 503.
+# A render that times out has its pool torn down (its processes killed)
+# so a runaway document cannot keep a CPU pinned.
+# AURA_PDF_WORKERS = 0 renders inline (development, tests).
+#
+# render_many() streams a batch of documents through the same pool (a
+# bounded window of submissions, results in order) and render_merged()
+# renders a batch into one PDF; both are for background jobs.
+#
+# Static and media URLs in a document are read from disk (STATIC_ROOT,
+# then the staticfiles finders; MEDIA_ROOT) instead of being fetched over
+# HTTP from our own busy server. Fetched assets and the FontConfiguration
+# are cached per render process.
+
+import atexit
+import functools
+import mimetypes
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import HttpResponse
+from django.utils._os import safe_join
+
+
+class PDFServiceBusy(Exception):
+    """Too many renders queued; the caller should retry later."""
+
+
+class PDFRenderTimeout(Exception):
+    """A render took longer than AURA_PDF_TIMEOUT."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# ---------------------------------------------------------
+# WORKER PROCESS
+# ---------------------------------------------------------
+def _init_worker(settings_module):
+    """Pool initializer: make settings/apps usable inside the render process."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+    django.setup()
+
+
+# Relative URLs in templates resolve against this when no base_url is given
+LOCAL_BASE_URL = "file:///"
+
+
+def _prefix(url_setting):
+    url = getattr(settings, url_setting, "") or ""
+    return "/" + url.strip("/") + "/" if url.strip("/") else None
+
+
+def local_asset_path(url, base_url=None):
+    """
+    Disk path for a static/media URL served by this site, or None. Only
+    URLs on the document's own host (or relative/file URLs) are mapped.
+    """
+    parts = urlsplit(url)
+    own_hosts = {"", urlsplit(base_url or "").netloc}
+    if parts.scheme not in ("", "http", "https", "file") or parts.netloc not in own_hosts:
+        return None
+    path = unquote(parts.path)
+
+    try:
+        static = _prefix("STATIC_URL")
+        if static and path.startswith(static):
+            relative = path[len(static):]
+            if getattr(settings, "STATIC_ROOT", None):
+                candidate = Path(safe_join(settings.STATIC_ROOT, relative))
+                if candidate.is_file():
+                    return candidate
+            from django.contrib.staticfiles import finders
+            found = finders.find(relative)
+            return Path(found) if found else None
+
+        media = _prefix("MEDIA_URL")
+        if media and path.startswith(media) and getattr(settings, "MEDIA_ROOT", None):
+            candidate = Path(safe_join(settings.MEDIA_ROOT, path[len(media):]))
+            return candidate if candidate.is_file() else None
+    except SuspiciousFileOperation:   # "../" out of the asset roots
+        return None
+    return None
+
+
+@functools.lru_cache(maxsize=256)
+def _read_asset(path, mtime):
+    return Path(path).read_bytes()
+
+
+def make_url_fetcher(base_url=None):
+    """WeasyPrint url_fetcher: local static/media from disk, anything else as usual."""
+    from weasyprint import default_url_fetcher
+
+    def fetcher(url, *args, **kwargs):
+        path = local_asset_path(url, base_url)
+        if path is None:
+            return default_url_fetcher(url, *args, **kwargs)
+        return {
+            "string": _read_asset(str(path), path.stat().st_mtime),
+            "mime_type": mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+            "filename": path.name,
+            "redirected_url": url,
+        }
+    return fetcher
+
+
+@functools.lru_cache(maxsize=None)
+def font_config():
+    from weasyprint.text.fonts import FontConfiguration
+    return FontConfiguration()
+
+
+def _render(html, base_url=None):
+    from weasyprint import HTML
+    document = HTML(
+        string=html, base_url=base_url or LOCAL_BASE_URL, url_fetcher=make_url_fetcher(base_url),
+    )
+    return document.write_pdf(font_config=font_config())
+
+
+def _render_merged(htmls, base_url=None):
+    """Lay out every document and write their pages as a single PDF."""
+    from weasyprint import HTML
+    documents = [
+        HTML(string=html, base_url=base_url or LOCAL_BASE_URL, url_fetcher=make_url_fetcher(base_url))
+        .render(font_config=font_config())
+        for html in htmls
+    ]
+    pages = [page for document in documents for page in document.pages]
+    return documents[0].copy(pages).write_pdf()
+
+
+# ---------------------------------------------------------
+# POOL
+# ---------------------------------------------------------
+_lock = threading.Lock()
+_pool = None
+_slots = None
+
+
+def _get_pool():
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            workers = _setting("AURA_PDF_WORKERS", 2)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                max_tasks_per_child=_setting("AURA_PDF_MAX_TASKS_PER_CHILD", 50),
+                initializer=_init_worker,
+                initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "attendance_server.settings"),),
+            )
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(
+                _setting("AURA_PDF_WORKERS", 2) + _setting("AURA_PDF_MAX_QUEUE", 8)
+            )
+        return _pool
+
+
+def _discard_pool(pool, kill=False):
+    """Drop `pool` (if still current); with kill=True terminate its processes."""
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    if kill:
+        # ProcessPoolExecutor has no per-task cancel for running work
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown():
+    global _slots
+    with _lock:
+        pool = _pool
+        _slots = None
+    if pool is not None:
+        _discard_pool(pool)
+
+
+atexit.register(shutdown)
+
+
+def run_in_pool(fn, *args, timeout=None):
+    """Run fn(*args) in the render pool, honouring the queue limit and timeout."""
+    if _setting("AURA_PDF_WORKERS", 2) <= 0:
+        return fn(*args)
+
+    timeout = timeout if timeout is not None else _setting("AURA_PDF_TIMEOUT", 60)
+    pool = _get_pool()
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        raise PDFServiceBusy("PDF renderer is busy")
+    try:
+        for attempt in range(2):
+            future = pool.submit(fn, *args)
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeout:
+                _discard_pool(pool, kill=True)
+                raise PDFRenderTimeout(f"PDF render exceeded {timeout}s")
+            except BrokenProcessPool:
+                # another request's timeout killed this pool: retry once on a fresh one
+                _discard_pool(pool)
+                if attempt:
+                    raise
+                pool = _get_pool()
+    finally:
+        slots.release()
+
+
+def render_pdf(html, base_url=None, timeout=None):
+    """Render HTML to PDF bytes in the worker pool."""
+    return run_in_pool(_render, html, base_url, timeout=timeout)
+
+
+def render_many(htmls, base_url=None, timeout=None):
+    """
+    Yield PDF bytes for each HTML string in `htmls`, in order, rendering up
+    to AURA_PDF_WORKERS documents at once. Meant for background jobs: it
+    does not take request slots, and `timeout` applies per document.
+    """
+    workers = _setting("AURA_PDF_WORKERS", 2)
+    if workers <= 0:
+        for html in htmls:
+            yield _render(html, base_url)
+        return
+
+    timeout = timeout if timeout is not None else _setting("AURA_PDF_TIMEOUT", 60)
+    pool = _get_pool()
+    pending = iter(htmls)
+    window = deque()
+
+    def submit():
+        html = next(pending, None)
+        if html is not None:
+            window.append(pool.submit(_render, html, base_url))
+
+    try:
+        for _ in range(workers * 2):
+            submit()
+        while window:
+            try:
+                pdf = window.popleft().result(timeout=timeout)
+            except FutureTimeout:
+                _discard_pool(pool, kill=True)
+                raise PDFRenderTimeout(f"PDF render exceeded {timeout}s")
+            submit()
+            yield pdf
+    finally:
+        for future in window:
+            future.cancel()
+
+
+def render_merged(htmls, base_url=None, timeout=None):
+    """
+    Render all of `htmls` into one PDF. Runs as a single pool task (pages
+    from separate documents can only be combined inside one process).
+    """
+    htmls = list(htmls)
+    if timeout is None:
+        timeout = _setting("AURA_PDF_TIMEOUT", 60) * max(1, len(htmls))
+    return run_in_pool(_render_merged, htmls, base_url, timeout=timeout)
+
+
+# ---------------------------------------------------------
+# VIEWS
+# ---------------------------------------------------------
+def pdf_service_errors(view):
+    """503 (with Retry-After) when the renderer is saturated, 504 on timeout."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except PDFServiceBusy:
+            response = HttpResponse("PDF service busy, try again shortly.", status=503)
+            response["Retry-After"] = "5"
+            return response
+        except PDFRenderTimeout:
+            return HttpResponse("PDF rendering timed out.", status=504)
+    return wrapper
@@ -0,0 +1,228 @@
+# attendance/pdf_tables.py
+#
+# ReportLab (platypus) engine for the register-style PDF reports: session
+# report, subject report and class muster roll. These are plain tables,
+# which WeasyPrint lays out slowly (full CSS box model for every cell);
+# platypus draws them directly. Rows are cut into page-sized Table
+# flowables with the header repeated, so layout stays linear in the row
+# count instead of re-splitting one huge table on every page, and wide
+# muster grids are cut into column bands.
+#
+# A report uses AURA_PDF_ENGINES[report] if set, else AURA_PDF_ENGINE
+# ("weasyprint" or "reportlab"). Renders run in the pdf_service pool like
+# the WeasyPrint ones; the spec passed to the pool is plain strings.
+
+import functools
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.utils import timezone
+
+from .pdf_service import run_in_pool
+
+ENGINES = ("weasyprint", "reportlab")
+ROWS_PER_TABLE = 40        # rows per Table flowable (about one page)
+MUSTER_BAND_SESSIONS = 30  # session columns per muster band (landscape A4)
+
+
+def pdf_engine(report):
+    """Engine for `report` ("session", "subject", "muster", ...)."""
+    engine = getattr(settings, "AURA_PDF_ENGINES", {}).get(
+        report, getattr(settings, "AURA_PDF_ENGINE", "weasyprint")
+    )
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown PDF engine {engine!r} for {report} report")
+    return engine
+
+
+def _stamp(dt):
+    return timezone.localtime(dt).strftime("%Y-%m-%d %H:%M") if dt else ""
+
+
+# ---------------------------------------------------------
+# RENDER (runs in the pdf_service pool)
+# ---------------------------------------------------------
+def _fit(text, width, font, size):
+    """Trim `text` with an ellipsis so it fits in `width` points."""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    if stringWidth(text, font, size) <= width:
+        return text
+    while text and stringWidth(text + "…", font, size) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+def _draw_footer(text, canvas, doc):
+    canvas.saveState()
+    canvas.setFont("Helvetica", 7)
+    canvas.drawString(doc.leftMargin, doc.bottomMargin / 2, text)
+    canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, doc.bottomMargin / 2, f"Page {doc.page}")
+    canvas.restoreState()
+
+
+def _tables(section, font_size):
+    """Page-sized Table flowables for one section, header repeated on each."""
+    from reportlab.lib import colors
+    from reportlab.platypus import Spacer, Table, TableStyle
+
+    header = section["header"]
+    widths = section.get("widths")
+    fit = section.get("fit", ())   # columns trimmed to their width
+    # section["highlight"]: (row, col) cells of `rows` shown in red
+    style = TableStyle([
+        ("FONT", (0, 0), (-1, -1), "Helvetica", font_size),
+        ("FONT", (0, 0), (-1, len(header) - 1), "Helvetica-Bold", font_size),
+        ("BACKGROUND", (0, 0), (-1, len(header) - 1), colors.HexColor("#e8eaf6")),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#999999")),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("TOPPADDING", (0, 0), (-1, -1), 2),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
+        ("LEFTPADDING", (0, 0), (-1, -1), 3),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 3),
+        *section.get("style", ()),
+    ])
+
+    rows = section["rows"]
+    flowables = []
+    for start in range(0, max(len(rows), 1), ROWS_PER_TABLE):
+        chunk = [list(r) for r in rows[start:start + ROWS_PER_TABLE]]
+        for row in chunk:
+            for col in fit:
+                row[col] = _fit(str(row[col]), widths[col] - 6, "Helvetica", font_size)
+        table = Table(header + chunk, colWidths=widths, repeatRows=len(header), style=style)
+        red = colors.HexColor("#d32f2f")
+        table.setStyle([
+            ("TEXTCOLOR", (col, at), (col, at), red)
+            for row, col in section.get("highlight", ())
+            if start <= row < start + ROWS_PER_TABLE
+            for at in [row - start + len(header)]
+        ])
+        flowables.append(table)
+    flowables.append(Spacer(0, 8))
+    return flowables
+
+
+def _render_tables(spec):
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+    styles = getSampleStyleSheet()
+    out = BytesIO()
+    doc = SimpleDocTemplate(
+        out, pagesize=landscape(A4) if spec.get("landscape") else A4, title=spec["title"],
+        leftMargin=10 * mm, rightMargin=10 * mm, topMargin=10 * mm, bottomMargin=12 * mm,
+    )
+    story = [Paragraph(escape(spec["title"]), styles["Title"])]
+    story += [Paragraph(escape(line), styles["Normal"]) for line in spec.get("meta", ())]
+    story.append(Spacer(0, 8))
+    for section in spec["sections"]:
+        if section.get("heading"):
+            story.append(Paragraph(escape(section["heading"]), styles["Heading4"]))
+        story += _tables(section, spec.get("font_size", 8))
+    footer = functools.partial(_draw_footer, spec.get("footer", "AURA Attendance System"))
+    doc.build(story, onFirstPage=footer, onLaterPages=footer)
+    return out.getvalue()
+
+
+def render_tables(spec, timeout=None):
+    """PDF bytes for a table report spec, rendered in the PDF pool."""
+    return run_in_pool(_render_tables, spec, timeout=timeout)
+
+
+# ---------------------------------------------------------
+# REPORT SPECS (request side: model data -> plain strings)
+# ---------------------------------------------------------
+def session_report_pdf(session, attendances):
+    rows = [
+        [f"{a.student.student_id} - {a.student.first_name} {a.student.last_name}",
+         "Yes" if a.present else "No", "Yes" if a.verified_by_face else "No", _stamp(a.timestamp)]
+        for a in attendances
+    ]
+    return render_tables({
+        "title": f"Session Report - {session.session_id}",
+        "meta": [f"Class: {session.class_group.name} | Subject: {session.subject.name}"],
+        "sections": [{
+            "header": [["Student", "Present", "Verified by Teacher", "Timestamp"]],
+            "rows": rows,
+            "widths": [250, 60, 100, 110],
+            "fit": (0,),
+        }],
+    })
+
+
+def subject_report_pdf(subject, student_rows, total_sessions):
+    rows = [
+        [r["student"].student_id, f"{r['student'].first_name} {r['student'].last_name}",
+         r["present"], r["absent"], f"{r['percentage']}%"]
+        for r in student_rows
+    ]
+    department = subject.department.name if subject.department else "-"
+    return render_tables({
+        "title": "Subject Attendance Report",
+        "meta": [
+            f"Subject: {subject.name} ({subject.code})",
+            f"Department: {department}",
+            f"Report Date: {_stamp(timezone.now())}",
+            f"Total Sessions: {total_sessions}",
+        ],
+        "sections": [{
+            "header": [["Student ID", "Name", "Total Present", "Total Absent", "Percentage"]],
+            "rows": rows,
+            "widths": [100, 190, 75, 75, 75],
+            "fit": (0, 1),
+            "highlight": [(i, 4) for i, r in enumerate(student_rows) if r["percentage"] < 60],
+        }],
+        "footer": f"AURA Attendance System • Automated Report • {_stamp(timezone.now())}",
+    })
+
+
+def muster_pdf(roll):
+    """Class muster roll (reports.muster_roll) in column bands of MUSTER_BAND_SESSIONS."""
+    sessions = roll["sessions"]
+    names = [
+        f"{r['student'].student_id} {r['student'].first_name} {r['student'].last_name}"
+        for r in roll["rows"]
+    ]
+    bands = [
+        (start, sessions[start:start + MUSTER_BAND_SESSIONS])
+        for start in range(0, max(len(sessions), 1), MUSTER_BAND_SESSIONS)
+    ]
+
+    sections = []
+    for n, (start, band) in enumerate(bands, 1):
+        last = n == len(bands)
+        header = [
+            ["Student"] + [timezone.localtime(s.start_time).strftime("%d/%m") for s in band],
+            [""] + [s.subject.code[:6] for s in band],
+        ]
+        if last:
+            header[0] += ["Present", "%"]
+            header[1] += ["", ""]
+        rows = []
+        for name, r in zip(names, roll["rows"]):
+            row = [name] + r["marks"][start:start + len(band)]
+            if last:
+                row += [r["present"], f"{r['percentage']}%"]
+            rows.append(row)
+        sections.append({
+            "heading": f"Sessions {start + 1}-{start + len(band)} of {len(sessions)}" if len(bands) > 1 else "",
+            "header": header,
+            "rows": rows,
+            "widths": [130] + [19] * len(band) + ([34, 34] if last else []),
+            "fit": (0,),
+            "style": [("ALIGN", (1, 0), (-1, -1), "CENTER"), ("FONT", (1, 1), (-1, 1), "Helvetica", 5)],
+        })
+
+    return render_tables({
+        "title": f"Muster Roll - {roll['class_group'].name}",
+        "meta": [f"Sessions: {len(sessions)} | Students: {len(names)} | "
+                 f"Report Date: {_stamp(roll['report_date'])}"],
+        "sections": sections,
+        "landscape": True,
+        "font_size": 6.5,
+        "footer": f"AURA Attendance System • Muster Roll • {_stamp(roll['report_date'])}",
+    })
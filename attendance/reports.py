@@ -0,0 +1,277 @@
+# attendance/reports.py
+#
+# Set-based data for the PDF reports (HOD student/class/overview reports
+# and the teacher class/subject export PDFs). Each function loads what a
+# report template needs for any number of rows with a fixed handful of
+# grouped, conditionally aggregated queries (no per-student COUNTs), so
+# report latency does not grow with class size and single reports and
+# batch jobs share the same code path.
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils.timezone import now
+
+from .analytics import local_date_range_q
+from .models import Attendance, ClassGroup, Session, Student, TeacherProfile
+
+
+def last_30_days():
+    """(start_date, end_date) of the HOD reports' "last 30 days" window."""
+    today = now().date()
+    return today - timedelta(days=30), today
+
+
+def _pct(present, total):
+    return round((present / total) * 100, 2) if total else 0
+
+
+# ---------------------------------------------------------
+# STUDENT REPORT (hod_report_student.html)
+# ---------------------------------------------------------
+def student_report_contexts(students, start_30=None, end_30=None):
+    """
+    Template contexts for hod_report_student.html, one per student, in
+    `students` order. Three queries whatever the number of students:
+    students (+ class, department), all-time counts grouped by student and
+    the last-30-day attendance rows.
+    """
+    if start_30 is None:
+        start_30, end_30 = last_30_days()
+    students = list(students.select_related("class_group__department"))
+    ids = [s.pk for s in students]
+
+    totals = {
+        row["student"]: row
+        for row in Attendance.objects.filter(student__in=ids)
+        .values("student")
+        .annotate(
+            present_count=Count("id", filter=Q(present=True)),
+            absent_count=Count("id", filter=Q(present=False)),
+        )
+        .order_by()
+    }
+
+    recent = defaultdict(list)
+    rows = (
+        Attendance.objects.filter(student__in=ids)
+        .filter(local_date_range_q("session__start_time", start_30, end_30))
+        .order_by("student", "timestamp")
+        .values_list("student", "timestamp", "present", "verified_by_face")
+    )
+    for student_id, ts, present, face in rows.iterator(chunk_size=2000):
+        recent[student_id].append({
+            "date": ts.date(),
+            "present": "Yes" if present else "No",
+            "verified_by_face": "Yes" if face else "No",
+            "timestamp": ts.strftime("%Y-%m-%d %H:%M"),
+        })
+
+    report_date = now()
+    contexts = []
+    for s in students:
+        counts = totals.get(s.pk, {"present_count": 0, "absent_count": 0})
+        present, absent = counts["present_count"], counts["absent_count"]
+        contexts.append({
+            "student": s,
+            "class_group": s.class_group,
+            "department": s.class_group.department if s.class_group else None,
+            "report_date": report_date,
+
+            "total_present": present,
+            "total_absent": absent,
+            "percentage": _pct(present, present + absent),
+
+            "attendances": recent[s.pk],
+        })
+    return contexts
+
+
+# ---------------------------------------------------------
+# CLASS REPORT (hod_report_class.html)
+# ---------------------------------------------------------
+def class_report_context(class_group, start_30=None, end_30=None):
+    """
+    Context for hod_report_class.html: per-student all-time and 30-day
+    counts from one grouped query, plus one aggregate for the class totals.
+    """
+    if start_30 is None:
+        start_30, end_30 = last_30_days()
+    recent = local_date_range_q("attendance__session__start_time", start_30, end_30)
+    present, absent = Q(attendance__present=True), Q(attendance__present=False)
+
+    students = (
+        Student.objects.filter(class_group=class_group)
+        .annotate(
+            present_count=Count("attendance", filter=present),
+            absent_count=Count("attendance", filter=absent),
+            present_30=Count("attendance", filter=recent & present),
+            absent_30=Count("attendance", filter=recent & absent),
+        )
+        .order_by("student_id")
+    )
+    rows = [{
+        "student": s,
+        "present": s.present_count,
+        "absent": s.absent_count,
+        "percentage": _pct(s.present_count, s.present_count + s.absent_count),
+        "present_30": s.present_30,
+        "absent_30": s.absent_30,
+        "percentage_30": _pct(s.present_30, s.present_30 + s.absent_30),
+    } for s in students]
+
+    totals = Attendance.objects.filter(session__class_group=class_group).aggregate(
+        total=Count("id"), present_count=Count("id", filter=Q(present=True)),
+    )
+    return {
+        "class_group": class_group,
+        "department": class_group.department,
+        "report_date": now(),
+        "rows": rows,
+        "class_total": totals["total"],
+        "class_percentage": _pct(totals["present_count"], totals["total"]),
+    }
+
+
+# ---------------------------------------------------------
+# OVERVIEW REPORT (hod_report_overview.html)
+# ---------------------------------------------------------
+def overview_report_context(start_30=None, end_30=None):
+    """
+    Context for hod_report_overview.html: one grouped query over classes
+    (sessions and attendance in the window) and one over teachers. The
+    headline totals are sums of the class rows, since every session
+    belongs to exactly one class.
+    """
+    if start_30 is None:
+        start_30, end_30 = last_30_days()
+    in_window = local_date_range_q("session__start_time", start_30, end_30)
+
+    classes = (
+        ClassGroup.objects
+        .annotate(
+            session_count=Count("session", filter=in_window, distinct=True),
+            attendance_total=Count("session__attendances", filter=in_window),
+            attendance_present=Count(
+                "session__attendances", filter=in_window & Q(session__attendances__present=True),
+            ),
+        )
+        .order_by("name")
+    )
+    class_rows = [{
+        "class": cls,
+        "sessions": cls.session_count,
+        "percentage": _pct(cls.attendance_present, cls.attendance_total),
+    } for cls in classes]
+
+    teachers = TeacherProfile.objects.select_related("user").annotate(
+        session_count=Count(
+            "user__session", filter=local_date_range_q("user__session__start_time", start_30, end_30),
+        ),
+    )
+    teacher_rows = [{"teacher": tp.user, "sessions": tp.session_count} for tp in teachers]
+
+    total = sum(cls.attendance_total for cls in classes)
+    present = sum(cls.attendance_present for cls in classes)
+    return {
+        "report_date": now(),
+        "start_30": start_30,
+        "end_30": end_30,
+        "total_sessions": sum(row["sessions"] for row in class_rows),
+        "total_attendance_rows": total,
+        "avg_attendance": _pct(present, total),
+        "class_rows": class_rows,
+        "teacher_rows": teacher_rows,
+    }
+
+
+# ---------------------------------------------------------
+# TEACHER EXPORT PDFs (report_class_pdf.html, pdf/subject_report.html)
+# ---------------------------------------------------------
+def _present_rows(students, attendance_q, total_sessions):
+    """Rows of present/absent/percentage out of `total_sessions`, one query."""
+    students = students.annotate(
+        present_count=Count("attendance", filter=attendance_q & Q(attendance__present=True)),
+    )
+    return [{
+        "student": s,
+        "present": s.present_count,
+        "absent": total_sessions - s.present_count,
+        "percentage": _pct(s.present_count, total_sessions),
+    } for s in students]
+
+
+def class_pdf_rows(class_group):
+    """(student_rows, total_sessions) for a class's export PDF."""
+    total_sessions = Session.objects.filter(class_group=class_group).count()
+    rows = _present_rows(
+        Student.objects.filter(class_group=class_group),
+        Q(attendance__session__class_group=class_group),
+        total_sessions,
+    )
+    return rows, total_sessions
+
+
+def subject_pdf_rows(subject):
+    """(student_rows, total_sessions) for a subject's export PDF: students of every class it is taught in."""
+    total_sessions = Session.objects.filter(subject=subject).count()
+    class_groups = ClassGroup.objects.filter(session__subject=subject)
+    rows = _present_rows(
+        Student.objects.filter(class_group__in=class_groups),
+        Q(attendance__session__subject=subject),
+        total_sessions,
+    )
+    return rows, total_sessions
+
+
+# ---------------------------------------------------------
+# CLASS MUSTER ROLL (student x session register)
+# ---------------------------------------------------------
+def muster_roll(class_group):
+    """
+    Register grid for a class: sessions by start time and one row per
+    student with a mark per session ("P", "A" or "" when not recorded),
+    plus totals. Three queries whatever the grid size.
+    """
+    sessions = list(
+        Session.objects.filter(class_group=class_group)
+        .select_related("subject")
+        .order_by("start_time", "id")
+    )
+    column = {s.pk: i for i, s in enumerate(sessions)}
+    students = list(Student.objects.filter(class_group=class_group).order_by("student_id"))
+
+    marks = {s.pk: [""] * len(sessions) for s in students}
+    rows = (
+        Attendance.objects.filter(session__class_group=class_group, student__class_group=class_group)
+        .order_by()
+        .values_list("student", "session", "present")
+    )
+    for student_id, session_id, present in rows.iterator(chunk_size=5000):
+        marks[student_id][column[session_id]] = "P" if present else "A"
+
+    grid = []
+    for s in students:
+        present = marks[s.pk].count("P")
+        grid.append({
+            "student": s,
+            "marks": marks[s.pk],
+            "present": present,
+            "percentage": _pct(present, len(sessions)),
+        })
+    return {
+        "class_group": class_group,
+        "report_date": now(),
+        "sessions": sessions,
+        "rows": grid,
+    }
+
+
+def students_for_scope(scope, pk):
+    """Students of a class ("class") or of every class in a department ("department")."""
+    if scope == "class":
+        qs = Student.objects.filter(class_group_id=pk)
+    else:
+        qs = Student.objects.filter(class_group__department_id=pk)
+    return qs.order_by("student_id")
@@ -0,0 +1,232 @@
+# attendance/rollups.py
+#
+# Maintains DailyAttendanceRollup: one row per (local date, class_group,
+# subject, teacher) with present/absent/session counts. Write paths call
+# refresh_rollup_for_session(); edits that move a session to another key
+# and deletes of sessions/attendance are handled by the signal receivers in
+# models.py (refresh_moved_session / refresh_after_delete). The
+# aura_rebuild_rollups command rebuilds or repairs whole date ranges.
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.utils.timezone import localtime, now
+
+from .analytics import local_date_range_q, truncate_local_date
+from .analytics_cache import invalidate_after_write
+from .models import DailyAttendanceRollup, Session
+
+
+def _rollup_counts():
+    """Conditional aggregates that turn Session rows into rollup counters."""
+    return dict(
+        session_count=Count("id", distinct=True),
+        present_count=Count("attendances", filter=Q(attendances__present=True)),
+        absent_count=Count("attendances", filter=Q(attendances__present=False)),
+    )
+
+
+def _key_filter(day, class_group_id, subject_id, teacher_id):
+    key = {"date": day, "class_group_id": class_group_id, "subject_id": subject_id}
+    if teacher_id is None:
+        key["teacher__isnull"] = True
+    else:
+        key["teacher_id"] = teacher_id
+    return key
+
+
+@transaction.atomic
+def refresh_rollup_key(day, class_group_id, subject_id, teacher_id):
+    """
+    Recompute the rollup row for one key from raw Session/Attendance data.
+    Idempotent: safe to call any number of times after a write. The key's
+    row is locked before counting, so concurrent refreshes run one after
+    the other; when two writers both find no row, the one whose INSERT hits
+    the unique key updates the winner's row instead of failing the write.
+    """
+    sessions = Session.objects.filter(
+        local_date_range_q("start_time", day),
+        class_group_id=class_group_id,
+        subject_id=subject_id,
+        teacher_id=teacher_id,
+    )
+    key = _key_filter(day, class_group_id, subject_id, teacher_id)
+    invalidate_after_write()
+
+    for attempt in range(2):
+        rows = list(DailyAttendanceRollup.objects.select_for_update().filter(**key).order_by("pk"))
+        totals = sessions.aggregate(**_rollup_counts())
+
+        if not totals["session_count"]:
+            DailyAttendanceRollup.objects.filter(pk__in=[r.pk for r in rows]).delete()
+            return None
+
+        if rows:
+            row, duplicates = rows[0], rows[1:]   # NULL teachers escape unique_together
+            if duplicates:
+                DailyAttendanceRollup.objects.filter(pk__in=[r.pk for r in duplicates]).delete()
+            for f, v in totals.items():
+                setattr(row, f, v)
+            row.save(update_fields=[*totals, "updated_at"])
+            return row
+
+        try:
+            with transaction.atomic():
+                return DailyAttendanceRollup.objects.create(
+                    date=day,
+                    class_group_id=class_group_id,
+                    subject_id=subject_id,
+                    teacher_id=teacher_id,
+                    **totals,
+                )
+        except IntegrityError:
+            if attempt:
+                raise
+            # a concurrent refresh inserted the row first: lock it and update
+
+
+# Session fields that make up its rollup key
+KEY_FIELDS = ("start_time", "class_group_id", "subject_id", "teacher_id")
+
+
+def _key(start_time, class_group_id, subject_id, teacher_id):
+    return (localtime(start_time).date(), class_group_id, subject_id, teacher_id)
+
+
+def session_key(session):
+    return _key(*(getattr(session, f) for f in KEY_FIELDS))
+
+
+def refresh_rollup_for_session(session):
+    """Refresh the rollup row the given session contributes to."""
+    return refresh_rollup_key(*session_key(session))
+
+
+def refresh_moved_session(old_fields, session):
+    """
+    After a save that changed a session's date, class, subject or teacher:
+    refresh the key it left as well as the one it moved to.
+    """
+    old_key, new_key = _key(*old_fields), session_key(session)
+    if old_key != new_key:
+        refresh_rollup_key(*old_key)
+        refresh_rollup_key(*new_key)
+
+
+def refresh_after_delete(origin, key, phase="session"):
+    """
+    Refresh `key` once per delete operation and phase. A cascade
+    (student.delete(), a class with its sessions, ...) sends one
+    post_delete per row, so the keys already refreshed are remembered on
+    the delete's origin. Attendance rows are deleted before their sessions,
+    so the "session" phase always runs last and sees the final state.
+    """
+    attr = f"_rollup_{phase}_keys_refreshed"
+    done = getattr(origin, attr, None)
+    if done is None:
+        done = set()
+        try:
+            setattr(origin, attr, done)
+        except AttributeError:
+            pass
+    if key not in done:
+        done.add(key)
+        refresh_rollup_key(*key)
+
+
+def refresh_after_attendance_delete(origin, session_id):
+    """post_delete of one Attendance: refresh its session's key (once per origin)."""
+    keys = getattr(origin, "_rollup_session_keys", None)
+    if keys is None:
+        keys = {}
+        try:
+            origin._rollup_session_keys = keys
+        except AttributeError:
+            pass
+    if session_id not in keys:
+        session = Session.objects.filter(pk=session_id).only(*KEY_FIELDS).first()
+        keys[session_id] = session_key(session) if session else None
+    if keys[session_id] is not None:
+        refresh_after_delete(origin, keys[session_id], phase="attendance")
+
+
+def compute_rollups(start_date, end_date):
+    """
+    Fresh rollup values for a local date range, computed from raw data.
+    Returns {(date, class_group_id, subject_id, teacher_id): counts}.
+    """
+    sessions = Session.objects.filter(local_date_range_q("start_time", start_date, end_date))
+    rows = (
+        sessions
+        .annotate(day=truncate_local_date("start_time"))
+        .values("day", "class_group_id", "subject_id", "teacher_id")
+        .annotate(**_rollup_counts())
+        .order_by()
+    )
+    return {
+        (r["day"], r["class_group_id"], r["subject_id"], r["teacher_id"]): {
+            "session_count": r["session_count"],
+            "present_count": r["present_count"],
+            "absent_count": r["absent_count"],
+        }
+        for r in rows
+    }
+
+
+def rebuild_rollups(start_date, end_date, dry_run=False):
+    """
+    Bring the rollup table in line with raw data for [start_date, end_date].
+    Only rows that differ are touched, so this doubles as a repair tool.
+    Returns a dict of created / updated / deleted / unchanged counts.
+    """
+    fresh = compute_rollups(start_date, end_date)
+    stats = {"created": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+
+    with transaction.atomic():
+        existing = DailyAttendanceRollup.objects.filter(
+            date__range=[start_date, end_date]
+        ).select_for_update()
+
+        to_update, to_delete, seen = [], [], set()
+        for row in existing:
+            key = (row.date, row.class_group_id, row.subject_id, row.teacher_id)
+            counts = fresh.get(key)
+
+            # duplicate NULL-teacher keys or rows whose sessions disappeared
+            if counts is None or key in seen:
+                to_delete.append(row.pk)
+                continue
+            seen.add(key)
+
+            if all(getattr(row, f) == v for f, v in counts.items()):
+                stats["unchanged"] += 1
+                continue
+
+            for f, v in counts.items():
+                setattr(row, f, v)
+            row.updated_at = now()
+            to_update.append(row)
+
+        to_create = [
+            DailyAttendanceRollup(
+                date=key[0], class_group_id=key[1], subject_id=key[2], teacher_id=key[3],
+                **counts,
+            )
+            for key, counts in fresh.items()
+            if key not in seen
+        ]
+
+        stats["created"] = len(to_create)
+        stats["updated"] = len(to_update)
+        stats["deleted"] = len(to_delete)
+
+        if not dry_run:
+            DailyAttendanceRollup.objects.filter(pk__in=to_delete).delete()
+            DailyAttendanceRollup.objects.bulk_update(
+                to_update, ["session_count", "present_count", "absent_count", "updated_at"],
+                batch_size=500,
+            )
+            DailyAttendanceRollup.objects.bulk_create(to_create, batch_size=500)
+            if to_delete or to_update or to_create:
+                invalidate_after_write()
+
+    return stats
@@ -0,0 +1,309 @@
+# attendance/summaries.py
+#
+# Maintains StudentAttendanceSummary: present/total counters per (student,
+# class_group, subject) — plus a subject=NULL row per (student, class_group)
+# — all-time and over rolling 7/30-day windows. Write paths call
+# refresh_summaries_for_session(); sessions moved to another date, class
+# or subject and deleted attendance (directly or through a session,
+# subject, class or student delete) are handled by the signal receivers
+# in models.py. The aura_age_summaries job moves the windows forward each
+# day (or rebuilds everything with --rebuild).
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils.timezone import localtime, now
+
+from .analytics import local_date_range_q
+from .models import Attendance, Session, Student, StudentAttendanceSummary
+
+WINDOWS = (7, 30)
+
+WINDOW_FIELDS = [f"{kind}_{n}d" for n in WINDOWS for kind in ("present", "total")] + ["pct_30d"]
+
+
+def _pct(present, total):
+    return round((present / total) * 100, 2) if total else 0
+
+
+def _window_q(n, today):
+    """Sessions from `n` days before `today` up to the end of `today` (local)."""
+    return local_date_range_q("session__start_time", today - timedelta(days=n), today)
+
+
+def _counts(today, all_time=True):
+    counts = {}
+    if all_time:
+        counts["total"] = Count("id")
+        counts["present_total"] = Count("id", filter=Q(present=True))
+    for n in WINDOWS:
+        in_window = _window_q(n, today)
+        counts[f"total_{n}d"] = Count("id", filter=in_window)
+        counts[f"present_{n}d"] = Count("id", filter=in_window & Q(present=True))
+    return counts
+
+
+def compute_summaries(today, attendance=None, all_time=True):
+    """
+    Fresh counters from raw Attendance, two grouped queries (per subject and
+    per class). Returns {(student_id, class_group_id, subject_id|None): counts}.
+    """
+    if attendance is None:
+        attendance = Attendance.objects.all()
+    counts = _counts(today, all_time)
+
+    fresh = {}
+    for group in (("student_id", "session__class_group_id", "session__subject_id"),
+                  ("student_id", "session__class_group_id")):
+        rows = attendance.values(*group).annotate(**counts).order_by()
+        for r in rows:
+            key = (r["student_id"], r["session__class_group_id"], r.get("session__subject_id"))
+            fresh[key] = {f: r[f] for f in counts}
+    return fresh
+
+
+def _apply(row, counts, today):
+    for f, v in counts.items():
+        setattr(row, f, v)
+    if "total" in counts:
+        row.pct_total = _pct(row.present_total, row.total)
+    row.pct_30d = _pct(row.present_30d, row.total_30d)
+    row.as_of = today
+    return row
+
+
+def build_rows(fresh, today, model=StudentAttendanceSummary):
+    return [
+        _apply(model(student_id=key[0], class_group_id=key[1], subject_id=key[2]), counts, today)
+        for key, counts in fresh.items()
+    ]
+
+
+# ---------------------------------------------------------
+# WRITE PATHS
+# ---------------------------------------------------------
+@transaction.atomic
+def refresh_student_summaries(class_group_id, subject_id, student_ids):
+    """
+    Recompute the summary rows a write to (class, subject) affects for the
+    given students: their subject row and their all-subjects class row.
+    """
+    today = localtime().date()
+    student_ids = list(student_ids)
+
+    fresh = compute_summaries(today, Attendance.objects.filter(
+        student_id__in=student_ids, session__class_group_id=class_group_id,
+    ))
+    fresh = {k: v for k, v in fresh.items() if k[2] in (subject_id, None)}
+
+    StudentAttendanceSummary.objects.filter(
+        Q(subject_id=subject_id) | Q(subject__isnull=True),
+        student_id__in=student_ids,
+        class_group_id=class_group_id,
+    ).delete()
+
+    return StudentAttendanceSummary.objects.bulk_create(build_rows(fresh, today), batch_size=500)
+
+
+def refresh_summaries_for_session(session, student_ids=None):
+    """Refresh summaries for the students of `session` (or just `student_ids`)."""
+    if student_ids is None:
+        student_ids = session.attendances.values_list("student_id", flat=True)
+    return refresh_student_summaries(session.class_group_id, session.subject_id, student_ids)
+
+
+def refresh_moved_session(old_fields, session):
+    """
+    After a save that changed a session's date, class or subject (old_fields
+    as rollups.KEY_FIELDS): refresh its students' rows for the (class,
+    subject) it left as well as the one it moved to.
+    """
+    old_start, old_class, old_subject, _ = old_fields
+    if (localtime(old_start).date(), old_class, old_subject) == (
+        localtime(session.start_time).date(), session.class_group_id, session.subject_id,
+    ):
+        return
+    student_ids = list(session.attendances.values_list("student_id", flat=True))
+    if (old_class, old_subject) != (session.class_group_id, session.subject_id):
+        refresh_student_summaries(old_class, old_subject, student_ids)
+    refresh_student_summaries(session.class_group_id, session.subject_id, student_ids)
+
+
+def _remembered(origin, attr, empty):
+    """Per-delete-operation state kept on the delete's origin."""
+    value = getattr(origin, attr, None)
+    if value is None:
+        value = empty
+        try:
+            setattr(origin, attr, value)
+        except AttributeError:
+            pass
+    return value
+
+
+def refresh_after_attendance_delete(origin, attendance):
+    """
+    post_delete of one Attendance: refresh the (class, subject) of its
+    session once per delete operation. A cascade deletes all its Attendance
+    rows before the first post_delete is sent, so one refresh of every
+    student with rows in that class sees the final state; a single delete
+    or a student delete only touches that student.
+    """
+    sessions = _remembered(origin, "_summary_session_keys", {})
+    if attendance.session_id not in sessions:
+        sessions[attendance.session_id] = (
+            Session.objects.filter(pk=attendance.session_id)
+            .values_list("class_group_id", "subject_id").first()
+        )
+    key = sessions[attendance.session_id]
+    done = _remembered(origin, "_summary_keys_refreshed", set())
+    if key is None or key in done:
+        return
+    done.add(key)
+
+    if origin is attendance or isinstance(origin, Student):
+        student_ids = [attendance.student_id]
+    else:
+        student_ids = (
+            StudentAttendanceSummary.objects.filter(class_group_id=key[0])
+            .values_list("student_id", flat=True).distinct()
+        )
+    refresh_student_summaries(*key, student_ids)
+
+
+# ---------------------------------------------------------
+# PERIODIC JOBS
+# ---------------------------------------------------------
+def age_summaries(today=None):
+    """
+    Move every stale row's rolling windows to end on `today`. All-time
+    counters don't change with time, so only attendance inside the widest
+    window is read (two grouped queries). Returns the number of rows aged.
+    """
+    today = today or localtime().date()
+    stale = StudentAttendanceSummary.objects.filter(as_of__lt=today)
+    if not stale.exists():
+        return 0
+
+    fresh = compute_summaries(
+        today,
+        Attendance.objects.filter(_window_q(max(WINDOWS), today)),
+        all_time=False,
+    )
+    zeros = {f: 0 for f in WINDOW_FIELDS if f != "pct_30d"}
+
+    with transaction.atomic():
+        rows = []
+        for row in stale.select_for_update().iterator(chunk_size=2000):
+            counts = fresh.get((row.student_id, row.class_group_id, row.subject_id))
+            _apply(row, counts or zeros, today)
+            row.updated_at = now()
+            rows.append(row)
+
+        StudentAttendanceSummary.objects.bulk_update(
+            rows, WINDOW_FIELDS + ["as_of", "updated_at"], batch_size=500,
+        )
+    return len(rows)
+
+
+@transaction.atomic
+def rebuild_summaries(today=None):
+    """Recreate the whole summary table from raw Attendance."""
+    today = today or localtime().date()
+    rows = build_rows(compute_summaries(today), today)
+
+    StudentAttendanceSummary.objects.all().delete()
+    StudentAttendanceSummary.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+# ---------------------------------------------------------
+# LOOKUPS
+# ---------------------------------------------------------
+def summaries_current(today=None):
+    """
+    True when the rolling windows of every row end on `today` and no
+    Attendance row was written after the last summary refresh (a write
+    path that skipped refresh_summaries_for_session).
+    """
+    today = today or localtime().date()
+    state = StudentAttendanceSummary.objects.aggregate(aged=Min("as_of"), refreshed=Max("updated_at"))
+    if state["aged"] is not None and state["aged"] < today:
+        return False
+    written = Attendance.objects.aggregate(last=Max("updated_at"))["last"]
+    return written is None or (state["refreshed"] is not None and written <= state["refreshed"])
+
+
+def students_below_30d(classes, threshold):
+    """
+    (student, class_group, percentage) for students of `classes` under
+    `threshold` percent over the last 30 days, read from the class-level
+    summary rows (index range scan on pct_30d). Students without any
+    attendance have no row and count as 0%.
+    """
+    rows = (
+        StudentAttendanceSummary.objects
+        .filter(
+            class_group__in=classes,
+            subject__isnull=True,
+            pct_30d__lt=threshold,
+            class_group=F("student__class_group"),
+        )
+        .select_related("student", "class_group")
+    )
+    flagged = [(r.student, r.class_group, r.pct_30d if r.total_30d else 0) for r in rows]
+
+    if threshold > 0:
+        has_row = StudentAttendanceSummary.objects.filter(
+            student=OuterRef("pk"), class_group=OuterRef("class_group"), subject__isnull=True,
+        )
+        missing = (
+            Student.objects
+            .filter(class_group__in=classes)
+            .exclude(Exists(has_row))
+            .select_related("class_group")
+        )
+        flagged += [(s, s.class_group, 0) for s in missing]
+
+    flagged.sort(key=lambda f: (f[1].pk, f[0].pk))
+    return flagged
+
+
+def student_totals(student_ids):
+    """
+    All-time {student_id: (present, total)} across every class, summed from
+    the class-level rows while the summaries are current, otherwise counted
+    from raw Attendance. Students without attendance are left out.
+    """
+    if summaries_current():
+        rows = (
+            StudentAttendanceSummary.objects
+            .filter(student_id__in=student_ids, subject__isnull=True)
+            .values("student_id")
+            .annotate(present_sum=Sum("present_total"), total_sum=Sum("total"))
+            .order_by()
+        )
+    else:
+        rows = (
+            Attendance.objects.filter(student_id__in=student_ids)
+            .values("student_id")
+            .annotate(present_sum=Count("id", filter=Q(present=True)), total_sum=Count("id"))
+            .order_by()
+        )
+    return {r["student_id"]: (r["present_sum"], r["total_sum"]) for r in rows}
+
+
+def own_class_window(n):
+    """
+    (present, total) expressions for annotating Student rows with the
+    `n`-day window counters of their own class's all-subjects row.
+    """
+    row = StudentAttendanceSummary.objects.filter(
+        student=OuterRef("pk"), class_group=OuterRef("class_group"), subject__isnull=True,
+    )
+    return tuple(
+        Coalesce(Subquery(row.values(f"{kind}_{n}d")[:1]), 0)
+        for kind in ("present", "total")
+    )
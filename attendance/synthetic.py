@@ -0,0 +1,75 @@
+# attendance/synthetic.py
+#
+# Synthetic school generator shared by the aura_bench_* commands. Callers
+# run it inside a transaction they roll back, so nothing is kept.
+
+import random
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import User, ClassGroup, Subject, Student, Session, Attendance
+
+
+def generate_school(rows=100_000, classes=20, subjects=30, teachers=15, students=60,
+                    days=30, seed=42):
+    """
+    Bulk-create `teachers` teachers, `classes` classes of `students` students,
+    `subjects` subjects and enough sessions over the last `days` days to
+    produce about `rows` attendance rows (80% present). Everyone gets an
+    @example.com address. Returns the created teachers, classes and subjects.
+    """
+    rnd = random.Random(seed)
+    tag = f"bench{int(time.time())}"
+    today = timezone.localtime()
+
+    # is_teacher=True → TeacherProfile is created by the post_save signal
+    teacher_users = [
+        User.objects.create(username=f"{tag}_t{i}", email=f"{tag}_t{i}@example.com", is_teacher=True)
+        for i in range(teachers)
+    ]
+    class_groups = ClassGroup.objects.bulk_create(
+        [ClassGroup(name=f"{tag}_c{i}") for i in range(classes)]
+    )
+    subject_list = Subject.objects.bulk_create(
+        [Subject(code=f"{tag}_s{i}", name=f"Subject {i}") for i in range(subjects)]
+    )
+    Student.objects.bulk_create([
+        Student(
+            student_id=f"{tag}_{c.pk}_{j}", first_name="Bench", class_group=c,
+            email=f"{tag}_{c.pk}_{j}@example.com",
+        )
+        for c in class_groups for j in range(students)
+    ], batch_size=5000)
+    students_by_class = {}
+    for pk, class_id in Student.objects.filter(
+        class_group__in=class_groups
+    ).values_list("pk", "class_group_id"):
+        students_by_class.setdefault(class_id, []).append(pk)
+
+    n_sessions = max(1, rows // students)
+    sessions = Session.objects.bulk_create([
+        Session(
+            session_id=f"{tag}_{i}",
+            class_group=rnd.choice(class_groups),
+            subject=rnd.choice(subject_list),
+            teacher=rnd.choice(teacher_users),
+            start_time=today - timedelta(days=rnd.randrange(days), minutes=rnd.randrange(600)),
+        )
+        for i in range(n_sessions)
+    ], batch_size=5000)
+
+    batch = []
+    for s in sessions:
+        for student_pk in students_by_class[s.class_group_id]:
+            batch.append(Attendance(
+                session_id=s.pk, student_id=student_pk,
+                present=rnd.random() < 0.8, timestamp=s.start_time,
+            ))
+        if len(batch) >= 20000:
+            Attendance.objects.bulk_create(batch)
+            batch = []
+    Attendance.objects.bulk_create(batch)
+
+    return {"teachers": teacher_users, "classes": class_groups, "subjects": subject_list}
@@ -1,3 +1,1777 @@
-from django.test import TestCase
+import os
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import analytics, analytics_cache, jobs, outbox
+from .models import (
+    User, ClassGroup, Subject, Student, TeacherProfile, Session, Attendance, Department,
+    DailyAttendanceRollup, StudentAttendanceSummary, EmailOutbox, WeeklyEmailRun,
+    NotificationJob, ExportLog
+)
+from .rollups import rebuild_rollups, refresh_rollup_for_session
+from .summaries import (
+    age_summaries, rebuild_summaries, refresh_summaries_for_session, summaries_current,
+)
+from .utils import attendance_percentage, red_flag_students_for_user
+
+
+def make_school(n_classes, n_subjects, students_per_class=3):
+    """
+    Build a small synthetic school: one teacher, `n_classes` classes,
+    `n_subjects` subjects and one session per (class, subject) today.
+    """
+    teacher = User.objects.create_user(
+        username=f"teacher{User.objects.count()}", password="x", is_teacher=True
+    )
+    classes = [
+        ClassGroup.objects.create(name=f"C{ClassGroup.objects.count()}_{i}")
+        for i in range(n_classes)
+    ]
+    subjects = [
+        Subject.objects.create(code=f"S{Subject.objects.count()}_{i}", name=f"Subject {i}")
+        for i in range(n_subjects)
+    ]
+
+    start = timezone.now()
+    for c in classes:
+        students = [
+            Student.objects.create(
+                student_id=f"{c.name}_{j}", first_name="Stu", class_group=c
+            )
+            for j in range(students_per_class)
+        ]
+        for subj in subjects:
+            session = Session.objects.create(
+                session_id=f"{c.name}_{subj.code}",
+                subject=subj, class_group=c, teacher=teacher, start_time=start,
+            )
+            for j, s in enumerate(students):
+                Attendance.objects.create(session=session, student=s, present=(j != 0))
+
+    today = timezone.localtime(start).date()
+    rebuild_rollups(today, today)
+    rebuild_summaries(today)
+
+    return teacher, classes, subjects
+
+
+class AnalyticsQueryCountTests(TestCase):
+    """Every HOD chart must stay a single grouped query regardless of size."""
+
+    def setUp(self):
+        today = timezone.localtime().date()
+        self.start = today - timedelta(days=7)
+        self.end = today
+
+    def assert_flat(self, func):
+        make_school(2, 2)
+        with self.assertNumQueries(1):
+            func(self.start, self.end)
+
+        make_school(10, 15)
+        with self.assertNumQueries(1):
+            func(self.start, self.end)
+
+    def test_weekly_class_overview_is_flat(self):
+        self.assert_flat(analytics.weekly_class_overview)
+
+    def test_classwise_distribution_is_flat(self):
+        self.assert_flat(analytics.classwise_distribution)
+
+    def test_subject_heatmap_is_flat(self):
+        self.assert_flat(analytics.subject_heatmap_data)
+
+    def test_teacher_activity_is_flat(self):
+        self.assert_flat(analytics.teacher_activity_data)
+
+    def test_absence_distribution_is_flat(self):
+        self.assert_flat(analytics.absence_distribution_data)
+
+
+class AnalyticsShapeTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(2, 3, students_per_class=4)
+        today = timezone.localtime().date()
+        self.start = today - timedelta(days=7)
+        self.end = today
+
+    def test_weekly_class_overview(self):
+        data = analytics.weekly_class_overview(self.start, self.end)
+        self.assertEqual(data["labels"], [c.name for c in self.classes])
+        # 3 sessions per class, 3 present per session -> 9 / 3 * 100
+        self.assertEqual(data["values"], [300.0, 300.0])
+
+    def test_classwise_distribution(self):
+        data = analytics.classwise_distribution(self.start, self.end)
+        self.assertEqual(data["values"], [12, 12])
+
+    def test_subject_heatmap(self):
+        data = analytics.subject_heatmap_data(self.start, self.end)
+        self.assertEqual(data["labels"], [s.code for s in self.subjects])
+        self.assertEqual(data["present"], [6, 6, 6])
+        self.assertEqual(data["absent"], [2, 2, 2])
+
+    def test_teacher_activity(self):
+        data = analytics.teacher_activity_data(self.start, self.end)
+        self.assertEqual(data["labels"], [self.teacher.username])
+        self.assertEqual(data["values"], [6])
+
+    def test_absence_distribution(self):
+        data = analytics.absence_distribution_data(self.start, self.end)
+        self.assertEqual(data, {"labels": ["Present", "Absent"], "values": [18, 6]})
+
+    def test_out_of_range_is_zero(self):
+        old = self.start - timedelta(days=60)
+        data = analytics.subject_heatmap_data(old, old)
+        self.assertEqual(data["present"], [0, 0, 0])
+        data = analytics.weekly_class_overview(old, old)
+        self.assertEqual(data["values"], [0, 0])
+
+
+class DailyRollupTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(1, 2, students_per_class=3)
+        self.today = timezone.localtime().date()
+
+    def test_rollup_rows_match_raw_data(self):
+        rows = DailyAttendanceRollup.objects.order_by("subject__code")
+        self.assertEqual(rows.count(), 2)
+        for r in rows:
+            self.assertEqual((r.session_count, r.present_count, r.absent_count), (1, 2, 1))
+
+    def test_rebuild_is_idempotent_and_repairs_drift(self):
+        stats = rebuild_rollups(self.today, self.today)
+        self.assertEqual(stats["unchanged"], 2)
+
+        Attendance.objects.update(present=True)
+        DailyAttendanceRollup.objects.filter(subject=self.subjects[0]).delete()
+
+        stats = rebuild_rollups(self.today, self.today, dry_run=True)
+        self.assertEqual((stats["created"], stats["updated"]), (1, 1))
+        self.assertEqual(DailyAttendanceRollup.objects.count(), 1)
+
+        rebuild_rollups(self.today, self.today)
+        totals = [r.present_count for r in DailyAttendanceRollup.objects.all()]
+        self.assertEqual(totals, [3, 3])
+
+    def test_concurrent_insert_of_the_same_key_does_not_lose_the_write(self):
+        session = Session.objects.filter(subject=self.subjects[0]).first()
+        real = DailyAttendanceRollup.objects.select_for_update
+        calls = []
+
+        def racing(*args, **kwargs):
+            # first lookup misses, as if another writer inserted the row right after it
+            calls.append(1)
+            qs = real(*args, **kwargs)
+            return qs.none() if len(calls) == 1 else qs
+
+        with transaction.atomic(), \
+                mock.patch.object(DailyAttendanceRollup.objects, "select_for_update", racing):
+            session.attendances.update(present=False)
+            refresh_rollup_for_session(session)
+
+        self.assertEqual(len(calls), 2)   # the INSERT collided and was retried as an update
+        self.assertFalse(session.attendances.filter(present=True).exists())
+        row = DailyAttendanceRollup.objects.get(subject=self.subjects[0])
+        self.assertEqual((row.present_count, row.absent_count), (0, 3))
+
+    def test_refresh_after_write(self):
+        session = Session.objects.filter(subject=self.subjects[0]).first()
+        session.attendances.update(present=False)
+        refresh_rollup_for_session(session)
+
+        row = DailyAttendanceRollup.objects.get(subject=self.subjects[0])
+        self.assertEqual((row.present_count, row.absent_count), (0, 3))
+
+    def test_mark_attendance_updates_rollup(self):
+        session = Session.objects.filter(subject=self.subjects[0]).first()
+        student = Student.objects.filter(class_group=self.classes[0]).first()
+
+        resp = self.client.post("/api/attendance/", {
+            "student_id": student.student_id,
+            "session_id": session.session_id,
+            "present": True,
+        }, content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+
+        row = DailyAttendanceRollup.objects.get(subject=self.subjects[0])
+        self.assertEqual((row.present_count, row.absent_count), (3, 0))
+
+    def _counts(self, subject):
+        return list(DailyAttendanceRollup.objects.filter(subject=subject).values_list(
+            "date", "session_count", "present_count", "absent_count",
+        ))
+
+    def test_moving_a_session_refreshes_old_and_new_key(self):
+        session = Session.objects.get(subject=self.subjects[0])
+        session.start_time -= timedelta(days=3)
+        session.subject = self.subjects[1]
+        session.save()
+
+        self.assertEqual(self._counts(self.subjects[0]), [])
+        self.assertEqual(sorted(self._counts(self.subjects[1])), [
+            (self.today - timedelta(days=3), 1, 2, 1), (self.today, 1, 2, 1),
+        ])
+
+    def test_deletes_refresh_rollups(self):
+        Attendance.objects.filter(session__subject=self.subjects[0], present=False).delete()
+        self.assertEqual(self._counts(self.subjects[0]), [(self.today, 1, 2, 0)])
+
+        # student.delete() cascades to their attendance rows
+        Student.objects.filter(class_group=self.classes[0]).first().delete()
+        self.assertEqual(self._counts(self.subjects[1]), [(self.today, 1, 2, 0)])
+
+        Session.objects.get(subject=self.subjects[1]).delete()
+        self.assertEqual(self._counts(self.subjects[1]), [])
+
+    def test_migration_backfills_rollups(self):
+        import importlib
+
+        from django.apps import apps
+
+        migration = importlib.import_module("attendance.migrations.0002_daily_attendance_rollup")
+        DailyAttendanceRollup.objects.all().delete()
+        migration.backfill_rollups(apps, None)
+
+        self.assertEqual(rebuild_rollups(self.today, self.today)["unchanged"], 2)
+
+
+class AnalyticsBundleTests(TestCase):
+
+    def setUp(self):
+        make_school(2, 3, students_per_class=4)
+        today = timezone.localtime().date()
+        self.start = today - timedelta(days=7)
+        self.end = today
+
+        self.hod = User.objects.create_user(username="hod", password="x", is_hod=True)
+        self.client.force_login(self.hod)
+
+    def test_bundle_matches_individual_endpoints(self):
+        bundle = analytics.analytics_bundle(self.start, self.end)
+        self.assertEqual(bundle["weekly"], analytics.weekly_class_overview(self.start, self.end))
+        self.assertEqual(bundle["monthly"], analytics.monthly_trend(self.start, self.end))
+        self.assertEqual(bundle["classwise"], analytics.classwise_distribution(self.start, self.end))
+        self.assertEqual(bundle["subject_heatmap"], analytics.subject_heatmap_data(self.start, self.end))
+        self.assertEqual(bundle["teacher_activity"], analytics.teacher_activity_data(self.start, self.end))
+        self.assertEqual(
+            bundle["absence_distribution"],
+            analytics.absence_distribution_data(self.start, self.end),
+        )
+
+    def test_repeat_load_returns_304(self):
+        first = self.client.get("/hod/analytics/bundle/?range=last7")
+        self.assertEqual(first.status_code, 200)
+        etag = first["ETag"]
+
+        again = self.client.get("/hod/analytics/bundle/?range=last7", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+
+        Attendance.objects.update(present=False)
+        rebuild_rollups(self.start, self.end)
+        changed = self.client.get("/hod/analytics/bundle/?range=last7", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+
+
+class AnalyticsCacheTests(TestCase):
+
+    def setUp(self):
+        make_school(1, 2)
+        analytics_cache.reset_stats()
+        today = timezone.localtime().date()
+        self.start = today - timedelta(days=7)
+        self.end = today
+
+    def test_hit_after_miss(self):
+        with self.assertNumQueries(1):
+            first = analytics.subject_heatmap_data(self.start, self.end)
+        with self.assertNumQueries(0):
+            second = analytics.subject_heatmap_data(self.start, self.end)
+
+        self.assertEqual(first, second)
+        stats = analytics_cache.cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_attendance_write_invalidates(self):
+        before = analytics.absence_distribution_data(self.start, self.end)
+
+        session = Session.objects.first()
+        session.attendances.update(present=True)
+        refresh_rollup_for_session(session)
+
+        after = analytics.absence_distribution_data(self.start, self.end)
+        self.assertNotEqual(before, after)
+
+    def test_session_save_bumps_version(self):
+        version = analytics_cache.get_data_version()
+        Session.objects.first().save()
+        self.assertGreater(analytics_cache.get_data_version(), version)
+
+    def test_past_ranges_live_longer_on_a_shared_backend(self):
+        today = timezone.localtime().date()
+        shared = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": "/tmp/aura"}
+        with self.settings(CACHES={"default": shared}):
+            self.assertGreater(
+                analytics_cache._ttl_for(today - timedelta(days=1)),
+                analytics_cache._ttl_for(today),
+            )
+
+        # locmem is per process: other processes' writes never reach it
+        self.assertEqual(
+            analytics_cache._ttl_for(today - timedelta(days=1)),
+            analytics_cache._ttl_for(today),
+        )
+
+
+class NumpyBackendTests(TestCase):
+
+    def test_numpy_backend_matches_orm(self):
+        make_school(3, 4, students_per_class=5)
+        today = timezone.localtime().date()
+        start, end = today - timedelta(days=7), today
+
+        orm = analytics.analytics_bundle.uncached(start, end)
+        with self.settings(AURA_ANALYTICS_BACKEND="numpy"):
+            vec = analytics.analytics_bundle.uncached(start, end)
+            heatmap = analytics.subject_heatmap_data.uncached(start, end)
+
+        self.assertEqual(orm, vec)
+        self.assertEqual(heatmap, orm["subject_heatmap"])
+
+    def test_sessions_added_between_loads_are_dropped(self):
+        from . import analytics_numpy
+
+        teacher, classes, subjects = make_school(1, 2)
+        today = timezone.localtime().date()
+        ses = analytics_numpy.load_session_arrays(today, today)
+
+        # a session committed after the session snapshot sorts past its ids
+        late = Session.objects.create(
+            session_id="late", subject=subjects[0], class_group=classes[0],
+            teacher=teacher, start_time=timezone.now(),
+        )
+        for s in Student.objects.all():
+            Attendance.objects.create(session=late, student=s, present=True)
+
+        att = analytics_numpy.load_attendance_arrays(today, today, sessions=ses)
+
+        self.assertEqual(len(att["session"]), 6)
+        self.assertNotIn(late.id, att["session"].tolist())
+        self.assertEqual(len(att["day"]), len(att["student"]))
+
+
+class LocalDateBoundsTests(TestCase):
+
+    def test_bounds_are_half_open_local_midnights(self):
+        d = timezone.localtime().date()
+        start, end = analytics.local_date_bounds(d, d + timedelta(days=2))
+        self.assertEqual(timezone.localtime(start).date(), d)
+        self.assertEqual(timezone.localtime(start).hour, 0)
+        self.assertEqual(timezone.localtime(end).date(), d + timedelta(days=3))
+
+    def test_bounds_match_date_lookup(self):
+        make_school(1, 1)
+        today = timezone.localtime().date()
+        self.assertEqual(
+            Session.objects.filter(analytics.local_date_range_q("start_time", today)).count(),
+            Session.objects.filter(start_time__date=today).count(),
+        )
+
+    @skipUnless(connection.vendor == "sqlite", "EXPLAIN output format is SQLite-specific")
+    def test_session_index_used_for_range(self):
+        """EXPLAIN on SQLite: the range must be part of the composite index search."""
+        index = next(
+            i.name for i in Session._meta.indexes
+            if i.fields == ["class_group", "subject", "start_time"]
+        )
+        today = timezone.localtime().date()
+        plan = Session.objects.filter(
+            analytics.local_date_range_q("start_time", today - timedelta(days=30), today),
+            class_group_id=1, subject_id=1,
+        ).explain()
+
+        self.assertIn(index, plan)
+        self.assertIn("start_time>?", plan)
+        self.assertIn("start_time<?", plan)
+
+
+class TimeSeriesTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(1, 2, students_per_class=3)
+        self.today = timezone.localtime().date()
+
+    def test_daily_series_is_gap_filled_single_query(self):
+        start = self.today - timedelta(days=6)
+        with self.assertNumQueries(1):
+            data = analytics.attendance_timeseries(start, self.today, teacher=self.teacher)
+
+        self.assertEqual(len(data["labels"]), 7)
+        self.assertEqual(data["present"], [0] * 6 + [4])
+        self.assertEqual(data["absent"], [0] * 6 + [2])
+
+    def test_filters(self):
+        start = self.today - timedelta(days=1)
+        data = analytics.attendance_timeseries(start, self.today, subject=self.subjects[0])
+        self.assertEqual(data["present"], [0, 2])
+
+        other = ClassGroup.objects.create(name="Empty")
+        data = analytics.attendance_timeseries(start, self.today, class_group=other)
+        self.assertEqual(data["present"], [0, 0])
+
+    def test_week_and_month_buckets(self):
+        start = self.today - timedelta(days=60)
+        weeks = analytics.attendance_timeseries(start, self.today, "week")
+        months = analytics.attendance_timeseries(start, self.today, "month")
+
+        self.assertEqual(sum(weeks["present"]), 4)
+        self.assertEqual(weeks["present"][-1], 4)
+        self.assertEqual(months["present"][-1], 4)
+        self.assertIn(len(months["labels"]), (3, 4))
+
+
+class TimeSeriesApiTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(1, 2, students_per_class=3)
+        self.department = Department.objects.create(name="CSE")
+        ClassGroup.objects.filter(pk=self.classes[0].pk).update(department=self.department)
+        self.hod = User.objects.create_user(username="hod", password="x", is_hod=True)
+        self.client.force_login(self.hod)
+        self.today = timezone.localtime().date()
+
+    def get(self, scope, pk, **params):
+        return self.client.get(f"/api/timeseries/{scope}/{pk}/", params)
+
+    def test_pick_bucket_respects_max_points(self):
+        start = self.today - timedelta(days=29)
+        self.assertEqual(analytics.pick_bucket(start, self.today, 120), "day")
+        start = self.today - timedelta(days=364)
+        self.assertEqual(analytics.pick_bucket(start, self.today, 120), "week")
+        start = self.today - timedelta(days=365 * 5)
+        self.assertEqual(analytics.pick_bucket(start, self.today, 120), "month")
+
+    def test_auto_resolution_for_a_year(self):
+        start = self.today - timedelta(days=364)
+        resp = self.get("department", self.department.pk, range="custom",
+                        start_date=str(start), end_date=str(self.today))
+        data = resp.json()
+
+        self.assertEqual(data["resolution"], "week")
+        self.assertLessEqual(len(data["labels"]), 120)
+        self.assertEqual(sum(data["present"]), 4)
+        self.assertEqual(sum(data["absent"]), 2)
+
+    def test_query_count_independent_of_span(self):
+        start = self.today - timedelta(days=365 * 3)
+        # session + auth user lookups, the scope object, one series query
+        with self.assertNumQueries(4):
+            self.get("subject", self.subjects[0].pk, range="custom",
+                     start_date=str(start), end_date=str(self.today))
+
+    def test_too_fine_resolution_is_coarsened(self):
+        start = self.today - timedelta(days=1000)
+        data = self.get("teacher", self.teacher.pk, range="custom", resolution="day",
+                        start_date=str(start), end_date=str(self.today)).json()
+        self.assertNotEqual(data["resolution"], "day")
+
+        data = self.get("class", self.classes[0].pk, range="last7", resolution="month").json()
+        self.assertEqual(data["resolution"], "month")
+
+    def test_bad_scope_and_resolution(self):
+        self.assertEqual(self.get("planet", 1).status_code, 404)
+        self.assertEqual(self.get("class", self.classes[0].pk, resolution="hour").status_code, 400)
+
+    def test_span_longer_than_max_points_months_is_rejected(self):
+        start = self.today - timedelta(days=365 * 11)   # > 120 months
+        resp = self.get("class", self.classes[0].pk, range="custom",
+                        start_date=str(start), end_date=str(self.today))
+        self.assertEqual(resp.status_code, 400)
+        self.assertIsNone(analytics.pick_bucket(start, self.today, 120))
+
+    def test_teachers_limited_to_their_own_scope(self):
+        other = User.objects.create_user(username="other", password="x", is_teacher=True)
+        self.teacher.teacher_profile.classes.add(self.classes[0])
+        self.client.force_login(self.teacher)
+
+        self.assertEqual(self.get("teacher", self.teacher.pk).status_code, 200)
+        self.assertEqual(self.get("class", self.classes[0].pk).status_code, 200)
+        self.assertEqual(self.get("teacher", other.pk).status_code, 403)
+        self.assertEqual(self.get("subject", self.subjects[0].pk).status_code, 403)
+        self.assertEqual(self.get("department", self.department.pk).status_code, 403)
+
+
+class RedFlagTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(2, 2, students_per_class=3)
+        self.teacher.teacher_profile.classes.set(self.classes)
+        # one student per class with no attendance at all
+        for c in self.classes:
+            Student.objects.create(student_id=f"{c.name}_new", first_name="New", class_group=c)
+        self.today = timezone.localtime().date()
+
+    def expected(self, threshold):
+        start = self.today - timedelta(days=30)
+        flagged = []
+        for c in self.classes:
+            for s in Student.objects.filter(class_group=c).order_by("pk"):
+                perc = attendance_percentage(s, c, None, start, self.today)
+                if perc < threshold:
+                    flagged.append((s.pk, c.pk, perc))
+        return flagged
+
+    def test_matches_per_student_computation(self):
+        for threshold in (0, 50, 60, 100, 101):
+            got = [
+                (r["student"].pk, r["class_group"].pk, r["percentage"])
+                for r in red_flag_students_for_user(self.teacher, threshold=threshold)
+            ]
+            self.assertEqual(got, self.expected(threshold))
+
+    def test_live_query_when_summaries_are_stale(self):
+        StudentAttendanceSummary.objects.update(as_of=self.today - timedelta(days=1))
+        teacher = User.objects.get(pk=self.teacher.pk)
+        with self.assertNumQueries(3):
+            got = [
+                (r["student"].pk, r["class_group"].pk, r["percentage"])
+                for r in red_flag_students_for_user(teacher)
+            ]
+        self.assertEqual(got, self.expected(60))
+
+    def test_students_without_attendance_are_flagged(self):
+        flagged = {r["student"].student_id: r["percentage"]
+                   for r in red_flag_students_for_user(self.teacher)}
+        self.assertEqual(flagged[f"{self.classes[0].name}_new"], 0)
+        self.assertEqual(flagged[f"{self.classes[0].name}_0"], 0)
+        self.assertNotIn(f"{self.classes[0].name}_1", flagged)
+
+    def test_query_count_is_constant(self):
+        teacher = User.objects.get(pk=self.teacher.pk)
+        with self.assertNumQueries(5):
+            small = red_flag_students_for_user(teacher, threshold=101)
+
+        _, more_classes, _ = make_school(8, 3, students_per_class=10)
+        self.teacher.teacher_profile.classes.add(*more_classes)
+
+        teacher = User.objects.get(pk=self.teacher.pk)
+        with self.assertNumQueries(5):
+            large = red_flag_students_for_user(teacher, threshold=101)
+        self.assertGreater(len(large), len(small))
+
+
+class StudentSummaryTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(1, 2, students_per_class=3)
+        self.today = timezone.localtime().date()
+        self.student = Student.objects.get(student_id=f"{self.classes[0].name}_0")
+
+    def summary(self, subject=None):
+        return StudentAttendanceSummary.objects.get(student=self.student, subject=subject)
+
+    def test_counters(self):
+        row = self.summary(self.subjects[0])
+        self.assertEqual((row.present_total, row.total, row.present_30d, row.total_30d), (0, 1, 0, 1))
+
+        row = self.summary()
+        self.assertEqual((row.total, row.total_7d, row.pct_30d), (2, 2, 0))
+        self.assertEqual(row.as_of, self.today)
+
+    def test_mark_attendance_updates_summary(self):
+        session = Session.objects.get(subject=self.subjects[0])
+        resp = self.client.post("/api/attendance/", {
+            "student_id": self.student.student_id,
+            "session_id": session.session_id,
+            "present": True,
+        }, content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+
+        self.assertEqual(self.summary(self.subjects[0]).pct_30d, 100)
+        self.assertEqual(self.summary().pct_30d, 50)
+        self.assertEqual(self.summary(self.subjects[1]).pct_30d, 0)
+
+    def assertMatchesRebuild(self):
+        def snapshot():
+            return sorted(
+                StudentAttendanceSummary.objects.values_list(
+                    "student", "class_group", "subject", "present_total", "total", "total_30d",
+                ),
+                key=str,
+            )
+
+        maintained = snapshot()
+        rebuild_summaries(self.today)
+        self.assertEqual(maintained, snapshot())
+
+    def test_deletes_refresh_summaries(self):
+        other = Student.objects.get(student_id=f"{self.classes[0].name}_1")
+        Attendance.objects.filter(student=other, session__subject=self.subjects[0]).get().delete()
+        self.assertEqual(StudentAttendanceSummary.objects.get(student=other, subject=None).total, 1)
+        self.assertMatchesRebuild()
+
+        Session.objects.get(subject=self.subjects[1]).delete()
+        self.assertEqual(self.summary().total, 1)
+        self.assertMatchesRebuild()
+
+        # the class-level rows drop the deleted subject's attendance too
+        self.subjects[0].delete()
+        self.assertFalse(StudentAttendanceSummary.objects.exists())
+
+    def test_student_and_class_deletes(self):
+        self.student.delete()
+        self.assertMatchesRebuild()
+        self.classes[0].delete()
+        self.assertFalse(StudentAttendanceSummary.objects.exists())
+
+    def test_moving_a_session_refreshes_both_keys(self):
+        session = Session.objects.get(subject=self.subjects[0])
+        session.subject = self.subjects[1]
+        session.save()
+        self.assertFalse(StudentAttendanceSummary.objects.filter(subject=self.subjects[0]).exists())
+        self.assertEqual(self.summary(self.subjects[1]).total, 2)
+        self.assertMatchesRebuild()
+
+        other = ClassGroup.objects.create(name="Other")
+        session.class_group = other
+        session.start_time -= timedelta(days=10)
+        session.save()
+        rows = {
+            r.class_group_id: r
+            for r in StudentAttendanceSummary.objects.filter(student=self.student, subject=None)
+        }
+        self.assertEqual(
+            (rows[self.classes[0].pk].total, rows[other.pk].total_7d, rows[other.pk].total_30d), (1, 0, 1),
+        )
+        self.assertMatchesRebuild()
+
+    def test_student_totals_match_raw_counts(self):
+        from .summaries import student_totals
+
+        ids = list(Student.objects.values_list("pk", flat=True))
+        with self.assertNumQueries(3):
+            from_summaries = student_totals(ids)
+        StudentAttendanceSummary.objects.update(as_of=self.today - timedelta(days=1))
+        self.assertEqual(student_totals(ids), from_summaries)
+        self.assertEqual(from_summaries[self.student.pk], (0, 2))
+
+    def test_unrefreshed_write_makes_summaries_stale(self):
+        self.assertTrue(summaries_current(self.today))
+        Attendance.objects.first().save()
+        self.assertFalse(summaries_current(self.today))
+        refresh_summaries_for_session(Attendance.objects.first().session)
+        self.assertTrue(summaries_current(self.today))
+
+    def test_migration_backfills_summaries(self):
+        import importlib
+
+        from django.apps import apps
+
+        fields = ("student_id", "class_group_id", "subject_id", "total", "present_total",
+                  "total_7d", "present_7d", "total_30d", "present_30d", "pct_total", "pct_30d", "as_of")
+        expected = sorted(StudentAttendanceSummary.objects.values_list(*fields), key=str)
+
+        migration = importlib.import_module("attendance.migrations.0003_student_attendance_summary")
+        StudentAttendanceSummary.objects.all().delete()
+        migration.backfill_summaries(apps, None)
+
+        self.assertEqual(sorted(StudentAttendanceSummary.objects.values_list(*fields), key=str), expected)
+
+    def test_aging_drops_old_attendance_from_windows(self):
+        later = self.today + timedelta(days=10)
+        self.assertEqual(age_summaries(later), StudentAttendanceSummary.objects.count())
+
+        row = self.summary()
+        self.assertEqual((row.total, row.total_7d, row.total_30d), (2, 0, 2))
+        self.assertEqual(row.as_of, later)
+
+        age_summaries(self.today + timedelta(days=40))
+        row = self.summary()
+        self.assertEqual((row.total, row.total_30d, row.pct_30d), (2, 0, 0))
+        self.assertEqual(age_summaries(self.today + timedelta(days=40)), 0)
+
+    def test_rebuild_matches_incremental(self):
+        def snapshot():
+            return sorted(
+                StudentAttendanceSummary.objects.values_list(
+                    "student", "class_group", "subject", "present_total", "total", "pct_30d"
+                ),
+                key=lambda r: (r[0], r[1], r[2] or 0),
+            )
+
+        StudentAttendanceSummary.objects.all().delete()
+        for session in Session.objects.all():
+            refresh_summaries_for_session(session)
+        incremental = snapshot()
+
+        rebuild_summaries(self.today)
+        self.assertEqual(incremental, snapshot())
+
+    @skipUnless(connection.vendor == "sqlite", "EXPLAIN output format is SQLite-specific")
+    def test_threshold_lookup_uses_pct_index(self):
+        index = next(
+            i.name for i in StudentAttendanceSummary._meta.indexes
+            if i.fields == ["class_group", "subject", "pct_30d"]
+        )
+        plan = StudentAttendanceSummary.objects.filter(
+            class_group=self.classes[0], subject__isnull=True, pct_30d__lt=60,
+        ).explain()
+        self.assertIn(index, plan)
+        self.assertIn("pct_30d<?", plan)
+
+
+class EmailOutboxTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(1, 1)
+        self.teacher.email = "teacher@example.com"
+        self.teacher.save()
+
+    def start_session(self):
+        return self.client.post("/api/start_session/", {
+            "teacher_uid": self.teacher.username,
+            "subject_code": self.subjects[0].code,
+            "class_group": self.classes[0].name,
+        }, content_type="application/json")
+
+    def test_device_api_only_queues(self):
+        resp = self.start_session()
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+
+        resp = self.client.post("/api/end_session/", {
+            "session_id": resp.json()["session_id"],
+        }, content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailOutbox.PENDING).count(), 2)
+
+        stats = outbox.drain()
+        self.assertEqual((stats["sent"], stats["failed"]), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ["teacher@example.com"])
+        self.assertEqual(outbox.backlog()["pending"], 0)
+
+    def test_notify_hod_class_queues_one_per_hod(self):
+        for i in range(3):
+            User.objects.create_user(username=f"hod{i}", password="x", is_hod=True,
+                                     email=f"hod{i}@example.com")
+        self.client.force_login(self.teacher)
+        resp = self.client.post(f"/class/{self.classes[0].pk}/notify/")
+        self.assertEqual(resp.json()["queued"], 3)
+        self.assertEqual(len(mail.outbox), 0)
+
+        outbox.drain(batch_size=2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox),
+                         ["hod0@example.com", "hod1@example.com", "hod2@example.com"])
+
+    def test_failure_is_retried_with_backoff(self):
+        row = outbox.enqueue_email("Hi", "body", ["a@example.com"])
+
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages",
+                        side_effect=OSError("smtp down")):
+            stats = outbox.drain()
+        self.assertEqual(stats["failed"], 1)
+
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (EmailOutbox.PENDING, 1))
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        self.assertIn("smtp down", row.last_error)
+        self.assertEqual(outbox.backlog()["due"], 0)
+
+        # not due yet, then delivered once the backoff has passed
+        self.assertEqual(outbox.drain()["sent"], 0)
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.drain()["sent"], 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        row = outbox.enqueue_email("Hi", "body", ["a@example.com"])
+        with self.settings(AURA_OUTBOX_MAX_ATTEMPTS=2), \
+                mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages",
+                           side_effect=OSError("smtp down")):
+            outbox.drain()
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            outbox.drain()
+
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (EmailOutbox.FAILED, 2))
+        self.assertEqual(outbox.backlog()["failed"], 1)
+
+    def test_unreachable_smtp_backs_off_and_gives_up(self):
+        rows = [outbox.enqueue_email("Hi", "body", [f"{i}@example.com"]) for i in range(2)]
+        refused = mock.patch("django.core.mail.backends.locmem.EmailBackend.open",
+                             side_effect=ConnectionRefusedError("refused"))
+        with self.settings(AURA_OUTBOX_MAX_ATTEMPTS=2), refused:
+            self.assertEqual(outbox.drain()["failed"], 2)
+            for row in rows:
+                row.refresh_from_db()
+                self.assertEqual((row.status, row.attempts), (EmailOutbox.PENDING, 1))
+                self.assertIn("refused", row.last_error)
+
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            outbox.drain()
+        self.assertEqual(outbox.backlog()["failed"], 2)
+
+    def test_worker_survives_a_failed_pass(self):
+        from attendance.management.commands import aura_outbox_worker
+
+        err = StringIO()
+        with mock.patch.object(aura_outbox_worker, "drain", side_effect=[OSError("db gone"), KeyboardInterrupt]), \
+                mock.patch.object(aura_outbox_worker.time, "sleep") as sleep:
+            call_command("aura_outbox_worker", stdout=StringIO(), stderr=err)
+        self.assertIn("db gone", err.getvalue())
+        sleep.assert_called_once()
+
+    def test_claim_is_exclusive(self):
+        for i in range(5):
+            outbox.enqueue_email("Hi", "body", [f"{i}@example.com"])
+        first = outbox.claim_batch(3)
+        second = outbox.claim_batch(3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({r.pk for r in first} & {r.pk for r in second})
+
+
+class WeeklyEmailTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(2, 2, students_per_class=3)
+        Student.objects.update(email=Concat(F("student_id"), Value("@example.com")))
+        User.objects.create_user(username="hod", password="x", is_hod=True, email="hod@example.com")
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command("aura_weekly_email", *args, "--batch-size=2", "--chunk-size=2", stdout=out)
+        return out.getvalue()
+
+    def test_sends_reports_and_digest(self):
+        out = self.run_command("--concurrency=3")
+
+        # 6 students + 1 HOD digest
+        self.assertEqual(len(mail.outbox), 7)
+        self.assertIn("msgs/s", out)
+        digest = next(m for m in mail.outbox if m.to == ["hod@example.com"])
+        # the students who missed every session are in the digest
+        for c in self.classes:
+            self.assertIn(f"{c.name}_0", digest.body)
+
+        run = WeeklyEmailRun.objects.get()
+        self.assertEqual((run.sent, run.failed), (6, 0))
+        self.assertIsNotNone(run.finished_at)
+
+        # a second run in the same week sends nothing
+        self.run_command()
+        self.assertEqual(len(mail.outbox), 7)
+
+    def test_resumes_after_checkpoint(self):
+        students = list(Student.objects.order_by("pk").values_list("pk", flat=True))
+        WeeklyEmailRun.objects.create(
+            period_start=timezone.localdate() - timedelta(days=7),
+            period_end=timezone.localdate(),
+            last_student_id=students[3], sent=4,
+        )
+        self.run_command()
+        student_mail = [m for m in mail.outbox if m.to != ["hod@example.com"]]
+        self.assertEqual(len(student_mail), 2)
+        self.assertEqual(WeeklyEmailRun.objects.get().sent, 6)
+
+    def test_crash_mid_chunk_resends_nothing(self):
+        from attendance.management.commands.aura_weekly_email import Command
+
+        send_batch = Command._send_batch
+        calls = []
+
+        def crash_on_second_batch(command, batch):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise RuntimeError("worker killed")
+            return send_batch(command, batch)
+
+        args = ("aura_weekly_email", "--concurrency=1", "--batch-size=2", "--chunk-size=6")
+        with mock.patch.object(Command, "_send_batch", crash_on_second_batch), \
+                self.assertRaises(RuntimeError):
+            call_command(*args, stdout=StringIO())
+        run = WeeklyEmailRun.objects.get()
+        students = list(Student.objects.order_by("pk").values_list("pk", flat=True))
+        self.assertEqual((run.sent, run.last_student_id), (2, students[1]))
+
+        # the resumed run starts after the first batch, not the whole chunk
+        mail.outbox.clear()
+        call_command(*args, stdout=StringIO())
+        student_mail = [m for m in mail.outbox if m.to != ["hod@example.com"]]
+        self.assertEqual(len(student_mail), 4)
+
+    def test_digest_is_not_resent_after_a_crash(self):
+        save = WeeklyEmailRun.save
+
+        def killed_before_final_save(run, *args, **kwargs):
+            if run.finished_at:
+                raise RuntimeError("killed")
+            return save(run, *args, **kwargs)
+
+        with mock.patch.object(WeeklyEmailRun, "save", killed_before_final_save), \
+                self.assertRaises(RuntimeError):
+            self.run_command()
+        self.assertTrue(WeeklyEmailRun.objects.get().digest_sent)
+
+        self.run_command()
+        self.assertEqual(len([m for m in mail.outbox if m.to == ["hod@example.com"]]), 1)
+
+    def test_dry_run_sends_nothing(self):
+        out = self.run_command("--dry-run")
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(WeeklyEmailRun.objects.exists())
+        self.assertIn("6 students", out)
+
+    def test_failed_messages_go_to_outbox(self):
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages",
+                        side_effect=OSError("smtp down")):
+            self.run_command()
+        self.assertEqual(EmailOutbox.objects.count(), 7)
+        self.assertEqual(WeeklyEmailRun.objects.get().failed, 6)
+
+
+class RedFlagJobTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(2, 2, students_per_class=3)
+        self.teacher.teacher_profile.classes.set(self.classes)
+        Student.objects.update(email=Concat(F("student_id"), Value("@example.com")))
+        Student.objects.filter(student_id=f"{self.classes[1].name}_0").update(email="")
+        self.client.force_login(self.teacher)
+
+    def notify(self):
+        return self.client.post("/teacher/notify_students/", {"days": 30, "threshold": 60})
+
+    def test_post_returns_job_without_sending(self):
+        resp = self.notify()
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(len(mail.outbox), 0)
+
+        status = self.client.get(resp.json()["status_url"]).json()
+        self.assertEqual((status["status"], status["done"]), ("queued", False))
+
+    def test_repeated_clicks_share_the_running_job(self):
+        first = self.notify().json()
+        second = self.notify().json()
+        self.assertEqual(first["job_id"], second["job_id"])
+        self.assertFalse(second["created"])
+        self.assertEqual(NotificationJob.objects.count(), 1)
+
+        other = self.client.post("/teacher/notify_students/", {"days": 30, "threshold": 90}).json()
+        self.assertNotEqual(other["job_id"], first["job_id"])
+
+    def test_worker_runs_job_to_completion(self):
+        url = self.notify().json()["status_url"]
+
+        self.assertEqual(jobs.run_queued_jobs(), 1)
+        status = self.client.get(url).json()
+        # one absent student per class is flagged; one of them has no email
+        self.assertEqual((status["status"], status["total"], status["pending"]), ("sending", 1, 1))
+        self.assertEqual(len(status["errors"]), 1)
+
+        outbox.drain()
+        jobs.complete_jobs()
+        status = self.client.get(url).json()
+        self.assertEqual((status["status"], status["sent"], status["done"]), ("done", 1, True))
+        self.assertEqual(len(mail.outbox), 1)
+
+        # a finished job no longer absorbs new clicks
+        self.assertTrue(self.notify().json()["created"])
+
+    def test_job_left_running_by_a_crashed_worker_is_reclaimed(self):
+        first = self.notify().json()
+        job = NotificationJob.objects.get(pk=first["job_id"])
+        NotificationJob.objects.filter(pk=job.pk).update(
+            status=NotificationJob.RUNNING, started_at=timezone.now() - timedelta(minutes=5),
+        )
+        # still inside the lease: not rerun, later clicks attach to it
+        self.assertEqual(jobs.run_queued_jobs(), 0)
+        self.assertEqual(self.notify().json()["job_id"], job.pk)
+
+        NotificationJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(minutes=11))
+        self.assertEqual(jobs.run_queued_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total), (NotificationJob.SENDING, 1))
+
+    def test_status_is_private(self):
+        job, _ = jobs.start_redflag_job(self.teacher, 30, 60)
+        other = User.objects.create_user(username="other", password="x", is_teacher=True)
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f"/teacher/notify_students/{job.pk}/status/").status_code, 404)
+
+
+class StreamingCsvTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(1, 3, students_per_class=4)
+        self.client.force_login(self.teacher)
+
+    def test_class_csv_streams_same_content(self):
+        from .management.commands.aura_bench_exports import legacy_class_csv
+
+        class_id = self.classes[0].pk
+        resp = self.client.get(f"/class/{class_id}/export/csv/")
+        self.assertTrue(resp.streaming)
+        body = b"".join(resp.streaming_content).decode()
+
+        self.assertEqual(body, legacy_class_csv(class_id).content.decode())
+        self.assertEqual(len(body.strip().splitlines()), 1 + 12)
+
+    def test_session_csv(self):
+        session = Session.objects.first()
+        resp = self.client.get(f"/session/{session.pk}/export/csv/")
+        lines = b"".join(resp.streaming_content).decode().strip().splitlines()
+        self.assertEqual(lines[0], "Student ID,Student Name,Present,Verified By Face,Timestamp,Source")
+        self.assertEqual(len(lines), 1 + 4)
+
+    def test_single_query_regardless_of_size(self):
+        from .utils import iter_class_csv
+
+        with self.assertNumQueries(1):
+            chunks = list(iter_class_csv(self.classes[0].pk, chunk_size=5))
+        self.assertGreater(len("".join(chunks)), 0)
+
+
+class WriteOnlyXlsxTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(1, 3, students_per_class=4)
+        self.client.force_login(self.teacher)
+
+    @staticmethod
+    def _load(data):
+        from io import BytesIO
+
+        from openpyxl import load_workbook
+        return load_workbook(BytesIO(data)).active
+
+    def test_class_xlsx_matches_in_memory_export(self):
+        from .management.commands.aura_bench_exports import legacy_class_xlsx
+
+        class_id = self.classes[0].pk
+        resp = self.client.get(f"/class/{class_id}/export/xlsx/")
+        self.assertTrue(resp.streaming)
+        ws = self._load(b"".join(resp.streaming_content))
+        old = self._load(legacy_class_xlsx(class_id).content)
+
+        self.assertEqual(list(ws.values), list(old.values))
+        self.assertEqual(ws.max_row, 1 + 12)
+        # widths are computed up front but follow the old longest-value rule
+        for col in "ABCDEFG":
+            self.assertEqual(ws.column_dimensions[col].width, old.column_dimensions[col].width)
+
+    def test_subject_xlsx_with_aware_datetimes(self):
+        resp = self.client.get(f"/teacher/report/subject/{self.subjects[0].pk}/export/xlsx/")
+        ws = self._load(b"".join(resp.streaming_content))
+        rows = list(ws.values)
+        self.assertEqual(rows[0], ("Session ID", "Class", "Start Time", "End Time", "Present", "Absent"))
+        self.assertEqual(len(rows), 1 + Session.objects.filter(subject=self.subjects[0]).count())
+
+    def test_rows_are_fetched_in_one_query(self):
+        from .utils import export_class_xlsx
+
+        # one aggregate for the widths, one cursor for the rows
+        with self.assertNumQueries(2):
+            out = export_class_xlsx(self.classes[0].pk, chunk_size=5)
+        self.assertGreater(len(out.read()), 0)
+
+
+class SubjectExportTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(2, 3, students_per_class=4)
+        self.client.force_login(self.teacher)
+        self.subject = self.subjects[0]
+
+    def _legacy_rows(self):
+        rows = []
+        for s in Session.objects.filter(subject=self.subject).order_by("id"):
+            rows.append([
+                s.session_id, s.class_group.name, str(s.start_time), str(s.end_time or "ONGOING"),
+                str(Attendance.objects.filter(session=s, present=True).count()),
+                str(Attendance.objects.filter(session=s, present=False).count()),
+            ])
+        return rows
+
+    def test_csv_unchanged(self):
+        import csv
+
+        from .utils import export_subject_csv
+
+        Session.objects.filter(subject=self.subject).update(end_time=None)
+        rows = list(csv.reader(export_subject_csv(self.subject)))
+        self.assertEqual(rows[0], ["Session ID", "Class", "Start Time", "End Time", "Present", "Absent"])
+        self.assertEqual(rows[1:], self._legacy_rows())
+
+    def test_query_count_does_not_grow_with_sessions(self):
+        from .utils import export_subject_csv, export_subject_xlsx
+
+        self.assertGreaterEqual(Session.objects.filter(subject=self.subject).count(), 2)
+        with self.assertNumQueries(1):
+            export_subject_csv(self.subject)
+        # widths aggregate + rows
+        with self.assertNumQueries(2):
+            export_subject_xlsx(self.subject)
+
+    def test_report_page(self):
+        # session, user, subject, sessions
+        with self.assertNumQueries(4):
+            resp = self.client.get(f"/teacher/report/subject/{self.subject.pk}/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, self.classes[0].name)
+
+
+class ExportJobTests(TestCase):
+
+    def setUp(self):
+        import tempfile
+
+        self.teacher, self.classes, self.subjects = make_school(2, 2, students_per_class=3)
+        self.client.force_login(self.teacher)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = self.settings(AURA_EXPORT_DIR=tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _queue(self, url):
+        resp = self.client.post(url)
+        self.assertEqual(resp.status_code, 202)
+        return resp.json()
+
+    def test_identical_requests_share_a_job(self):
+        url = f"/teacher/export/class/{self.classes[0].pk}/csv/"
+        first = self._queue(url)
+        second = self._queue(url)
+        self.assertTrue(first["created"])
+        self.assertFalse(second["created"])
+        self.assertEqual(first["job_id"], second["job_id"])
+        self.assertEqual(ExportLog.objects.count(), 1)
+
+        # other formats are separate jobs
+        self.assertTrue(self._queue(f"/teacher/export/class/{self.classes[0].pk}/xlsx/")["created"])
+
+        # another user gets their own job and cannot poll this one
+        other = User.objects.create_user(username="other", password="x", is_teacher=True)
+        self.client.force_login(other)
+        self.assertNotEqual(self._queue(url)["job_id"], first["job_id"])
+        self.assertEqual(self.client.get(first["status_url"]).status_code, 404)
+
+    def test_worker_builds_file_and_download(self):
+        from .utils import iter_class_csv
+
+        class_id = self.classes[0].pk
+        data = self._queue(f"/teacher/export/class/{class_id}/csv/")
+        self.assertFalse(self.client.get(data["status_url"]).json()["done"])
+
+        call_command("aura_export_worker", "--once", stdout=StringIO())
+
+        status = self.client.get(data["status_url"]).json()
+        self.assertEqual(status["status"], ExportLog.DONE)
+        resp = self.client.get(status["download_url"])
+        self.assertIn(f'filename="class_{self.classes[0].name}.csv"', resp["Content-Disposition"])
+        self.assertEqual(b"".join(resp.streaming_content).decode(), "".join(iter_class_csv(class_id)))
+
+        # finished jobs are not reused
+        self.assertTrue(self._queue(f"/teacher/export/class/{class_id}/csv/")["created"])
+
+    def test_job_left_running_by_a_crashed_worker_is_rebuilt(self):
+        from .exports import run_queued_exports
+
+        url = f"/teacher/export/class/{self.classes[0].pk}/csv/"
+        data = self._queue(url)
+        ExportLog.objects.filter(pk=data["job_id"]).update(
+            status=ExportLog.RUNNING, started_at=timezone.now() - timedelta(minutes=10),
+        )
+        # inside the lease the job is left alone and new requests attach to it
+        self.assertEqual(run_queued_exports(), 0)
+        self.assertEqual(self._queue(url)["job_id"], data["job_id"])
+
+        ExportLog.objects.filter(pk=data["job_id"]).update(started_at=timezone.now() - timedelta(minutes=31))
+        self.assertEqual(run_queued_exports(), 1)
+        status = self.client.get(data["status_url"]).json()
+        self.assertEqual(status["status"], ExportLog.DONE)
+
+    def test_bulk_zip_job(self):
+        import zipfile
+
+        from .exports import run_queued_exports
+
+        data = self._queue("/teacher/export/bulk/subjects/")
+        with self.settings(AURA_ZIP_WORKERS=1):   # TestCase data is invisible to pool threads
+            run_queued_exports()
+        job = ExportLog.objects.get(pk=data["job_id"])
+        with zipfile.ZipFile(job.file_path) as zf:
+            self.assertEqual(len(zf.namelist()), len(self.subjects))
+
+    def test_failed_job_reports_error(self):
+        from .exports import run_queued_exports
+
+        data = self._queue(f"/teacher/export/class/{self.classes[1].pk}/csv/")
+        self.classes[1].delete()
+        run_queued_exports()
+
+        status = self.client.get(data["status_url"]).json()
+        self.assertEqual(status["status"], ExportLog.FAILED)
+        self.assertTrue(status["done"])
+        self.assertIsNone(status["download_url"])
+        self.assertEqual(os.listdir(settings.AURA_EXPORT_DIR), [])
+
+    def test_large_uncached_get_is_queued(self):
+        url = f"/teacher/export/subject/{self.subjects[0].pk}/csv/"
+        with self.settings(AURA_EXPORT_INLINE_MAX_ROWS=5):   # the subject has 6 rows
+            data = self.client.get(url)
+            self.assertEqual(data.status_code, 202)
+            self.assertEqual(data.json()["job_id"], self._queue(url)["job_id"])
+
+            call_command("aura_export_worker", "--once", stdout=StringIO())
+
+            # once built, the cached file is served straight away
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp["X-Export-Cache"], "hit")
+            resp.close()
+
+        # small misses still build inline
+        resp = self.client.get(f"/teacher/export/subject/{self.subjects[1].pk}/csv/")
+        self.assertEqual(resp["X-Export-Cache"], "miss")
+        resp.close()
+
+    def test_invalid_format(self):
+        resp = self.client.post(f"/teacher/export/class/{self.classes[0].pk}/doc/")
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(ExportLog.objects.exists())
+
+
+class ExportCacheTests(TestCase):
+
+    def setUp(self):
+        import tempfile
+
+        self.teacher, self.classes, self.subjects = make_school(1, 2, students_per_class=3)
+        self.client.force_login(self.teacher)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings_override = self.settings(AURA_EXPORT_DIR=self.tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.url = f"/teacher/export/class/{self.classes[0].pk}/csv/"
+
+    def _get(self, **headers):
+        resp = self.client.get(self.url, headers=headers)
+        if resp.streaming:
+            b"".join(resp.streaming_content)
+            resp.close()
+        return resp
+
+    def test_unchanged_data_is_served_from_cache(self):
+        first = self._get()
+        second = self._get()
+        self.assertEqual(first["X-Export-Cache"], "miss")
+        self.assertEqual(second["X-Export-Cache"], "hit")
+        self.assertEqual(first["ETag"], second["ETag"])
+
+        self.assertEqual(self._get(If_None_Match=first["ETag"]).status_code, 304)
+
+    def test_changed_rows_change_the_key(self):
+        etag = self._get()["ETag"]
+
+        a = Attendance.objects.filter(session__class_group=self.classes[0]).first()
+        a.present = not a.present
+        a.save()
+        resp = self._get(If_None_Match=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["X-Export-Cache"], "miss")
+        self.assertNotEqual(resp["ETag"], etag)
+
+        # a student rename also changes every export that shows names
+        etag = resp["ETag"]
+        a.student.save()
+        self.assertNotEqual(self._get()["ETag"], etag)
+
+    def test_file_evicted_before_open_is_rebuilt(self):
+        from .exports import cached_export
+
+        calls = []
+
+        def evicted_after_lookup(params, key=None, progress=None):
+            path, key, hit = cached_export(params, key, progress)
+            if not calls:
+                path.unlink()   # another request's fill() evicted it
+            calls.append(path)
+            return path, key, hit
+
+        with mock.patch("attendance.views.cached_export", side_effect=evicted_after_lookup):
+            resp = self._get()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(calls[1].exists())
+
+    def test_class_and_subject_renames_change_the_key(self):
+        etag = self._get()["ETag"]
+        self.classes[0].name = "Renamed"
+        self.classes[0].save()
+        renamed = self._get()
+        self.assertEqual(renamed["X-Export-Cache"], "miss")
+        self.assertNotEqual(renamed["ETag"], etag)
+
+        self.subjects[0].name = "Renamed subject"
+        self.subjects[0].save()
+        self.assertNotEqual(self._get()["ETag"], renamed["ETag"])
+
+    def test_pdf_keys_change_with_the_report_date(self):
+        from .export_cache import cache_key
+
+        pdf = {"kind": "muster", "id": self.classes[0].pk}
+        csv = {"kind": "class", "id": self.classes[0].pk, "fmt": "csv"}
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        before = cache_key(pdf), cache_key(csv)
+        with mock.patch("attendance.export_cache.localdate", return_value=tomorrow):
+            after = cache_key(pdf), cache_key(csv)
+        self.assertNotEqual(before[0], after[0])
+        self.assertEqual(before[1], after[1])
+
+    def test_cached_export_job_is_done_at_once(self):
+        self._get()
+        resp = self.client.post(self.url)
+        status = self.client.get(resp.json()["status_url"]).json()
+        self.assertEqual(status["status"], ExportLog.DONE)
+
+    def test_lru_eviction_keeps_recently_used(self):
+        from .export_cache import entries, evict, fill, lookup
+
+        for i, key in enumerate(["a" * 64, "b" * 64, "c" * 64]):
+            path = fill(key, "csv", lambda out: out.write(b"x" * 100))
+            os.utime(path, (1000 + i, 1000 + i))
+        lookup("a" * 64, "csv")   # touch: now the most recent
+
+        self.assertEqual(evict(limit=250), 1)
+        self.assertEqual(sorted(p.name[0] for p, _, _ in entries()), ["a", "c"])
+
+    def test_command_purges(self):
+        self._get()
+        out = StringIO()
+        call_command("aura_export_cache", stdout=out)
+        self.assertIn("1 files", out.getvalue())
+
+        call_command("aura_export_cache", "--purge", stdout=StringIO())
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+def _unzip(chunks):
+    import zipfile
+    from io import BytesIO
+
+    with zipfile.ZipFile(BytesIO(b"".join(chunks))) as zf:
+        return {info.filename: zf.read(info).decode() for info in zf.infolist()}
+
+
+class StreamingZipTests(TestCase):
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(3, 2, students_per_class=3)
+        self.client.force_login(self.teacher)
+
+    def test_bulk_classes_streams_member_csvs(self):
+        from .utils import iter_class_csv
+
+        with self.settings(AURA_ZIP_WORKERS=1):
+            resp = self.client.get("/teacher/export/bulk/classes/")
+            self.assertTrue(resp.streaming)
+            files = _unzip(resp.streaming_content)
+
+        self.assertEqual(
+            files, {f"{c.name}_class.csv": "".join(iter_class_csv(c.pk)) for c in self.classes}
+        )
+
+    def test_bulk_subjects(self):
+        from .utils import export_subject_csv
+
+        with self.settings(AURA_ZIP_WORKERS=1):
+            files = _unzip(self.client.get("/teacher/export/bulk/subjects/").streaming_content)
+        self.assertEqual(files[f"{self.subjects[0].code}_subject.csv"],
+                         export_subject_csv(self.subjects[0]).getvalue())
+
+    def test_members_are_zip64(self):
+        import zipfile
+        from io import BytesIO
+
+        from .zipstream import iter_zip
+
+        data = b"".join(iter_zip([("a.txt", lambda: ["x" * 10])], workers=1))
+        # local header: sizes follow in a data descriptor (unseekable stream)
+        # and a ZIP64 extra field (id 0x0001) is reserved up front
+        self.assertEqual(data[:4], b"PK\x03\x04")
+        self.assertTrue(int.from_bytes(data[6:8], "little") & 0x08)
+        name_len = int.from_bytes(data[26:28], "little")
+        self.assertEqual(data[30 + name_len:32 + name_len], b"\x01\x00")
+        with zipfile.ZipFile(BytesIO(data)) as zf:
+            self.assertEqual(zf.read("a.txt"), b"x" * 10)
+
+    def test_worker_error_propagates(self):
+        from .zipstream import iter_zip
+
+        def broken():
+            yield "ok"
+            raise RuntimeError("db went away")
+
+        with self.assertRaisesMessage(RuntimeError, "db went away"):
+            list(iter_zip([("a.csv", broken), ("b.csv", lambda: ["b"])], workers=2))
+
+
+class ParallelZipTests(TransactionTestCase):
+    """Workers use their own DB connections, so the data must be committed."""
+
+    def test_parallel_matches_serial(self):
+        from .exports import bulk_members
+        from .zipstream import iter_zip
+
+        make_school(5, 2, students_per_class=3)
+        serial = _unzip(iter_zip(bulk_members("classes"), workers=1))
+        parallel = _unzip(iter_zip(bulk_members("classes"), workers=3, queue_chunks=1))
+        self.assertEqual(len(parallel), 5)
+        self.assertEqual(parallel, serial)
+
+    def test_abandoned_download_stops_workers(self):
+        import threading
+
+        from .zipstream import iter_zip
+
+        def endless():
+            while True:
+                yield "x" * 1000
+
+        stream = iter_zip([(f"{i}.csv", endless) for i in range(3)], workers=3, queue_chunks=1)
+        next(stream)
+        stream.close()   # client disconnected
+        for t in threading.enumerate():
+            if t.name.startswith("aura-zip"):
+                t.join(timeout=5)
+                self.assertFalse(t.is_alive())
+
+
+class PdfServiceTests(TestCase):
+
+    def tearDown(self):
+        from . import pdf_service
+        pdf_service.shutdown()
+
+    def test_renders_in_worker_process(self):
+        from .pdf_service import render_pdf, run_in_pool
+
+        with self.settings(AURA_PDF_WORKERS=1, AURA_PDF_TIMEOUT=60):
+            self.assertTrue(render_pdf("<p>hi</p>").startswith(b"%PDF"))
+            self.assertNotEqual(run_in_pool(os.getpid), os.getpid())
+
+    def test_timeout_kills_the_render(self):
+        import time
+
+        from .pdf_service import PDFRenderTimeout, run_in_pool
+
+        with self.settings(AURA_PDF_WORKERS=1):
+            with self.assertRaises(PDFRenderTimeout):
+                run_in_pool(time.sleep, 30, timeout=0.5)
+            # a fresh pool serves the next render
+            self.assertNotEqual(run_in_pool(os.getpid, timeout=60), os.getpid())
+
+    def test_saturated_queue_returns_503(self):
+        import tempfile
+        import threading
+        import time
+
+        from .pdf_service import PDFServiceBusy, run_in_pool
+
+        with self.settings(AURA_PDF_WORKERS=1, AURA_PDF_MAX_QUEUE=0):
+            run_in_pool(os.getpid, timeout=60)   # start the process
+            busy = threading.Thread(target=run_in_pool, args=(time.sleep, 2))
+            busy.start()
+            time.sleep(0.2)
+            with self.assertRaises(PDFServiceBusy):
+                run_in_pool(os.getpid)
+
+            with mock.patch("attendance.views.render_pdf", side_effect=PDFServiceBusy), \
+                    tempfile.TemporaryDirectory() as tmp, self.settings(AURA_EXPORT_DIR=tmp):
+                teacher, classes, _ = make_school(1, 1)
+                self.client.force_login(teacher)
+                resp = self.client.get(f"/teacher/export/class/{classes[0].pk}/pdf/")
+            self.assertEqual(resp.status_code, 503)
+            self.assertEqual(resp["Retry-After"], "5")
+            busy.join()
+
+    def test_inline_when_disabled(self):
+        from .pdf_service import run_in_pool
+
+        with self.settings(AURA_PDF_WORKERS=0):
+            self.assertEqual(run_in_pool(os.getpid), os.getpid())
+
+
+class PdfAssetTests(TestCase):
+
+    def setUp(self):
+        import tempfile
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        os.makedirs(os.path.join(self.root, "static", "attendance"))
+        os.makedirs(os.path.join(self.root, "media"))
+        with open(os.path.join(self.root, "static", "attendance", "logo.png"), "wb") as f:
+            f.write(b"\x89PNG logo")
+        with open(os.path.join(self.root, "media", "photo.jpg"), "wb") as f:
+            f.write(b"jpeg")
+        override = self.settings(
+            STATIC_ROOT=os.path.join(self.root, "static"), STATIC_URL="static/",
+            MEDIA_ROOT=os.path.join(self.root, "media"), MEDIA_URL="/media/",
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_static_and_media_read_from_disk(self):
+        from .pdf_service import make_url_fetcher
+
+        with mock.patch("weasyprint.default_url_fetcher") as http:
+            fetch = make_url_fetcher("http://testserver/")
+            logo = fetch("http://testserver/static/attendance/logo.png")
+            photo = fetch("file:///media/photo.jpg")
+        http.assert_not_called()
+        self.assertEqual(logo["string"], b"\x89PNG logo")
+        self.assertEqual(logo["mime_type"], "image/png")
+        self.assertEqual(photo["string"], b"jpeg")
+
+    def test_other_urls_use_default_fetcher(self):
+        from .pdf_service import make_url_fetcher
+
+        with mock.patch("weasyprint.default_url_fetcher", return_value={"string": b""}) as http:
+            fetch = make_url_fetcher("http://testserver/")
+            fetch("https://upload.wikimedia.org/static/logo.png")   # another host
+            fetch("http://testserver/static/../../etc/passwd")       # escapes STATIC_ROOT
+            fetch("http://testserver/static/missing.png")
+        self.assertEqual(http.call_count, 3)
+
+    def test_fonts_loaded_once_per_process(self):
+        from . import pdf_service
+
+        with mock.patch("weasyprint.HTML") as html:
+            pdf_service._render("<p>a</p>", None)
+            pdf_service._render("<p>b</p>", None)
+
+        first, second = html.return_value.write_pdf.call_args_list
+        self.assertIs(first.kwargs["font_config"], second.kwargs["font_config"])
+        self.assertEqual(html.call_args.kwargs["base_url"], pdf_service.LOCAL_BASE_URL)
+
+
+class StudentReportBatchTests(TestCase):
+
+    def setUp(self):
+        import tempfile
+
+        self.teacher, self.classes, self.subjects = make_school(2, 2, students_per_class=3)
+        self.hod = User.objects.create_user(username="hod", password="x", is_hod=True)
+        self.client.force_login(self.hod)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = self.settings(AURA_EXPORT_DIR=tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def tearDown(self):
+        from . import pdf_service
+        pdf_service.shutdown()
+
+    def test_contexts_use_constant_queries(self):
+        from .reports import student_report_contexts
+
+        with self.assertNumQueries(3):
+            contexts = student_report_contexts(Student.objects.all())
+        self.assertEqual(len(contexts), 6)
+        first = next(c for c in contexts if c["student"].student_id.endswith("_0"))
+        self.assertEqual((first["total_present"], first["total_absent"]), (0, 2))
+        self.assertEqual(first["class_group"], first["student"].class_group)
+        self.assertEqual(len(first["attendances"]), 2)
+
+    def _run_batch(self, scope, pk, bundle):
+        resp = self.client.post(f"/hod/report/students/{scope}/{pk}/{bundle}/")
+        self.assertEqual(resp.status_code, 202)
+        call_command("aura_export_worker", "--once", stdout=StringIO())
+        return self.client.get(resp.json()["status_url"]).json()
+
+    def test_class_zip_has_one_pdf_per_student(self):
+        import zipfile
+
+        with self.settings(AURA_PDF_WORKERS=1):
+            status = self._run_batch("class", self.classes[0].pk, "zip")
+        self.assertEqual(status["status"], ExportLog.DONE, status["error"])
+        self.assertEqual((status["progress"], status["total"]), (3, 3))
+
+        resp = self.client.get(status["download_url"])
+        with zipfile.ZipFile(BytesIO(b"".join(resp.streaming_content))) as zf:
+            names = sorted(zf.namelist())
+            self.assertTrue(all(zf.read(n).startswith(b"%PDF") for n in names))
+        self.assertEqual(names, [f"{self.classes[0].name}_{j}_report.pdf" for j in range(3)])
+
+    def test_department_merged_pdf(self):
+        from .models import Department
+
+        dept = Department.objects.create(name="Science")
+        ClassGroup.objects.filter(pk__in=[c.pk for c in self.classes]).update(department=dept)
+        with self.settings(AURA_PDF_WORKERS=0):
+            status = self._run_batch("department", dept.pk, "pdf")
+        self.assertEqual(status["status"], ExportLog.DONE, status["error"])
+        self.assertEqual(status["filename"], "student_reports_Science.pdf")
+        self.assertEqual(status["total"], 6)
+        body = b"".join(self.client.get(status["download_url"]).streaming_content)
+        self.assertTrue(body.startswith(b"%PDF"))
+
+    def test_rejects_bad_scope_and_non_hod(self):
+        self.assertEqual(self.client.post("/hod/report/students/school/1/zip/").status_code, 400)
+        self.assertEqual(self.client.get(f"/hod/report/students/class/{self.classes[0].pk}/zip/").status_code, 405)
+        self.client.force_login(self.teacher)
+        resp = self.client.post(f"/hod/report/students/class/{self.classes[0].pk}/zip/")
+        self.assertEqual(resp.status_code, 302)
+
+    def test_teacher_cannot_read_an_hods_job(self):
+        with self.settings(AURA_PDF_WORKERS=0):
+            status = self._run_batch("class", self.classes[0].pk, "pdf")
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get(f"/teacher/export/jobs/{status['job_id']}/status/").status_code, 404)
+        self.assertEqual(self.client.get(status["download_url"]).status_code, 404)
+
+        # even a teacher's own student-report job (e.g. from before a role change) is HOD-only
+        ExportLog.objects.filter(pk=status["job_id"]).update(created_by=self.teacher)
+        self.assertEqual(self.client.get(status["download_url"]).status_code, 403)
+
+
+class ReportQueryCountTests(TestCase):
+    """PDF report data is a fixed number of grouped queries whatever the class size."""
+
+    def setUp(self):
+        self.teacher, self.classes, self.subjects = make_school(2, 2, students_per_class=4)
+        TeacherProfile.objects.get_or_create(user=self.teacher)
+        old = Session.objects.create(
+            session_id="old", subject=self.subjects[0], class_group=self.classes[0],
+            teacher=self.teacher, start_time=timezone.now() - timedelta(days=60),
+        )
+        for s in Student.objects.filter(class_group=self.classes[0]):
+            Attendance.objects.create(session=old, student=s, present=True)
+
+    def test_class_report(self):
+        from .reports import class_report_context
+
+        with self.assertNumQueries(2):
+            context = class_report_context(self.classes[0])
+        rows = {r["student"].student_id: r for r in context["rows"]}
+        first = rows[f"{self.classes[0].name}_0"]
+        self.assertEqual((first["present"], first["absent"]), (1, 2))        # old session counts all-time
+        self.assertEqual((first["present_30"], first["absent_30"]), (0, 2))
+        self.assertEqual(rows[f"{self.classes[0].name}_1"]["percentage"], 100)
+        self.assertEqual(context["class_total"], 12)
+
+    def test_overview_report(self):
+        from .reports import overview_report_context
+
+        with self.assertNumQueries(2):
+            context = overview_report_context()
+        self.assertEqual(context["total_sessions"], 4)          # the 60-day-old session is out
+        self.assertEqual(context["total_attendance_rows"], 16)
+        self.assertEqual(context["avg_attendance"], 75.0)
+        self.assertEqual([r["sessions"] for r in context["class_rows"]], [2, 2])
+        self.assertEqual(context["teacher_rows"][0]["sessions"], 4)
+
+    def test_teacher_export_pdfs(self):
+        from .reports import class_pdf_rows, subject_pdf_rows
+
+        with self.assertNumQueries(2):
+            rows, total = class_pdf_rows(self.classes[0])
+        self.assertEqual(total, 3)
+        self.assertEqual(sorted(r["present"] for r in rows), [1, 3, 3, 3])
+
+        with self.assertNumQueries(2):
+            rows, total = subject_pdf_rows(self.subjects[1])
+        self.assertEqual((len(rows), total), (8, 2))
+        self.assertEqual(sorted(r["absent"] for r in rows), [1] * 6 + [2] * 2)   # out of all subject sessions
+
+    def test_hod_report_views_render(self):
+        hod = User.objects.create_user(username="hod", password="x", is_hod=True)
+        self.client.force_login(hod)
+        with self.settings(AURA_PDF_WORKERS=0):
+            for url in (f"/hod/report/class/{self.classes[0].pk}/pdf/", "/hod/report/overview/pdf/"):
+                resp = self.client.get(url)
+                self.assertEqual(resp.status_code, 200, url)
+                self.assertTrue(resp.content.startswith(b"%PDF"))
+
+
+class ReportLabEngineTests(TestCase):
+
+    def setUp(self):
+        import tempfile
+
+        self.teacher, self.classes, self.subjects = make_school(1, 2, students_per_class=3)
+        self.client.force_login(self.teacher)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = self.settings(AURA_EXPORT_DIR=tmp.name, AURA_PDF_WORKERS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_engine_setting_and_per_report_override(self):
+        from .pdf_tables import pdf_engine
+
+        with self.settings(AURA_PDF_ENGINE="weasyprint", AURA_PDF_ENGINES={"muster": "reportlab"}):
+            self.assertEqual(pdf_engine("session"), "weasyprint")
+            self.assertEqual(pdf_engine("muster"), "reportlab")
+        with self.settings(AURA_PDF_ENGINE="reportlab", AURA_PDF_ENGINES={}):
+            self.assertEqual(pdf_engine("subject"), "reportlab")
+        with self.settings(AURA_PDF_ENGINES={"session": "latex"}), self.assertRaises(ValueError):
+            pdf_engine("session")
+
+    def test_muster_roll_grid(self):
+        from .reports import muster_roll
+
+        with self.assertNumQueries(3):
+            roll = muster_roll(self.classes[0])
+        self.assertEqual(len(roll["sessions"]), 2)
+        marks = {r["student"].student_id: r["marks"] for r in roll["rows"]}
+        self.assertEqual(marks[f"{self.classes[0].name}_0"], ["A", "A"])
+        self.assertEqual(marks[f"{self.classes[0].name}_1"], ["P", "P"])
+
+    def test_reportlab_renders_reports(self):
+        from . import pdf_tables
+        from .utils import export_session_pdf
+        from .views import export_class_muster_pdf, export_subject_pdf
+
+        engines = {"session": "reportlab", "subject": "reportlab", "muster": "reportlab"}
+        with self.settings(AURA_PDF_ENGINES=engines), \
+                mock.patch.object(pdf_tables, "MUSTER_BAND_SESSIONS", 1), \
+                mock.patch.object(pdf_tables, "ROWS_PER_TABLE", 2):
+            session = Session.objects.filter(class_group=self.classes[0]).first()
+            for pdf in (export_session_pdf(session.pk), export_subject_pdf(self.subjects[0]),
+                        export_class_muster_pdf(self.classes[0])):
+                self.assertTrue(pdf.startswith(b"%PDF"))
+                self.assertIn(b"%%EOF", pdf[-32:])
+
+    def test_muster_view_and_engine_in_cache_key(self):
+        from .export_cache import cache_key
+
+        params = {"kind": "muster", "id": self.classes[0].pk, "fmt": "pdf"}
+        with self.settings(AURA_PDF_ENGINES={"muster": "reportlab"}):
+            resp = self.client.get(f"/teacher/export/muster/{self.classes[0].pk}/")
+            reportlab_key = cache_key(params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(b"".join(resp.streaming_content).startswith(b"%PDF"))
+        self.assertIn(f'filename="muster_{self.classes[0].name}.pdf"', resp["Content-Disposition"])
+        with self.settings(AURA_PDF_ENGINES={"muster": "weasyprint"}):
+            self.assertNotEqual(cache_key(params), reportlab_key)
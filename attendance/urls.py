@@ -81,6 +81,7 @@ urlpatterns = [
     path("api/teacher/weekly/", views.teacher_weekly_stats, name="teacher_weekly_stats"),
     path("api/class/<int:class_id>/weekly/", views.teacher_class_weekly_stats, name="teacher_class_weekly_stats"),
     path("api/hod/department/", views.hod_department_stats, name="hod_department_stats"),
+    path("api/timeseries/<str:scope>/<int:pk>/", views.attendance_timeseries_api, name="attendance_timeseries_api"),
 
     # HOD
     path("hod/dashboard/", views.hod_dashboard, name="hod_dashboard"),
@@ -93,6 +94,7 @@ urlpatterns = [
     path("hod/devices/", views.device_status, name="device_status"),
 
     path("teacher/notify_students/", views.notify_students_redflag, name="notify_students_redflag"),
+    path("teacher/notify_students/<int:job_id>/status/", views.notify_students_redflag_status, name="notify_students_redflag_status"),
 
     # Teacher Reports
     path("teacher/reports/", views.teacher_reports, name="teacher_reports"),
@@ -106,6 +108,7 @@ urlpatterns = [
 
 # Single class export
     path("teacher/export/class/<int:class_id>/<str:fmt>/", views.export_class, name="export_class"),
+    path("teacher/export/muster/<int:class_id>/", views.export_class_muster, name="export_class_muster"),
 
 # Single subject export
     path("teacher/export/subject/<int:subject_id>/<str:fmt>/", views.export_subject, name="export_subject"),
@@ -113,6 +116,10 @@ urlpatterns = [
 # Bulk ZIP export
     path("teacher/export/bulk/<str:mode>/", views.bulk_export_zip, name="bulk_export_zip"),
 
+# Export jobs (queued by POSTs to the three routes above)
+    path("teacher/export/jobs/<int:job_id>/status/", views.export_job_status, name="export_job_status"),
+    path("teacher/export/jobs/<int:job_id>/download/", views.export_job_download, name="export_job_download"),
+
 
 
     # Subject Reports
@@ -179,6 +186,8 @@ path("hod/analytics/classwise/", hod_views.analytics_classwise, name="hod_analyt
 path("hod/analytics/subject_heatmap/", hod_views.analytics_subject_heatmap, name="hod_analytics_subject_heatmap"),
 path("hod/analytics/teacher_activity/", hod_views.analytics_teacher_activity, name="hod_analytics_teacher_activity"),
 path("hod/analytics/absence_distribution/", hod_views.analytics_absence_distribution, name="hod_analytics_absence_distribution"),
+path("hod/analytics/bundle/", hod_views.analytics_bundle, name="hod_analytics_bundle"),
+path("hod/analytics/cache_stats/", hod_views.analytics_cache_stats, name="hod_analytics_cache_stats"),
 
 # HOD Analytics Page
 path("hod/analytics/", hod_views.hod_analytics_page, name="hod_analytics_page"),
@@ -190,6 +199,7 @@ path("hod/analytics/", hod_views.hod_analytics_page, name="hod_analytics_page"),
     path("hod/report/class/<int:class_id>/pdf/", hod_views.hod_class_report_pdf, name="hod_class_report_pdf"),
     path("hod/report/teacher/<int:teacher_id>/pdf/", hod_views.hod_teacher_report_pdf, name="hod_teacher_report_pdf"),
     path("hod/report/overview/pdf/", hod_views.hod_overview_report_pdf, name="hod_overview_report_pdf"),
+    path("hod/report/students/<str:scope>/<int:pk>/<str:bundle>/", hod_views.hod_student_reports_batch, name="hod_student_reports_batch"),
 
 
 path("teacher/pending/", views.teacher_pending_list, name="teacher_pending_list"),
@@ -6,13 +6,20 @@ from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils import timezone
 
-from weasyprint import HTML   # <-- FIXED (this was missing)
+from .pdf_service import render_pdf
+from .pdf_tables import pdf_engine, session_report_pdf
 from datetime import date, timedelta
 
 
+from django.db.models import Case, Count, F, FloatField, Max, Q, Value, When
+from django.db.models.functions import Cast, Concat, Length, Round
+
+from .analytics import local_date_range_q
+from .summaries import students_below_30d, summaries_current
 from .models import Attendance, Session, Student, Subject
 import csv, io, datetime
 from io import BytesIO
+from tempfile import SpooledTemporaryFile
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
 
@@ -37,17 +44,19 @@ def send_email_notification(subject, body, recipients):
 # ATTENDANCE %
 # -------------------------------------------------------
 def attendance_percentage(student, class_group, subject, start_date, end_date):
+    in_range = local_date_range_q("session__start_time", start_date, end_date)
+
     total = Attendance.objects.filter(
+        in_range,
         student=student,
         session__class_group=class_group,
-        session__start_time__date__range=(start_date, end_date)
     ).count()
 
     present = Attendance.objects.filter(
+        in_range,
         student=student,
         session__class_group=class_group,
         present=True,
-        session__start_time__date__range=(start_date, end_date)
     ).count()
 
     if total == 0:
@@ -60,123 +69,176 @@ def attendance_percentage(student, class_group, subject, start_date, end_date):
 # EXPORTS — unified IDs for all
 # -------------------------------------------------------
 
-def export_class_csv(class_id):
-    buf = io.StringIO()
-    w = csv.writer(buf)
+class _Echo:
+    """File-like object for csv.writer that just returns each formatted row."""
+    def write(self, value):
+        return value
 
-    w.writerow(["Session ID","Student ID","Student Name","Present","Verified By Face","Timestamp","Source"])
 
-    attendances = Attendance.objects.filter(
-        session__class_group_id=class_id
-    ).select_related("student", "session")
+def _stream_csv(header, rows, flush_every=500):
+    """Yield CSV text in blocks of `flush_every` rows (small, constant memory)."""
+    w = csv.writer(_Echo())
+    block = [w.writerow(header)]
+    for row in rows:
+        block.append(w.writerow(row))
+        if len(block) >= flush_every:
+            yield "".join(block)
+            block = []
+    if block:
+        yield "".join(block)
 
-    for a in attendances.order_by("timestamp"):
-        w.writerow([
-            a.session.session_id,
-            a.student.student_id,
-            f"{a.student.first_name} {a.student.last_name}",
-            "Yes" if a.present else "No",
-            "Yes" if a.verified_by_face else "No",
-            a.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-            a.source
-        ])
 
-    buf.seek(0)
-    return buf
+def _yes_no(value):
+    return "Yes" if value else "No"
 
 
+CLASS_CSV_HEADER = ["Session ID","Student ID","Student Name","Present","Verified By Face","Timestamp","Source"]
+SESSION_CSV_HEADER = ["Student ID","Student Name","Present","Verified By Face","Timestamp","Source"]
 
-def export_session_csv(session_id):
-    buf = io.StringIO()
-    w = csv.writer(buf)
 
-    w.writerow(["Student ID","Student Name","Present","Verified By Face","Timestamp","Source"])
+def iter_class_csv(class_id, chunk_size=2000):
+    """Class attendance CSV as a generator: narrow values_list + server-side chunks."""
+    rows = (
+        Attendance.objects
+        .filter(session__class_group_id=class_id)
+        .order_by("timestamp")
+        .values_list(
+            "session__session_id", "student__student_id", "student__first_name",
+            "student__last_name", "present", "verified_by_face", "timestamp", "source",
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    return _stream_csv(CLASS_CSV_HEADER, (
+        [sid, stid, f"{first} {last}", _yes_no(present), _yes_no(face),
+         ts.strftime("%Y-%m-%d %H:%M:%S"), source]
+        for sid, stid, first, last, present, face, ts, source in rows
+    ))
+
+
+def iter_session_csv(session_id, chunk_size=2000):
+    """Session attendance CSV as a generator."""
+    rows = (
+        Attendance.objects
+        .filter(session_id=session_id)
+        .order_by("timestamp")
+        .values_list(
+            "student__student_id", "student__first_name", "student__last_name",
+            "present", "verified_by_face", "timestamp", "source",
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    return _stream_csv(SESSION_CSV_HEADER, (
+        [stid, f"{first} {last}", _yes_no(present), _yes_no(face),
+         ts.strftime("%Y-%m-%d %H:%M:%S"), source]
+        for stid, first, last, present, face, ts, source in rows
+    ))
 
-    attendances = Attendance.objects.filter(
-        session_id=session_id
-    ).select_related("student")
 
-    for a in attendances.order_by("timestamp"):
-        w.writerow([
-            a.student.student_id,
-            f"{a.student.first_name} {a.student.last_name}",
-            "Yes" if a.present else "No",
-            "Yes" if a.verified_by_face else "No",
-            a.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-            a.source
-        ])
+def export_class_csv(class_id):
+    """Buffered variant (StringIO) for callers that need the whole file."""
+    return io.StringIO("".join(iter_class_csv(class_id)))
 
-    buf.seek(0)
-    return buf
 
+def export_session_csv(session_id):
+    return io.StringIO("".join(iter_session_csv(session_id)))
 
 
-def export_class_xlsx(class_id):
-    attendances = Attendance.objects.filter(
-        session__class_group_id=class_id
-    ).select_related("student", "session")
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"Class_{class_id}"
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+TIMESTAMP_LEN = len("2025-01-01 00:00:00")
 
-    headers = ["Session ID","Student ID","Student Name","Present","Verified Face","Timestamp","Source"]
-    ws.append(headers)
 
-    for a in attendances.order_by("timestamp"):
-        ws.append([
-            a.session.session_id,
-            a.student.student_id,
-            f"{a.student.first_name} {a.student.last_name}",
-            "Yes" if a.present else "No",
-            "Yes" if a.verified_by_face else "No",
-            a.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-            a.source
-        ])
+def _xlsx_widths(headers, lengths):
+    """Same rule as before (longest value + 4, max 50), from precomputed lengths."""
+    return [min(50, max(len(h), n or 0) + 4) for h, n in zip(headers, lengths)]
 
-    # Auto column width
-    for i, col in enumerate(ws.columns, 1):
-        length = max(len(str(c.value)) for c in col if c.value)
-        ws.column_dimensions[get_column_letter(i)].width = min(50, length + 4)
 
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
-    return bio
+def write_xlsx(title, headers, widths, rows):
+    """
+    Write-only workbook: rows are streamed to disk as they are appended, so
+    memory stays flat for any row count. Column widths must be known before
+    the first row (write-only sheets can't be revisited), hence `widths`.
+    Returns a SpooledTemporaryFile positioned at 0.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    for i, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
 
+    ws.append(headers)
+    for row in rows:
+        ws.append(row)
 
+    out = SpooledTemporaryFile(max_size=getattr(settings, "AURA_EXPORT_SPOOL_MAX", 8 * 1024 * 1024))
+    wb.save(out)
+    out.seek(0)
+    return out
 
-def export_session_xlsx(session_id):
-    attendances = Attendance.objects.filter(
-        session_id=session_id
-    ).select_related("student")
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"Session_{session_id}"
+def _name_length():
+    return Length(Concat("student__first_name", Value(" "), "student__last_name"))
 
-    headers = ["Student ID","Student Name","Present","Verified By Face","Timestamp","Source"]
-    ws.append(headers)
 
-    for a in attendances.order_by("timestamp"):
-        ws.append([
-            a.student.student_id,
-            f"{a.student.first_name} {a.student.last_name}",
-            "Yes" if a.present else "No",
-            "Yes" if a.verified_by_face else "No",
-            a.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-            a.source
-        ])
+def export_class_xlsx(class_id, chunk_size=2000):
+    attendances = Attendance.objects.filter(session__class_group_id=class_id)
+
+    headers = ["Session ID","Student ID","Student Name","Present","Verified Face","Timestamp","Source"]
+    m = attendances.aggregate(
+        session_len=Max(Length("session__session_id")),
+        student_len=Max(Length("student__student_id")),
+        name_len=Max(_name_length()),
+        source_len=Max(Length("source")),
+    )
+    has_rows = m["session_len"] is not None
+    widths = _xlsx_widths(headers, [
+        m["session_len"], m["student_len"], m["name_len"], 3 if has_rows else 0, 3 if has_rows else 0,
+        TIMESTAMP_LEN if has_rows else 0, m["source_len"],
+    ])
+
+    rows = (
+        attendances.order_by("timestamp")
+        .values_list(
+            "session__session_id", "student__student_id", "student__first_name",
+            "student__last_name", "present", "verified_by_face", "timestamp", "source",
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    return write_xlsx(f"Class_{class_id}", headers, widths, (
+        [sid, stid, f"{first} {last}", _yes_no(present), _yes_no(face),
+         ts.strftime("%Y-%m-%d %H:%M:%S"), source]
+        for sid, stid, first, last, present, face, ts, source in rows
+    ))
+
 
-    # Auto width
-    for i, col in enumerate(ws.columns, 1):
-        length = max(len(str(c.value)) for c in col if c.value)
-        ws.column_dimensions[get_column_letter(i)].width = min(50, length + 4)
 
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
-    return bio
+def export_session_xlsx(session_id, chunk_size=2000):
+    attendances = Attendance.objects.filter(session_id=session_id)
+
+    headers = ["Student ID","Student Name","Present","Verified By Face","Timestamp","Source"]
+    m = attendances.aggregate(
+        student_len=Max(Length("student__student_id")),
+        name_len=Max(_name_length()),
+        source_len=Max(Length("source")),
+    )
+    has_rows = m["student_len"] is not None
+    widths = _xlsx_widths(headers, [
+        m["student_len"], m["name_len"], 3 if has_rows else 0, 3 if has_rows else 0,
+        TIMESTAMP_LEN if has_rows else 0, m["source_len"],
+    ])
+
+    rows = (
+        attendances.order_by("timestamp")
+        .values_list(
+            "student__student_id", "student__first_name", "student__last_name",
+            "present", "verified_by_face", "timestamp", "source",
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    return write_xlsx(f"Session_{session_id}", headers, widths, (
+        [stid, f"{first} {last}", _yes_no(present), _yes_no(face),
+         ts.strftime("%Y-%m-%d %H:%M:%S"), source]
+        for stid, first, last, present, face, ts, source in rows
+    ))
 
 
 
@@ -184,73 +246,82 @@ def export_session_pdf(session_id):
     session = Session.objects.filter(id=session_id).first()
     attendances = Attendance.objects.filter(session=session).select_related("student")
 
+    if pdf_engine("session") == "reportlab":
+        return session_report_pdf(session, attendances)
+
     html = render_to_string("attendance/pdf/session_report.html", {
         "session": session,
         "attendances": attendances
     })
 
-    pdf = HTML(string=html).write_pdf()
+    pdf = render_pdf(html)
     return pdf
 
 
 
-def export_subject_csv(subject_id):
-    buf = io.StringIO()
-    w = csv.writer(buf)
+def subject_sessions(subject_id):
+    """
+    Sessions of a subject with class name and present/absent counts, all
+    from one grouped query (no per-session COUNTs or class lookups).
+    """
+    return (
+        Session.objects.filter(subject_id=subject_id)
+        .select_related("class_group")
+        .annotate(
+            present_count=Count("attendances", filter=Q(attendances__present=True)),
+            absent_count=Count("attendances", filter=Q(attendances__present=False)),
+        )
+        .order_by("id")
+    )
 
-    w.writerow(["Session ID","Class","Start Time","End Time","Present","Absent"])
 
-    sessions = Session.objects.filter(subject_id=subject_id)
+SUBJECT_CSV_HEADER = ["Session ID","Class","Start Time","End Time","Present","Absent"]
 
-    for s in sessions:
-        present = Attendance.objects.filter(session=s, present=True).count()
-        absent = Attendance.objects.filter(session=s, present=False).count()
 
-        w.writerow([
-            s.session_id,
-            s.class_group.name,
-            s.start_time,
-            s.end_time or "ONGOING",
-            present,
-            absent
-        ])
+def iter_subject_csv(subject_id):
+    """Subject CSV (one row per session) as a generator."""
+    return _stream_csv(SUBJECT_CSV_HEADER, (
+        [s.session_id, s.class_group.name, s.start_time, s.end_time or "ONGOING",
+         s.present_count, s.absent_count]
+        for s in subject_sessions(subject_id).iterator(chunk_size=500)
+    ))
 
-    buf.seek(0)
-    return buf
+
+def export_subject_csv(subject_id):
+    return io.StringIO("".join(iter_subject_csv(subject_id)))
 
 
 
 def export_subject_xlsx(subject_id):
     sessions = Session.objects.filter(subject_id=subject_id)
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"Subject_{subject_id}"
-
     headers = ["Session ID","Class","Start Time","End Time","Present","Absent"]
-    ws.append(headers)
-
-    for s in sessions:
-        present = Attendance.objects.filter(session=s, present=True).count()
-        absent = Attendance.objects.filter(session=s, present=False).count()
-        ws.append([
-            s.session_id,
-            s.class_group.name,
-            s.start_time,
-            s.end_time or "ONGOING",
-            present,
-            absent
-        ])
-
-    # Auto width
-    for i, col in enumerate(ws.columns, 1):
-        length = max(len(str(c.value)) for c in col if c.value)
-        ws.column_dimensions[get_column_letter(i)].width = min(50, length + 4)
-
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
-    return bio
+    m = sessions.aggregate(
+        session_len=Max(Length("session_id")),
+        class_len=Max(Length("class_group__name")),
+        sessions=Count("id"),
+        ongoing=Count("id", filter=Q(end_time__isnull=True)),
+    )
+    has_rows = m["sessions"] > 0
+    datetime_len = TIMESTAMP_LEN if has_rows else 0
+    end_len = max(datetime_len, len("ONGOING") if m["ongoing"] else 0)
+    widths = _xlsx_widths(headers, [
+        m["session_len"], m["class_len"], datetime_len, end_len, 6, 6,
+    ])
+
+    def rows():
+        for s in subject_sessions(subject_id).iterator(chunk_size=500):
+            yield [
+                s.session_id,
+                s.class_group.name,
+                # Excel has no timezones: write local wall-clock time
+                timezone.localtime(s.start_time).replace(tzinfo=None),
+                timezone.localtime(s.end_time).replace(tzinfo=None) if s.end_time else "ONGOING",
+                s.present_count,
+                s.absent_count
+            ]
+
+    return write_xlsx(f"Subject_{subject_id}", headers, widths, rows())
 
 
 
@@ -268,10 +339,7 @@ def export_subject_pdf(subject_input):
         "sessions": sessions,
     })
 
-    bio = BytesIO()
-    HTML(string=html).write_pdf(bio)
-    bio.seek(0)
-    return bio
+    return BytesIO(render_pdf(html))
 
 
 
@@ -280,26 +348,54 @@ def export_subject_pdf(subject_input):
 # RED FLAG HELPERS
 # -------------------------------------------------------
 def red_flag_students_for_user(user, days=30, threshold=60):
-    flagged = []
-
+    """
+    Students of the teacher's classes whose attendance in their own class
+    over the last `days` days is below `threshold` percent (no attendance
+    counts as 0%). The 30-day window reads the maintained summaries while
+    they are current; otherwise one aggregated query with the threshold
+    applied in HAVING.
+    """
     classes = user.teacher_profile.classes.all()
+
+    if days == 30 and summaries_current():
+        return [
+            {"student": s, "class_group": c, "percentage": perc}
+            for s, c, perc in students_below_30d(classes, threshold)
+        ]
+
     start = date.today() - timedelta(days=days)
 
-    for c in classes:
-        for s in Student.objects.filter(class_group=c):
-            perc = attendance_percentage(
-                s, c, None,
-                start,
-                date.today()
-            )
-            if perc < threshold:
-                flagged.append({
-                    "student": s,
-                    "class_group": c,
-                    "percentage": perc
-                })
-
-    return flagged
+    in_range = (
+        local_date_range_q("attendance__session__start_time", start, date.today())
+        & Q(attendance__session__class_group=F("class_group"))
+    )
+    total = Count("attendance", filter=in_range)
+    present = Count("attendance", filter=in_range & Q(attendance__present=True))
+
+    students = (
+        Student.objects
+        .filter(class_group__in=classes)
+        .select_related("class_group")
+        .annotate(
+            total_count=total,
+            perc=Case(
+                When(total_count=0, then=Value(0.0)),
+                default=Round(Cast(present, FloatField()) * 100 / total, 2),
+                output_field=FloatField(),
+            ),
+        )
+        .filter(perc__lt=threshold)
+        .order_by("class_group_id", "pk")
+    )
+
+    return [
+        {
+            "student": s,
+            "class_group": s.class_group,
+            "percentage": s.perc if s.total_count else 0,
+        }
+        for s in students
+    ]
 
 
 def render_redflag_email(student, class_group, percentage):
@@ -1,34 +1,55 @@
 # attendance/views.py
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import JsonResponse, HttpResponse
+from django.core.exceptions import PermissionDenied
+from django.http import (
+    FileResponse, JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse,
+)
+from django.utils.http import parse_etags, quote_etag
 from django.views.decorators.http import require_POST
 from datetime import date, timedelta
 import datetime
+from pathlib import Path
 from django.contrib.auth import logout
-import zipfile
-from io import BytesIO
 
 
 from .utils import (
     export_subject_csv,
     export_subject_xlsx,
     export_subject_pdf,
+    subject_sessions,
     red_flag_students_for_user,
-    render_redflag_email,
-    send_email_notification,
     attendance_percentage,
-    export_class_csv,
-    export_session_csv,
-    export_session_pdf,
+    iter_class_csv,
+    iter_session_csv,
     export_class_xlsx,
-    export_session_xlsx
+    export_session_xlsx,
+    XLSX_CONTENT_TYPE,
 )
 
 from .models import (
     User, ClassGroup, Session, Student,
-    Department, Attendance, FineRule, Device, Subject, TeacherProfile
+    Department, Attendance, FineRule, Device, Subject, TeacherProfile,
+    NotificationJob
+)
+from .analytics import (
+    attendance_timeseries, get_date_range_from_request, last_n_days, pick_bucket
+)
+from .export_cache import cache_key, lookup
+from .pdf_service import pdf_service_errors, render_pdf
+from .zipstream import iter_zip
+from .reports import class_pdf_rows, muster_roll, subject_pdf_rows
+from .pdf_tables import muster_pdf, pdf_engine, subject_report_pdf
+from .exports import (
+    BULK_MODES, FORMATS, builds_inline, bulk_members, cached_export, export_status, extension, start_export,
 )
+from .jobs import job_status, start_redflag_job
+from .outbox import enqueue_email
+from .rollups import refresh_rollup_for_session
+from .summaries import refresh_summaries_for_session
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.urls import reverse
 from django.contrib.auth import authenticate, login
 
 
@@ -43,6 +64,10 @@ def is_hod(user):
     return user.is_authenticated and getattr(user, "is_hod", False)
 
 
+def is_teacher_or_hod(user):
+    return is_teacher(user) or is_hod(user)
+
+
 # ---------------------
 # Teacher Login (kept simple)
 # ---------------------
@@ -181,27 +206,17 @@ def hod_teacher_detail(request, teacher_id):
 # -------------------------------------------------------------------
 # Chart APIs (teacher / class / hod)
 # -------------------------------------------------------------------
+def _series(num_days, label_fmt, **filters):
+    """Last `num_days` days as (labels, present, absent), gap-filled."""
+    start, end = last_n_days(num_days)
+    data = attendance_timeseries(start, end, "day", label_fmt, **filters)
+    return data["labels"], data["present"], data["absent"]
+
+
 @login_required
 @user_passes_test(is_teacher)
 def teacher_weekly_stats(request):
-    today = date.today()
-    labels, present, absent = [], [], []
-
-    for i in range(6, -1, -1):
-        d = today - timedelta(days=i)
-        labels.append(d.strftime("%a %d"))
-
-        present.append(Attendance.objects.filter(
-            present=True,
-            timestamp__date=d,
-            session__teacher=request.user
-        ).count())
-
-        absent.append(Attendance.objects.filter(
-            present=False,
-            timestamp__date=d,
-            session__teacher=request.user
-        ).count())
+    labels, present, absent = _series(7, "%a %d", teacher=request.user)
 
     return JsonResponse({"labels": labels, "present": present, "absent": absent})
 
@@ -209,24 +224,7 @@ def teacher_weekly_stats(request):
 @login_required
 @user_passes_test(is_teacher)
 def teacher_class_weekly_stats(request, class_id):
-    today = date.today()
-    labels, present, absent = [], [], []
-
-    for i in range(6, -1, -1):
-        d = today - timedelta(days=i)
-        labels.append(d.strftime("%a %d"))
-
-        present.append(Attendance.objects.filter(
-            session__class_group_id=class_id,
-            present=True,
-            timestamp__date=d
-        ).count())
-
-        absent.append(Attendance.objects.filter(
-            session__class_group_id=class_id,
-            present=False,
-            timestamp__date=d
-        ).count())
+    labels, present, absent = _series(7, "%a %d", class_group=class_id)
 
     return JsonResponse({"labels": labels, "present": present, "absent": absent})
 
@@ -237,18 +235,21 @@ def hod_department_stats(request):
     thirty = date.today() - timedelta(days=30)
     labels, values = [], []
 
-    for dept in Department.objects.all():
-        labels.append(dept.name)
+    in_range = Q(classgroup__daily_rollups__date__gte=thirty)
+    departments = Department.objects.annotate(
+        total_sessions=Sum("classgroup__daily_rollups__session_count", filter=in_range),
+        total_att=Sum(
+            F("classgroup__daily_rollups__present_count")
+            + F("classgroup__daily_rollups__absent_count"),
+            filter=in_range,
+        ),
+    )
 
-        total_sessions = Session.objects.filter(
-            class_group__department=dept,
-            start_time__date__gte=thirty
-        ).count()
+    for dept in departments:
+        labels.append(dept.name)
 
-        total_att = Attendance.objects.filter(
-            session__class_group__department=dept,
-            timestamp__date__gte=thirty
-        ).count()
+        total_sessions = dept.total_sessions or 0
+        total_att = dept.total_att or 0
 
         avg = (total_att / total_sessions) if total_sessions else 0
         values.append(round(avg, 2))
@@ -265,24 +266,7 @@ def hod_department_stats(request):
 def hod_teacher_weekly_stats(request, teacher_id):
     teacher = get_object_or_404(User, id=teacher_id, is_teacher=True)
 
-    today = date.today()
-    labels, present, absent = [], [], []
-
-    for i in range(6, -1, -1):
-        d = today - timedelta(days=i)
-        labels.append(d.strftime("%a %d"))
-
-        present.append(Attendance.objects.filter(
-            present=True,
-            timestamp__date=d,
-            session__teacher=teacher
-        ).count())
-
-        absent.append(Attendance.objects.filter(
-            present=False,
-            timestamp__date=d,
-            session__teacher=teacher
-        ).count())
+    labels, present, absent = _series(7, "%a %d", teacher=teacher)
 
     return JsonResponse({
         "labels": labels,
@@ -292,56 +276,122 @@ def hod_teacher_weekly_stats(request, teacher_id):
 
 
 
+# -------------------------------------------------------------------
+# Time-series API (any scope, any range, day/week/month buckets)
+# -------------------------------------------------------------------
+TIMESERIES_SCOPES = {
+    "teacher": lambda pk: get_object_or_404(User, id=pk, is_teacher=True),
+    "class": lambda pk: get_object_or_404(ClassGroup, id=pk),
+    "subject": lambda pk: get_object_or_404(Subject, id=pk),
+    "department": lambda pk: get_object_or_404(Department, id=pk),
+}
+
+TIMESERIES_LABELS = {"day": "%Y-%m-%d", "week": "%Y-%m-%d", "month": "%Y-%m"}
+
+
+def _timeseries_allowed(user, scope, obj):
+    """HODs see every series; teachers only their own, their classes and subjects."""
+    if is_hod(user):
+        return True
+    if scope == "teacher":
+        return obj.pk == user.pk
+    profile = getattr(user, "teacher_profile", None)
+    if profile is None or scope == "department":
+        return False
+    related = profile.classes if scope == "class" else profile.subjects
+    return related.filter(pk=obj.pk).exists()
+
+
+@login_required
+@user_passes_test(lambda u: is_teacher(u) or is_hod(u))
+def attendance_timeseries_api(request, scope, pk):
+    """
+    ?range=last7|last30|this_month|custom (&start_date/&end_date)
+    &resolution=auto|day|week|month
+
+    The resolution is never finer than AURA_TIMESERIES_MAX_POINTS allows;
+    a requested one that is too fine is coarsened automatically, and a range
+    longer than that many months is a 400. Teachers may only read their own
+    series and those of their classes and subjects.
+    """
+    if scope not in TIMESERIES_SCOPES:
+        return JsonResponse({"error": "Unknown scope"}, status=404)
+    obj = TIMESERIES_SCOPES[scope](pk)
+    if not _timeseries_allowed(request.user, scope, obj):
+        return JsonResponse({"error": "Not allowed for this scope"}, status=403)
+
+    start, end, label = get_date_range_from_request(request)
+    if start > end:
+        return JsonResponse({"error": "start_date must not be after end_date"}, status=400)
+
+    requested = request.GET.get("resolution", "auto")
+    if requested not in ("auto", "day", "week", "month"):
+        return JsonResponse({"error": "Unknown resolution"}, status=400)
+    bucket = pick_bucket(start, end, minimum="day" if requested == "auto" else requested)
+    if bucket is None:
+        return JsonResponse({"error": "Date range too long"}, status=400)
+
+    filter_name = "class_group" if scope == "class" else scope
+    data = attendance_timeseries(
+        start, end, bucket, TIMESERIES_LABELS[bucket], **{filter_name: obj}
+    )
+
+    return JsonResponse({
+        "scope": scope,
+        "id": pk,
+        "resolution": bucket,
+        "range": {"start": str(start), "end": str(end), "label": label},
+        **data,
+    })
+
+
 # -------------------------------------------------------------------
 # Exports (CSV/XLSX/PDF)
 # -------------------------------------------------------------------
+def csv_stream_response(chunks, filename):
+    """Stream CSV text chunks straight to the client (nothing buffered)."""
+    response = StreamingHttpResponse(chunks, content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 @user_passes_test(is_teacher)
 def class_export_csv(request, class_id):
-    csv_buf = export_class_csv(class_id)
-    response = HttpResponse(csv_buf.getvalue(), content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="class_{class_id}.csv"'
-    return response
+    return csv_stream_response(iter_class_csv(class_id), f"class_{class_id}.csv")
 
 
 @login_required
 @user_passes_test(is_teacher)
 def session_export_csv_view(request, session_id):
-    csv_buf = export_session_csv(session_id)
-    response = HttpResponse(csv_buf.getvalue(), content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="session_{session_id}.csv"'
-    return response
+    return csv_stream_response(iter_session_csv(session_id), f"session_{session_id}.csv")
 
 
 @login_required
 @user_passes_test(is_teacher)
+@pdf_service_errors
 def session_export_pdf_view(request, session_id):
-    pdf_bytes = export_session_pdf(session_id)
-    return HttpResponse(pdf_bytes, content_type="application/pdf")
+    return cached_export_response(
+        request, {"kind": "session", "id": session_id, "fmt": "pdf"}, f"session_{session_id}.pdf",
+        as_attachment=False,
+    )
+
+
+def xlsx_file_response(fileobj, filename):
+    """Serve a spooled XLSX file in blocks; FileResponse closes it afterwards."""
+    return FileResponse(fileobj, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
 
 
 @login_required
 @user_passes_test(is_teacher)
 def class_export_xlsx(request, class_id):
-    bio = export_class_xlsx(class_id)
-    response = HttpResponse(
-        bio.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="class_{class_id}.xlsx"'
-    return response
+    return xlsx_file_response(export_class_xlsx(class_id), f"class_{class_id}.xlsx")
 
 
 @login_required
 @user_passes_test(is_teacher)
 def session_export_xlsx_view(request, session_id):
-    bio = export_session_xlsx(session_id)
-    response = HttpResponse(
-        bio.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="session_{session_id}.xlsx"'
-    return response
+    return xlsx_file_response(export_session_xlsx(session_id), f"session_{session_id}.xlsx")
 
 
 # -------------------------------------------------------------------
@@ -360,11 +410,14 @@ def notify_hod_class(request, class_id):
         Uploaded by: <b>{request.user.username}</b>
     """
 
-    for h in hods:
-        if h.email:
-            send_email_notification(subject, body, [h.email])
+    # one message per HOD, queued for the outbox worker
+    with transaction.atomic():
+        queued = sum(
+            1 for h in hods
+            if enqueue_email(subject, body, [h.email])
+        )
 
-    return JsonResponse({"status": "ok"})
+    return JsonResponse({"status": "ok", "queued": queued})
 
 
 
@@ -386,28 +439,28 @@ def device_status(request):
 @user_passes_test(is_teacher)
 @require_POST
 def notify_students_redflag(request):
+    """
+    Queue a background job that emails the red-flag students and return its
+    id at once; a repeated click while it runs returns the same job.
+    """
     days = int(request.POST.get("days", 30))
     threshold = float(request.POST.get("threshold", 60))
 
-    flagged = red_flag_students_for_user(request.user, days=days, threshold=threshold)
-    sent = 0
-    errors = []
+    job, created = start_redflag_job(request.user, days, threshold)
 
-    for row in flagged:
-        s = row["student"]
-        c = row["class_group"]
-        perc = row["percentage"]
-        if not s.email:
-            errors.append(f"{s.student_id} missing email")
-            continue
-        subject, body = render_redflag_email(s, c, perc)
-        try:
-            send_email_notification(subject, body, [s.email])
-            sent += 1
-        except Exception as e:
-            errors.append(f"{s.student_id}: {str(e)}")
+    return JsonResponse({
+        "status": "ok",
+        "job_id": job.pk,
+        "created": created,
+        "status_url": reverse("notify_students_redflag_status", args=[job.pk]),
+    }, status=202)
 
-    return JsonResponse({"status": "ok", "sent": sent, "errors": errors})
+
+@login_required
+@user_passes_test(is_teacher)
+def notify_students_redflag_status(request, job_id):
+    job = get_object_or_404(NotificationJob, pk=job_id, created_by=request.user)
+    return JsonResponse(job_status(job))
 
 
 # -------------------------------------------------------------------
@@ -441,7 +494,7 @@ def teacher_report_class(request, class_id):
 @user_passes_test(is_teacher)
 def teacher_report_subject(request, subject_id):
     subject = get_object_or_404(Subject, id=subject_id)
-    sessions = Session.objects.filter(subject=subject)
+    sessions = subject_sessions(subject)
 
     return render(request, "attendance/teacher_report_subject.html", {
         "subject": subject,
@@ -480,29 +533,8 @@ def teacher_report_student(request, student_id):
 def teacher_report_monthly(request):
     teacher = request.user
 
-    today = date.today()
-    days = []
-    present_list = []
-    absent_list = []
-
-    for i in range(29, -1, -1):  # last 30 days
-        d = today - timedelta(days=i)
-        days.append(d.strftime("%d %b"))
-
-        present = Attendance.objects.filter(
-            session__teacher=teacher,
-            present=True,
-            timestamp__date=d
-        ).count()
-
-        absent = Attendance.objects.filter(
-            session__teacher=teacher,
-            present=False,
-            timestamp__date=d
-        ).count()
-
-        present_list.append(present)
-        absent_list.append(absent)
+    # last 30 days
+    days, present_list, absent_list = _series(30, "%d %b", teacher=teacher)
 
     total_present = sum(present_list)
     total_absent = sum(absent_list)
@@ -523,27 +555,7 @@ def teacher_report_monthly(request):
 def subject_stats_api(request, subject_id):
     subject = get_object_or_404(Subject, id=subject_id)
 
-    today = date.today()
-    days, present_list, absent_list = [], [], []
-
-    for i in range(29, -1, -1):
-        d = today - timedelta(days=i)
-        days.append(d.strftime("%d %b"))
-
-        present = Attendance.objects.filter(
-            session__subject=subject,
-            present=True,
-            timestamp__date=d
-        ).count()
-
-        absent = Attendance.objects.filter(
-            session__subject=subject,
-            present=False,
-            timestamp__date=d
-        ).count()
-
-        present_list.append(present)
-        absent_list.append(absent)
+    days, present_list, absent_list = _series(30, "%d %b", subject=subject)
 
     total_present = sum(present_list)
     total_absent = sum(absent_list)
@@ -576,26 +588,23 @@ def export_subject_csv_view(request, subject_id):
 @user_passes_test(is_teacher)
 def export_subject_xlsx_view(request, subject_id):
     subject = get_object_or_404(Subject, id=subject_id)
-    bio = export_subject_xlsx(subject)
-
-    response = HttpResponse(
-        bio.getvalue(),
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-    response["Content-Disposition"] = f'attachment; filename="{subject.code}_report.xlsx"'
-    return response
+    return xlsx_file_response(export_subject_xlsx(subject), f"{subject.code}_report.xlsx")
 
 
 @login_required
 @user_passes_test(is_teacher)
+@pdf_service_errors
 def export_subject_pdf_view(request, subject_id):
     subject = get_object_or_404(Subject, id=subject_id)
-    pdf_bytes = export_subject_pdf(subject)
-    return HttpResponse(pdf_bytes, content_type="application/pdf")
+    return cached_export_response(
+        request, {"kind": "subject", "id": subject.pk, "fmt": "pdf"}, f"{subject.code}.pdf",
+        as_attachment=False,
+    )
 
 
 @login_required
 @user_passes_test(is_teacher)
+@pdf_service_errors
 def subject_export_pdf(request, subject_id):
     pdf = export_subject_pdf(subject_id)
     response = HttpResponse(pdf.getvalue(), content_type="application/pdf")
@@ -680,32 +689,37 @@ def teacher_pending_submit(request, pk):
     if request.method != "POST":
         return redirect("teacher_pending_review", pk=pk)
 
-    # --- Create real session ---
-    real = Session.objects.create(
-        session_id=pending.temp_id,
-        subject=pending.subject,
-        class_group=pending.class_group,
-        teacher=request.user,
-        start_time=pending.created_at,
-        end_time=timezone.now()
-    )
+    with transaction.atomic():
+        # --- Create real session ---
+        real = Session.objects.create(
+            session_id=pending.temp_id,
+            subject=pending.subject,
+            class_group=pending.class_group,
+            teacher=request.user,
+            start_time=pending.created_at,
+            end_time=timezone.now()
+        )
 
-    # --- Save attendance ---
-    students = PendingStudent.objects.filter(pending_session=pending)
+        # --- Save attendance ---
+        students = PendingStudent.objects.filter(pending_session=pending)
 
-    for s in students:
-        Attendance.objects.create(
-            session=real,
-            student=s.student,
-            present=s.present,
-            timestamp=s.timestamp or timezone.now(),
-            source="RFID",
-            device_id=pending.device_id
-        )
+        for s in students:
+            Attendance.objects.create(
+                session=real,
+                student=s.student,
+                present=s.present,
+                timestamp=s.timestamp or timezone.now(),
+                source="RFID",
+                device_id=pending.device_id
+            )
 
-    # Mark pending as finalized
-    pending.finalized = True
-    pending.save()
+        # Keep daily analytics rollup and student summaries in sync
+        refresh_rollup_for_session(real)
+        refresh_summaries_for_session(real)
+
+        # Mark pending as finalized
+        pending.finalized = True
+        pending.save()
 
     return redirect("teacher_sessions")  # back to teacher's session history
 
@@ -721,16 +735,97 @@ def logout_view(request):
         return redirect("/teacher/login/")
 
 
-from io import BytesIO
-import zipfile
 from django.http import HttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.template.loader import render_to_string
-from weasyprint import HTML
 
-from .models import Student, Attendance, Session, ClassGroup, Subject
-from .utils import export_class_csv, export_class_xlsx, export_subject_csv, export_subject_xlsx
+from .models import Student, Attendance, Session, ClassGroup, Subject, ExportLog
+from .utils import export_class_xlsx, export_subject_csv, export_subject_xlsx
+
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "xlsx": XLSX_CONTENT_TYPE,
+    "pdf": "application/pdf",
+    "zip": "application/zip",
+}
+
+
+def _etag_matches(request, key):
+    header = request.headers.get("If-None-Match", "")
+    return header.strip() == "*" or f'"{key}"' in parse_etags(header)
+
+
+def cached_export_response(request, params, filename, as_attachment=True, queue_large=False):
+    """
+    Serve an export from the on-disk export cache (building it on a miss).
+    The cache key is the ETag, so an unchanged re-download is a 304. With
+    `queue_large`, a miss too big to build in the request is queued as an
+    export job instead (202 + polling URL, as for the Export Center).
+    """
+    key = cache_key(params)
+    if _etag_matches(request, key):
+        response = HttpResponseNotModified()
+        response["ETag"] = quote_etag(key)
+        return response
+    if queue_large and lookup(key, extension(params)) is None and not builds_inline(params):
+        return queue_export_response(request, params)
+
+    path, key, hit = cached_export(params, key)
+    try:
+        fh = open(path, "rb")
+    except FileNotFoundError:
+        # evicted between lookup and open by another request's build: rebuild
+        path, key, hit = cached_export(params, key)
+        fh = open(path, "rb")
+    response = FileResponse(
+        fh, as_attachment=as_attachment, filename=filename,
+        content_type=EXPORT_CONTENT_TYPES[extension(params)],
+    )
+    response["ETag"] = quote_etag(key)
+    response["X-Export-Cache"] = "hit" if hit else "miss"
+    return response
+
+
+def queue_export_response(request, params):
+    """Queue (or join) an export job for the caller: 202 + polling URL."""
+    job, created = start_export(request.user, params)
+    return JsonResponse({
+        "status": "ok",
+        "job_id": job.pk,
+        "created": created,
+        "status_url": reverse("export_job_status", args=[job.pk]),
+    }, status=202)
+
+
+def _own_export_job(request, job_id, **filters):
+    """The caller's export job; per-student report bundles stay HOD-only."""
+    job = get_object_or_404(ExportLog, pk=job_id, created_by=request.user, **filters)
+    if job.params.get("kind") == "student_reports" and not is_hod(request.user):
+        raise PermissionDenied
+    return job
+
+
+@login_required
+@user_passes_test(is_teacher_or_hod)
+def export_job_status(request, job_id):
+    job = _own_export_job(request, job_id)
+    return JsonResponse(export_status(job))
+
+
+@login_required
+@user_passes_test(is_teacher_or_hod)
+def export_job_download(request, job_id):
+    job = _own_export_job(request, job_id, status=ExportLog.DONE)
+    try:
+        f = open(job.file_path, "rb")
+    except OSError:
+        # evicted from the export cache: the Export Center can queue it again
+        return HttpResponse("Export file is no longer available", status=410)
+    response = FileResponse(f, as_attachment=True, filename=job.filename)
+    response["ETag"] = quote_etag(Path(job.file_path).stem)   # cache files are named by key
+    return response
 
 
 @login_required
@@ -748,29 +843,7 @@ def export_class_pdf(class_group):
     """
     Generate a PDF report for a Class Group.
     """
-    students = Student.objects.filter(class_group=class_group)
-
-    sessions = class_group.session_set.all()
-    total_sessions = sessions.count()
-
-    student_rows = []
-
-    for student in students:
-        present = Attendance.objects.filter(
-            student=student,
-            session__class_group=class_group,
-            present=True
-        ).count()
-
-        absent = total_sessions - present
-        percentage = round((present / total_sessions) * 100, 2) if total_sessions else 0
-
-        student_rows.append({
-            "student": student,
-            "present": present,
-            "absent": absent,
-            "percentage": percentage,
-        })
+    student_rows, total_sessions = class_pdf_rows(class_group)
 
     html_string = render_to_string("attendance/report_class_pdf.html", {
         "class_group": class_group,
@@ -778,135 +851,92 @@ def export_class_pdf(class_group):
         "total_sessions": total_sessions,
     })
 
-    pdf_buffer = BytesIO()
-    HTML(string=html_string).write_pdf(pdf_buffer)
-    pdf_buffer.seek(0)
-
-    return pdf_buffer.getvalue()
+    return render_pdf(html_string)
 
 @login_required
 @user_passes_test(is_teacher)
+@pdf_service_errors
 def export_class(request, class_id, fmt):
     class_group = get_object_or_404(ClassGroup, id=class_id)
 
-    if fmt == "csv":
-        buf = export_class_csv(class_id)
-        content_type = "text/csv"
-        filename = f"class_{class_group.name}.csv"
-
-    elif fmt == "xlsx":
-        buf = export_class_xlsx(class_id)
-        content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        filename = f"class_{class_group.name}.xlsx"
-
-    elif fmt == "pdf":
-        pdf_bytes = export_class_pdf(class_group)
-        response = HttpResponse(pdf_bytes, content_type="application/pdf")
-        response["Content-Disposition"] = f'attachment; filename="class_{class_group.name}.pdf"'
-        return response
+    if request.method == "POST":
+        if fmt not in FORMATS:
+            return HttpResponse("Unsupported format", status=400)
+        return queue_export_response(request, {"kind": "class", "id": class_group.pk, "fmt": fmt})
 
-    else:
+    if fmt not in FORMATS:
         return HttpResponse("Unsupported format", status=400)
-
-    response = HttpResponse(buf.getvalue(), content_type=content_type)
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return response
+    return cached_export_response(
+        request, {"kind": "class", "id": class_group.pk, "fmt": fmt}, f"class_{class_group.name}.{fmt}",
+        queue_large=True,
+    )
 
 def export_subject_pdf(subject):
-    # Find all class groups where this subject has sessions
-    class_groups = ClassGroup.objects.filter(session__subject=subject).distinct()
-
-    # Fetch all students in those class groups
-    students = Student.objects.filter(class_group__in=class_groups)
-
-    # All sessions of this subject
-    sessions = Session.objects.filter(subject=subject)
-    total_sessions = sessions.count()
-
-    student_rows = []
-
-    for student in students:
-        present = Attendance.objects.filter(
-            student=student,
-            session__subject=subject,
-            present=True
-        ).count()
-
-        absent = total_sessions - present
-        percentage = round((present / total_sessions) * 100, 2) if total_sessions else 0
-
-        student_rows.append({
-            "student": student,
-            "present": present,
-            "absent": absent,
-            "percentage": percentage,
-        })
+    student_rows, total_sessions = subject_pdf_rows(subject)
+    if pdf_engine("subject") == "reportlab":
+        return subject_report_pdf(subject, student_rows, total_sessions)
 
     html_string = render_to_string("attendance/pdf/subject_report.html", {
         "subject": subject,
         "department": subject.department,
         "student_rows": student_rows,
+        "stats": student_rows,   # the template's name for the rows
+        "report_date": timezone.now(),
         "total_sessions": total_sessions,
     })
 
-    pdf_file = BytesIO()
-    HTML(string=html_string).write_pdf(pdf_file)
-    pdf_file.seek(0)
+    return render_pdf(html_string)
 
-    return pdf_file.getvalue()
+
+def export_class_muster_pdf(class_group):
+    """Student x session register for a class (see reports.muster_roll)."""
+    roll = muster_roll(class_group)
+    if pdf_engine("muster") == "reportlab":
+        return muster_pdf(roll)
+    return render_pdf(render_to_string("attendance/pdf/class_muster.html", roll))
 
 
 @login_required
 @user_passes_test(is_teacher)
-def export_subject(request, subject_id, fmt):
-    subject = get_object_or_404(Subject, id=subject_id)
+@pdf_service_errors
+def export_class_muster(request, class_id):
+    class_group = get_object_or_404(ClassGroup, id=class_id)
+    return cached_export_response(
+        request, {"kind": "muster", "id": class_group.pk, "fmt": "pdf"},
+        f"muster_{class_group.name}.pdf", as_attachment=False,
+    )
 
-    if fmt == "csv":
-        buf = export_subject_csv(subject)
-        content_type = "text/csv"
-        filename = f"{subject.code}.csv"
 
-    elif fmt == "xlsx":
-        buf = export_subject_xlsx(subject)
-        content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        filename = f"{subject.code}.xlsx"
+@login_required
+@user_passes_test(is_teacher)
+@pdf_service_errors
+def export_subject(request, subject_id, fmt):
+    subject = get_object_or_404(Subject, id=subject_id)
 
-    elif fmt == "pdf":
-        pdf_bytes = export_subject_pdf(subject)
-        response = HttpResponse(pdf_bytes, content_type="application/pdf")
-        response["Content-Disposition"] = f'attachment; filename="{subject.code}.pdf"'
-        return response
+    if request.method == "POST":
+        if fmt not in FORMATS:
+            return HttpResponse("Unsupported format", status=400)
+        return queue_export_response(request, {"kind": "subject", "id": subject.pk, "fmt": fmt})
 
-    else:
+    if fmt not in FORMATS:
         return HttpResponse("Unsupported format", status=400)
-
-    response = HttpResponse(buf.getvalue(), content_type=content_type)
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    return response
+    return cached_export_response(
+        request, {"kind": "subject", "id": subject.pk, "fmt": fmt}, f"{subject.code}.{fmt}",
+        queue_large=True,
+    )
 
 
 @login_required
 @user_passes_test(is_teacher)
 def bulk_export_zip(request, mode):
-    zip_buffer = BytesIO()
-    zip_file = zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED)
-
-    if mode == "classes":
-        for c in ClassGroup.objects.all():
-            csv_buf = export_class_csv(c.id).getvalue()
-            zip_file.writestr(f"{c.name}_class.csv", csv_buf)
-
-    elif mode == "subjects":
-        for s in Subject.objects.all():
-            csv_buf = export_subject_csv(s).getvalue()
-            zip_file.writestr(f"{s.code}_subject.csv", csv_buf)
-
-    else:
+    if mode not in BULK_MODES:
         return HttpResponse("Invalid mode", status=400)
 
-    zip_file.close()
+    if request.method == "POST":
+        return queue_export_response(request, {"kind": "bulk", "mode": mode})
 
-    response = HttpResponse(zip_buffer.getvalue(), content_type="application/zip")
+    # streamed as the members are produced (parallel, see zipstream.py)
+    response = StreamingHttpResponse(iter_zip(bulk_members(mode)), content_type="application/zip")
     response['Content-Disposition'] = f'attachment; filename="{mode}_export.zip"'
     return response
 
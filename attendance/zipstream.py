@@ -0,0 +1,141 @@
+# attendance/zipstream.py
+#
+# Streaming ZIP for the bulk exports. iter_zip() yields the archive as it
+# is written: ZipFile writes into an unseekable sink (so every member gets
+# a data descriptor instead of a header rewrite) and the sink is drained
+# after each chunk. Member contents come from generators that run in a
+# bounded thread pool, each feeding a small bounded queue, so at most
+# AURA_ZIP_WORKERS members are in flight and memory stays at roughly
+# workers x AURA_ZIP_QUEUE_CHUNKS chunks whatever the archive size.
+# Members are written in order; ZIP64 is forced so members and archives
+# may exceed 4 GB.
+
+import queue
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+_DONE = object()
+
+
+class _Sink:
+    """Write-only, unseekable file object that ZipFile writes into."""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _encode(chunk):
+    return chunk.encode() if isinstance(chunk, str) else chunk
+
+
+def _put(q, item, cancel):
+    """Blocking put that gives up once the consumer has gone away."""
+    while not cancel.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce(make_chunks, q, cancel):
+    try:
+        for chunk in make_chunks():
+            if not _put(q, _encode(chunk), cancel):
+                return
+        _put(q, _DONE, cancel)
+    except Exception as e:
+        _put(q, e, cancel)
+    finally:
+        # pool threads get their own DB connections; don't leak them
+        connections.close_all()
+
+
+def _serial_members(members):
+    for name, make_chunks in members:
+        yield name, (_encode(chunk) for chunk in make_chunks())
+
+
+def _queue_chunks(q):
+    while True:
+        item = q.get()
+        if item is _DONE:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def iter_zip(members, workers=None, queue_chunks=None):
+    """
+    Yield a ZIP archive of `members`, a list of (arcname, make_chunks)
+    where make_chunks() returns an iterator of str/bytes chunks. With
+    workers <= 1 members are generated in the calling thread.
+    """
+    workers = workers if workers is not None else getattr(settings, "AURA_ZIP_WORKERS", 4)
+    queue_chunks = queue_chunks or getattr(settings, "AURA_ZIP_QUEUE_CHUNKS", 8)
+    sink = _Sink()
+
+    if workers <= 1:
+        streams, cleanup = _serial_members(members), None
+    else:
+        cancel = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aura-zip")
+        pending = iter(members)
+        window = deque()
+
+        def submit():
+            member = next(pending, None)
+            if member is not None:
+                q = queue.Queue(maxsize=queue_chunks)
+                pool.submit(_produce, member[1], q, cancel)
+                window.append((member[0], q))
+
+        def streams_from_pool():
+            for _ in range(workers):
+                submit()
+            while window:
+                name, q = window.popleft()
+                yield name, _queue_chunks(q)
+                submit()
+
+        def cleanup():
+            cancel.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        streams = streams_from_pool()
+
+    try:
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, chunks in streams:
+                with zf.open(name, "w", force_zip64=True) as member:
+                    for chunk in chunks:
+                        member.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+                data = sink.drain()   # compressor tail + data descriptor
+                if data:
+                    yield data
+        yield sink.drain()   # central directory
+    finally:
+        if cleanup:
+            cleanup()
@@ -95,6 +95,35 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'aura-default',
+    }
+}
+
+# Analytics result cache (attendance/analytics_cache.py). The data version
+# that writes bump lives in this cache, so with more than one process (the
+# gunicorn workers, aura_outbox_worker, aura_export_worker, the rollup and
+# summary commands) the alias must point at a shared backend (Redis,
+# Memcached or DatabaseCache). On the per-process locmem backend other
+# processes' writes only show up when entries expire, so past-only ranges
+# get AURA_ANALYTICS_CACHE_TTL there as well.
+AURA_ANALYTICS_CACHE_ALIAS = 'default'
+AURA_ANALYTICS_CACHE_TTL = 5 * 60             # ranges that include today
+AURA_ANALYTICS_CACHE_PAST_TTL = 24 * 60 * 60  # past-only custom ranges (shared backend only)
+
+# "orm" reads the daily rollup table; "numpy" vectorizes over raw attendance
+AURA_ANALYTICS_BACKEND = 'orm'
+
+# Upper bound on points per series from the time-series API; longer spans
+# are served at week or month resolution instead of per day
+AURA_TIMESERIES_MAX_POINTS = 120
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -159,6 +188,39 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = config("AURA_EMAIL_USER")
 EMAIL_HOST_PASSWORD = config("AURA_EMAIL_PASS")
 DEFAULT_FROM_EMAIL = config("AURA_DEFAULT_FROM")
+EMAIL_TIMEOUT = 30
+
+# Email outbox (attendance/outbox.py, drained by aura_outbox_worker)
+AURA_OUTBOX_BATCH_SIZE = 50        # messages per SMTP connection
+AURA_OUTBOX_MAX_ATTEMPTS = 6
+AURA_OUTBOX_RETRY_BASE = 30        # seconds; doubles on every failed attempt
+AURA_OUTBOX_RETRY_MAX = 60 * 60
+AURA_OUTBOX_LEASE = 5 * 60         # reclaim rows a crashed worker left in "sending"
+AURA_JOB_LEASE = 10 * 60           # rerun notification jobs a crashed worker left "running"
+
+# Export Center jobs (attendance/exports.py, built by aura_export_worker).
+# AURA_EXPORT_DIR doubles as the content-addressed export cache.
+AURA_EXPORT_DIR = BASE_DIR / 'exports'
+AURA_EXPORT_CACHE_MAX_BYTES = 512 * 1024 * 1024   # LRU eviction above this
+AURA_EXPORT_LEASE = 30 * 60        # rebuild jobs a crashed worker left "running"; > longest build
+AURA_EXPORT_INLINE_MAX_ROWS = 20000  # plain GET misses above this many attendance rows are queued
+
+# PDF rendering pool (attendance/pdf_service.py); per gunicorn worker
+AURA_PDF_WORKERS = 2                 # render processes; 0 renders inline
+AURA_PDF_MAX_QUEUE = 8               # waiting renders before 503
+AURA_PDF_TIMEOUT = 60                # seconds per render
+AURA_PDF_MAX_TASKS_PER_CHILD = 50    # recycle render processes to cap memory
+
+# PDF engine per report (attendance/pdf_tables.py): "weasyprint" renders the
+# HTML templates, "reportlab" draws the tabular reports directly (much
+# faster on large registers). AURA_PDF_ENGINES overrides per report:
+# "session", "subject", "muster".
+AURA_PDF_ENGINE = "weasyprint"
+AURA_PDF_ENGINES = {"muster": "reportlab"}
+
+# Bulk ZIP exports (attendance/zipstream.py)
+AURA_ZIP_WORKERS = 4          # member CSVs generated concurrently (own DB connection each)
+AURA_ZIP_QUEUE_CHUNKS = 8     # buffered chunks per member before its worker waits
 
 
 CSRF_TRUSTED_ORIGINS = [